@@ -0,0 +1,46 @@
+# ============================================================
+#  DateSpark AI — bounded fan-out for batch AI requests
+#
+#  One shared ThreadPoolExecutor per worker process caps how many
+#  Gemini calls a worker runs at once. run_all() submits a list of
+#  callables, waits until a deadline, and returns whatever
+#  finished; the rest are cancelled (or simply abandoned if they
+#  already started) and reported as timeouts.
+# ============================================================
+
+import os, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+MAX_WORKERS      = int(os.environ.get("AI_BATCH_WORKERS", 8))
+DEFAULT_DEADLINE = float(os.environ.get("AI_BATCH_DEADLINE", 20))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ai-batch")
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def run_all(calls, deadline=DEFAULT_DEADLINE):
+    """Run callables concurrently; returns [("ok", value) | ("error", exc)
+    | ("timeout", None)] in input order."""
+    futures = [pool().submit(fn) for fn in calls]
+    wait(futures, timeout=deadline)
+    out = []
+    for f in futures:
+        if not f.done():
+            f.cancel()
+            out.append(("timeout", None))
+        elif f.exception() is not None:
+            out.append(("error", f.exception()))
+        else:
+            out.append(("ok", f.result()))
+    return out
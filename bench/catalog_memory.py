@@ -0,0 +1,162 @@
+# ============================================================
+#  DateSpark AI — catalog memory and reload time
+#
+#  Builds a synthetic catalog of N ideas and reports:
+#   • in-process: load time, and the memory of the slotted,
+#     interned records next to plain json.loads() dicts
+#   • under gunicorn, with the catalog loaded in the master
+#     (CATALOG_PRELOAD=1) and per worker (=0): each worker's
+#     rss / shared / private memory from /api/cache/stats, and
+#     how long a hot reload takes after the file changes
+#
+#    python bench/catalog_memory.py --ideas 50000 --workers 2
+# ============================================================
+
+import os, sys, json, time, random, shutil, argparse, tempfile, tracemalloc, subprocess
+from datetime import datetime
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+from loadtest import git_rev
+from concurrency import free_port, wait_ready
+import catalog
+
+CATS = ["home", "city", "outdoor", "budget", "luxury", "travel", "surprise"]
+COSTS = ["Free", "$", "$$", "$$$", "$$$$"]
+DURATIONS = ["1 hr", "2 hrs", "2-3 hrs", "3 hrs", "Half day", "Full day", "Weekend", "Evening"]
+EMOJIS = ["🕯️", "🎬", "🎨", "🌃", "🌄", "🌠", "🚣", "🏛️", "📚", "🍷", "🥂", "🚂"]
+WORDS = ("cozy sunset picnic rooftop market museum hike candle cook dance wine jazz garden "
+         "river lantern bakery vinyl tasting train coast forest gallery street festival").split()
+
+
+def synthetic(n, seed=1):
+    rng = random.Random(seed)
+    ideas = {c: [] for c in CATS}
+    for i in range(n):
+        cat = CATS[i % len(CATS)]
+        ideas[cat].append({
+            "id": f"gen-{i}", "title": " ".join(rng.choices(WORDS, k=3)).title(),
+            "desc": " ".join(rng.choices(WORDS, k=14)).capitalize() + ".",
+            "emoji": rng.choice(EMOJIS), "duration": rng.choice(DURATIONS), "cost": rng.choice(COSTS)})
+    seasonal = {s: [{**ideas["outdoor"][j], "id": f"{s}-{j}", "cat": "outdoor"} for j in range(4)]
+                for s in catalog.SEASONS}
+    return {"ideas": ideas, "seasonal": seasonal}
+
+
+def traced(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    value = fn()
+    seconds = time.perf_counter() - t0
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size, seconds
+
+
+def in_process(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    _, dict_bytes, _ = traced(lambda: json.loads(raw))
+    cat, slot_bytes, _ = traced(lambda: catalog.load(path))
+    cat = catalog.load(path)           # timed without tracemalloc's overhead
+    return {"dicts_mb": round(dict_bytes / 2**20, 1), "records_mb": round(slot_bytes / 2**20, 1),
+            "load_ms": round(cat.load_seconds * 1000, 1)}
+
+
+def worker_stats(base, workers, tries=200):
+    """/api/cache/stats["catalog"] from each worker (new connection per try)."""
+    seen = {}
+    for _ in range(tries):
+        s = requests.get(base + "/api/cache/stats", headers={"Connection": "close"}, timeout=10).json()["catalog"]
+        seen[s["pid"]] = s
+        if len(seen) >= workers:
+            break
+    return list(seen.values())
+
+
+def run_gunicorn(path, preload, args):
+    tmp = tempfile.mkdtemp(prefix="datespark-bench-")
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(args.workers), CATALOG_PRELOAD=str(int(preload)),
+               CATALOG_CHECK_INTERVAL="0.5", DATESPARK_CATALOG=path, RATE_LIMIT="0",
+               DATESPARK_TOP_CITIES="", DATESPARK_DB=os.path.join(tmp, "bench.db"),
+               DATESPARK_METRICS_DIR=os.path.join(tmp, "metrics"))
+    app = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                           cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_ready(base + "/api/ideas", timeout=120):
+            return {"error": "app did not start"}
+        for _ in range(20):                     # let every worker build its views
+            requests.get(base + "/api/deck", headers={"Connection": "close"}, timeout=30)
+        before = worker_stats(base, args.workers)
+        etag = requests.get(base + "/api/ideas").headers["ETag"]
+
+        with open(path) as f:
+            data = json.load(f)
+        data["ideas"]["home"].append({"id": f"bench-{time.time_ns()}", "title": "Bench Night", "desc": "A new idea.",
+                                      "emoji": "🧪", "duration": "1 hr", "cost": "Free"})
+        with open(path, "w") as f:
+            json.dump(data, f, ensure_ascii=False)
+        t0 = time.perf_counter()
+        while requests.get(base + "/api/ideas", headers={"Connection": "close"}).headers["ETag"] == etag:
+            if time.perf_counter() - t0 > 60:
+                return {"error": "reload never showed up"}
+            time.sleep(0.05)
+        visible = time.perf_counter() - t0
+        after = worker_stats(base, args.workers)
+        mb = lambda v: round(v / 2**20, 1)
+        return {
+            "workers": [{"rss_mb": mb(s.get("rss_bytes", 0)), "shared_mb": mb(s.get("shared_bytes", 0)),
+                         "private_mb": mb(s.get("private_bytes", 0))} for s in before],
+            "reload_ms": [s["last_reload_ms"] for s in after if s["reloads"]],
+            "visible_after_s": round(visible, 2),
+        }
+    finally:
+        app.terminate()
+        app.wait(10)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="DateSpark catalog memory / reload benchmark")
+    ap.add_argument("--ideas", type=int, default=50000)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--out", help="results file (default bench/results/catalog-<timestamp>.json)")
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="datespark-catalog-")
+    path = os.path.join(tmp, "catalog.json")
+    try:
+        with open(path, "w") as f:
+            json.dump(synthetic(args.ideas), f, ensure_ascii=False)
+        results = {"file_mb": round(os.path.getsize(path) / 2**20, 1), "in_process": in_process(path)}
+        ip = results["in_process"]
+        print(f"{args.ideas} ideas, {results['file_mb']} MB file")
+        print(f"  load {ip['load_ms']} ms; records {ip['records_mb']} MB vs plain dicts {ip['dicts_mb']} MB")
+        for preload in (True, False):
+            label = "preload" if preload else "per-worker"
+            print(f"… gunicorn, {label}", flush=True)
+            r = results[label] = run_gunicorn(path, preload, args)
+            if "error" in r:
+                print(f"  {r['error']}")
+                continue
+            for i, w in enumerate(r["workers"]):
+                print(f"  worker {i}: rss {w['rss_mb']} MB, shared {w['shared_mb']} MB, private {w['private_mb']} MB")
+            print(f"  reload {r['reload_ms']} ms per worker; visible {r['visible_after_s']} s after the write")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    out = args.out or os.path.join(HERE, "results", "catalog-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"git": git_rev(), "at": datetime.now().isoformat(timespec="seconds"),
+                   "config": vars(args), "results": results}, f, indent=2)
+    print(f"\nsaved → {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
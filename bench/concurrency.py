@@ -0,0 +1,150 @@
+# ============================================================
+#  DateSpark AI — how many slow AI calls can one worker hold?
+#
+#  For each gunicorn worker class, starts the mock Gemini with a
+#  fixed latency and the app behind gunicorn.conf.py, fires a
+#  burst of concurrent /api/ai/quick requests (unique topics, so
+#  no caching), and meanwhile keeps probing /api/ideas to see
+#  whether cheap routes stay fast while the AI calls are pending.
+#
+#    python bench/concurrency.py --classes sync,gthread,gevent \
+#        --ai 200 --latency 3 --workers 1
+# ============================================================
+
+import os, sys, json, time, shutil, socket, argparse, tempfile, threading, subprocess
+from datetime import datetime
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+from loadtest import percentile, git_rev
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).ok:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def run_class(worker_class, args):
+    tmp = tempfile.mkdtemp(prefix="datespark-bench-")
+    mock_port, app_port = free_port(), free_port()
+    mock = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_gemini.py"), "--port", str(mock_port),
+                             "--latency", f"fixed:{args.latency}"], stdout=subprocess.DEVNULL)
+    env = dict(os.environ, PORT=str(app_port), GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads),
+               GEMINI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1beta", GEMINI_API_KEY="mock",
+               GEMINI_MAX_RETRIES="0", RATE_LIMIT="0", AI_SIMCACHE="0",
+               DATESPARK_DB=os.path.join(tmp, "bench.db"), DATESPARK_METRICS_DIR=os.path.join(tmp, "metrics"))
+    app = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                           cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{app_port}"
+    try:
+        if not wait_ready(base + "/api/ideas"):
+            return {"error": "app did not start"}
+        ai_times, ai_status, probes, probe_errors = [], {}, [], [0]
+        lock = threading.Lock()
+        done = threading.Event()
+        started = time.perf_counter()
+        stop_at = time.monotonic() + args.deadline
+
+        def ai(i):
+            t0 = time.perf_counter()
+            try:
+                r = requests.post(base + "/api/ai/quick", json={"topic": f"bench topic {i} {time.time_ns()}"},
+                                  timeout=max(0.1, stop_at - time.monotonic()))
+                code = str(r.status_code)
+            except requests.RequestException as e:
+                code = e.__class__.__name__
+            with lock:
+                ai_status[code] = ai_status.get(code, 0) + 1
+                if code == "200":
+                    ai_times.append(time.perf_counter() - t0)
+
+        def probe():
+            s = requests.Session()
+            while not done.is_set() and time.monotonic() < stop_at:
+                t0 = time.perf_counter()
+                try:
+                    s.get(base + "/api/ideas", timeout=max(0.1, stop_at - time.monotonic()))
+                    probes.append(time.perf_counter() - t0)
+                except requests.RequestException:
+                    probe_errors[0] += 1
+                time.sleep(0.05)
+
+        threads = [threading.Thread(target=ai, args=(i,), daemon=True) for i in range(args.ai)]
+        prober = threading.Thread(target=probe, daemon=True)
+        for t in threads:
+            t.start()
+        prober.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+        done.set()
+        prober.join()
+        ai_times.sort()
+        probes.sort()
+        ms = lambda v: round(v * 1000, 1) if v is not None else None
+        return {
+            "ai_ok": len(ai_times), "ai_status": ai_status, "wall_s": round(wall, 2),
+            "ai_p50_ms": ms(percentile(ai_times, 50)), "ai_p99_ms": ms(percentile(ai_times, 99)),
+            "probe_requests": len(probes), "probe_errors": probe_errors[0], "probe_p50_ms": ms(percentile(probes, 50)),
+            "probe_p99_ms": ms(percentile(probes, 99)), "probe_max_ms": ms(probes[-1] if probes else None),
+        }
+    finally:
+        app.terminate()
+        mock.terminate()
+        app.wait(10)
+        mock.wait(10)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="DateSpark worker-class concurrency benchmark")
+    ap.add_argument("--classes", default="sync,gthread,gevent")
+    ap.add_argument("--ai", type=int, default=200, help="concurrent /api/ai/quick requests")
+    ap.add_argument("--latency", type=float, default=3, help="mock Gemini latency, seconds")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--threads", type=int, default=16, help="threads per gthread worker")
+    ap.add_argument("--deadline", type=float, default=30, help="give up on requests after this many seconds")
+    ap.add_argument("--out", help="results file (default bench/results/concurrency-<timestamp>.json)")
+    args = ap.parse_args(argv)
+
+    results = {}
+    for wc in [c for c in args.classes.split(",") if c]:
+        print(f"… {wc}", flush=True)
+        results[wc] = run_class(wc, args)
+
+    print(f"\n{args.ai} concurrent AI calls, {args.latency}s upstream latency, {args.workers} worker(s)\n")
+    print(f"{'class':<8} {'ai ok':>6} {'wall s':>7} {'ai p50':>8} {'ai p99':>8} "
+          f"{'/api/ideas p50':>15} {'p99':>8} {'max':>8} {'failed':>7}")
+    for wc, r in results.items():
+        if "error" in r:
+            print(f"{wc:<8} {r['error']}")
+            continue
+        print(f"{wc:<8} {r['ai_ok']:>6} {r['wall_s']:>7} {r['ai_p50_ms'] or '-':>8} {r['ai_p99_ms'] or '-':>8} "
+              f"{r['probe_p50_ms'] or '-':>15} {r['probe_p99_ms'] or '-':>8} {r['probe_max_ms'] or '-':>8} "
+              f"{r['probe_errors']:>7}")
+    out = args.out or os.path.join(HERE, "results", "concurrency-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"git": git_rev(), "at": datetime.now().isoformat(timespec="seconds"),
+                   "config": vars(args), "results": results}, f, indent=2)
+    print(f"\nsaved → {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# ============================================================
+#  DateSpark AI — does hedging cut the Gemini tail?
+#
+#  Starts the mock Gemini with a heavy-tailed latency (and,
+#  optionally, a faster light model), then pushes the same stream
+#  of calls through routing.Router set up several ways: one target
+#  without hedging, one target with hedging, and every key x model
+#  target with hedging. Reports end-to-end p50/p95/p99 and how
+#  many upstream requests each setup cost. Runs fully offline.
+#
+#    python bench/hedging.py --calls 400 --concurrency 16 \
+#        --latency lognormal:0.5,0.9 --light-latency lognormal:0.3,0.9 --keys 2
+# ============================================================
+
+import os, sys, json, time, shutil, argparse, tempfile, threading, subprocess
+from datetime import datetime
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+TMP = tempfile.mkdtemp(prefix="datespark-hedge-")
+os.environ.setdefault("GEMINI_MAX_RETRIES", "0")
+os.environ.setdefault("DATESPARK_METRICS_DIR", os.path.join(TMP, "metrics"))
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+from loadtest import percentile, git_rev
+from concurrency import free_port
+import routing
+
+MODEL, LIGHT = "gemini-2.5-flash", "gemini-2.5-flash-lite"
+BODY = {"contents": [{"parts": [{"text": 'Generate a creative romantic date idea based on: "bench".'}]}]}
+
+
+def setups(base, keys):
+    keys = [f"mock-key-{i}" for i in range(keys)]
+    return {
+        "single": routing.Router([routing.Target(MODEL, keys[0], base)], hedge=False),
+        "single+hedge": routing.Router([routing.Target(MODEL, keys[0], base)], hedge=True),
+        "routed+hedge": routing.Router(routing.build_targets(keys, [MODEL, LIGHT], base), light_models=[LIGHT]),
+    }
+
+
+def run(router, endpoint, args):
+    times, status, lock = [], {}, threading.Lock()
+    todo = iter(range(args.calls))
+
+    def worker():
+        for _ in todo:
+            t0 = time.perf_counter()
+            try:
+                code = str(router.post(endpoint, BODY).status_code)
+            except Exception as e:
+                code = e.__class__.__name__
+            with lock:
+                status[code] = status.get(code, 0) + 1
+                if code == "200":
+                    times.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    times.sort()
+    ms = lambda v: round(v * 1000) if v is not None else None
+    return {"status": status, "p50_ms": ms(percentile(times, 50)), "p95_ms": ms(percentile(times, 95)),
+            "p99_ms": ms(percentile(times, 99)), "max_ms": ms(times[-1] if times else None),
+            **{k: v for k, v in router.stats().items() if k != "targets"},
+            "targets": {name: {k: t[k] for k in ("calls", "wins", "cancelled", "ewma_ms", "p95_ms")}
+                        for name, t in router.stats()["targets"].items()}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="DateSpark hedged-request benchmark (offline)")
+    ap.add_argument("--calls", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--latency", default="lognormal:0.5,0.9", help="mock latency of the main model")
+    ap.add_argument("--light-latency", default="lognormal:0.3,0.9", help="mock latency of the light model")
+    ap.add_argument("--keys", type=int, default=2, help="API keys in the routed setup")
+    ap.add_argument("--endpoint", default="quick", help="route to exercise (quick may use the light model)")
+    ap.add_argument("--out", help="results file (default bench/results/hedging-<timestamp>.json)")
+    args = ap.parse_args(argv)
+
+    port = free_port()
+    mock = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_gemini.py"), "--port", str(port),
+                             "--latency", args.latency, "--model-latency", f"{LIGHT}={args.light_latency}"],
+                            stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}/v1beta"
+    results = {}
+    try:
+        for _ in range(50):
+            try:
+                requests.get(f"http://127.0.0.1:{port}/stats", timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.1)
+        for name, router in setups(base, args.keys).items():
+            print(f"… {name}", flush=True)
+            before = requests.get(f"http://127.0.0.1:{port}/stats").json()
+            results[name] = run(router, args.endpoint, args)
+            time.sleep(0.5 + 3 * max(0.0, float(args.latency.split(":")[1].split(",")[0])))  # let losers land
+            after = requests.get(f"http://127.0.0.1:{port}/stats").json()
+            results[name]["upstream"] = after["requests"] - before["requests"]
+            results[name]["hung_up"] = after["cancelled"] - before["cancelled"]
+    finally:
+        mock.terminate()
+        mock.wait(10)
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    print(f"\n{args.calls} calls, {args.concurrency} at a time, main {args.latency}, light {args.light_latency}\n")
+    print(f"{'setup':<14} {'p50':>6} {'p95':>6} {'p99':>6} {'max':>6} {'hedges':>7} {'won':>5} {'upstream':>9} {'hung up':>8}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['p50_ms'] or '-':>6} {r['p95_ms'] or '-':>6} {r['p99_ms'] or '-':>6} "
+              f"{r['max_ms'] or '-':>6} {r['hedges']:>7} {r['hedge_wins']:>5} {r['upstream']:>9} {r['hung_up']:>8}")
+    out = args.out or os.path.join(HERE, "results", "hedging-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"git": git_rev(), "at": datetime.now().isoformat(timespec="seconds"),
+                   "config": vars(args), "results": results}, f, indent=2)
+    print(f"\nsaved → {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# ============================================================
+#  DateSpark AI — load / benchmark harness
+#
+#  Drives the app's routes at a fixed concurrency and reports
+#  throughput plus p50/p95/p99 latency per route. Every run is
+#  saved as JSON under bench/results/ so runs can be compared.
+#
+#  Typical session:
+#    python bench/mock_gemini.py --port 8089 &
+#    GEMINI_BASE_URL=http://127.0.0.1:8089/v1beta GEMINI_API_KEY=mock \
+#        gunicorn -b 127.0.0.1:8000 main:app &
+#    python bench/loadtest.py --base http://127.0.0.1:8000 -c 32 -d 30
+#    python bench/loadtest.py --compare bench/results/A.json bench/results/B.json
+# ============================================================
+
+import os, sys, json, time, random, argparse, threading, subprocess
+from datetime import datetime
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TOPICS = ["anniversary dinner", "we love hiking & sushi", "rainy day at home", "cheap first date",
+          "1 year anniversary, budget $150", "surprise birthday night", "Paris weekend"]
+CITIES = ["Paris", "New York City", "Tokyo", "London", "Berlin", "Lisbon"]
+
+ROUTES = {
+    "index":     ("GET",  "/",                   None),
+    "ideas":     ("GET",  "/api/ideas",          None),
+    "seasonal":  ("GET",  "/api/seasonal",       None),
+    "quick":     ("POST", "/api/ai/quick",       lambda u: {"topic": topic(u)}),
+    "itinerary": ("POST", "/api/ai/itinerary",   lambda u: {"topic": topic(u)}),
+    "places":    ("POST", "/api/ai/places",      lambda u: {"city": random.choice(CITIES) + suffix(u)}),
+}
+
+def suffix(unique):
+    return f" #{random.getrandbits(40):x}" if unique else ""
+
+def topic(unique):
+    return random.choice(TOPICS) + suffix(unique)
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return None
+    k = (len(sorted_vals) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def run(base, routes, concurrency, duration, requests_total, unique, timeout):
+    lock = threading.Lock()
+    samples = {r: [] for r in routes}
+    statuses = {r: {} for r in routes}
+    sent = [0]
+    stop_at = time.monotonic() + duration if duration else None
+
+    def next_ticket():
+        with lock:
+            if requests_total and sent[0] >= requests_total:
+                return False
+            sent[0] += 1
+            return True
+
+    def worker(i):
+        s = requests.Session()
+        n = i
+        while (stop_at is None or time.monotonic() < stop_at) and next_ticket():
+            name = routes[n % len(routes)]
+            n += 1
+            method, path, make_body = ROUTES[name]
+            t0 = time.perf_counter()
+            try:
+                r = s.request(method, base + path, json=make_body(unique) if make_body else None,
+                              timeout=timeout, headers={"Accept-Encoding": "gzip, br"})
+                code = str(r.status_code)
+            except requests.RequestException as e:
+                code = e.__class__.__name__
+            dt = time.perf_counter() - t0
+            with lock:
+                samples[name].append(dt)
+                statuses[name][code] = statuses[name].get(code, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    report = {}
+    for name in routes:
+        vals = sorted(samples[name])
+        report[name] = {
+            "requests": len(vals),
+            "throughput_rps": round(len(vals) / wall, 2) if wall else 0,
+            "status": statuses[name],
+            **{f"p{p}_ms": round(percentile(vals, p) * 1000, 2) if vals else None for p in (50, 95, 99)},
+            "max_ms": round(vals[-1] * 1000, 2) if vals else None,
+        }
+    total = sum(len(v) for v in samples.values())
+    return {"wall_s": round(wall, 3), "requests": total,
+            "throughput_rps": round(total / wall, 2) if wall else 0, "routes": report}
+
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"\n{'route':<10} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  status")
+    for name, r in result["routes"].items():
+        print(f"{name:<10} {r['requests']:>7} {r['throughput_rps']:>8} {r['p50_ms'] or '-':>9} "
+              f"{r['p95_ms'] or '-':>9} {r['p99_ms'] or '-':>9}  {r['status']}")
+    print(f"\ntotal: {result['requests']} requests in {result['wall_s']} s "
+          f"→ {result['throughput_rps']} req/s")
+
+
+def compare(a_path, b_path):
+    a, b = (json.load(open(p)) for p in (a_path, b_path))
+    print(f"{'route':<10} {'metric':<15} {'A':>10} {'B':>10} {'change':>9}")
+    for name in sorted(set(a["result"]["routes"]) & set(b["result"]["routes"])):
+        ra, rb = a["result"]["routes"][name], b["result"]["routes"][name]
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            va, vb = ra.get(metric), rb.get(metric)
+            change = f"{(vb - va) / va * 100:+.1f}%" if va and vb is not None else "-"
+            print(f"{name:<10} {metric:<15} {va if va is not None else '-':>10} "
+                  f"{vb if vb is not None else '-':>10} {change:>9}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="DateSpark load test")
+    ap.add_argument("--base", default="http://127.0.0.1:5000")
+    ap.add_argument("-c", "--concurrency", type=int, default=16)
+    ap.add_argument("-d", "--duration", type=float, default=20, help="seconds (0 = use --requests)")
+    ap.add_argument("-n", "--requests", type=int, default=0, help="stop after this many requests")
+    ap.add_argument("--routes", default=",".join(ROUTES), help="comma list of " + ",".join(ROUTES))
+    ap.add_argument("--unique", action="store_true", help="unique topics per request (defeats caches)")
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--label", default="", help="free text stored with the results")
+    ap.add_argument("--out", help="results file (default bench/results/<timestamp>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("A", "B"), help="compare two saved result files")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+    routes = [r for r in args.routes.split(",") if r]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        ap.error(f"unknown routes: {', '.join(sorted(unknown))}")
+    if not args.duration and not args.requests:
+        ap.error("give --duration or --requests")
+
+    result = run(args.base.rstrip("/"), routes, args.concurrency, args.duration,
+                 args.requests, args.unique, args.timeout)
+    print_report(result)
+    out = args.out or os.path.join(HERE, "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"label": args.label, "git": git_rev(), "at": datetime.now().isoformat(timespec="seconds"),
+                   "config": {"base": args.base, "concurrency": args.concurrency, "duration": args.duration,
+                              "requests": args.requests, "routes": routes, "unique": args.unique},
+                   "result": result}, f, indent=2)
+    print(f"saved → {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# ============================================================
+#  DateSpark AI — local Gemini stand-in for load tests
+#
+#  Speaks the generateContent and streamGenerateContent (alt=sse)
+#  wire format closely enough for call_gemini / stream_ai, with
+#  knobs for latency, 429s and broken model output.
+#
+#  Run:
+#    python bench/mock_gemini.py --port 8089 --latency lognormal:0.8,0.5 \
+#        --rate-429 0.05 --malformed 0.02 \
+#        --model-latency gemini-2.5-flash-lite=lognormal:0.4,0.5
+#  then start the app with
+#    GEMINI_BASE_URL=http://127.0.0.1:8089/v1beta GEMINI_API_KEY=mock ...
+# ============================================================
+
+import re, sys, json, time, random, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+QUICK = {"title": "Sunset Sushi Picnic", "desc": "Grab takeout sushi and catch the sunset from a hilltop.",
+         "emoji": "🍣", "duration": "2-3 hrs", "cost": "$$", "tip": "Bring a blanket and chopsticks.",
+         "steps": ["Order sushi platter", "Drive to the viewpoint", "Watch the sunset together"]}
+ITINERARY = {"title": "Anniversary Evening", "emoji": "💞", "totalDuration": "4 hrs", "totalCost": "$$$",
+             "overview": "A slow, romantic evening from aperitivo to stargazing.",
+             "timeline": [{"time": f"{h}:00 PM", "activity": a, "tip": "Take your time.", "duration": "45 min"}
+                          for h, a in [(6, "Aperitivo on a terrace"), (7, "Dinner at a tasting bar"),
+                                       (8, "Gelato walk by the river"), (9, "Live jazz set"),
+                                       (10, "Stargazing from the rooftop")]]}
+PLACE = {"name": "The Hidden Garden", "type": "Park", "desc": "A quiet walled garden with fairy lights.",
+         "emoji": "🌿", "priceRange": "$"}
+
+_N_IDEAS = re.compile(r"Generate (\d+) ")
+_REQUESTS = re.compile(r'\d+\. "([^"]*)"')
+
+
+class Config:
+    latency = ("fixed", (0.0,))
+    model_latency = {}      # model name -> distribution, overriding `latency`
+    rate_429 = 0.0
+    malformed = 0.0
+    chunk = 40
+    chunk_delay = 0.02
+    retry_after = "1"
+    lock = threading.Lock()
+    counts = {"requests": 0, "ok": 0, "429": 0, "malformed": 0, "cancelled": 0}
+
+
+def parse_latency(spec):
+    """fixed:S | uniform:A,B | lognormal:MU_SECONDS,SIGMA"""
+    kind, _, args = spec.partition(":")
+    vals = tuple(float(v) for v in args.split(",")) if args else (0.0,)
+    if kind not in ("fixed", "uniform", "lognormal"):
+        raise argparse.ArgumentTypeError(f"unknown latency distribution {kind!r}")
+    return kind, vals
+
+
+def sample_latency(model=None):
+    kind, v = Config.model_latency.get(model, Config.latency)
+    if kind == "fixed":
+        return v[0]
+    if kind == "uniform":
+        return random.uniform(v[0], v[1])
+    # median v[0] seconds, shape v[1]
+    return random.lognormvariate(0, v[1]) * v[0]
+
+
+def answer_for(prompt):
+    m = _N_IDEAS.search(prompt)
+    if m and "JSON array" in prompt:
+        requests = _REQUESTS.findall(prompt)
+        ideas = [dict(QUICK, title=f"{QUICK['title']} #{i + 1}") for i in range(int(m.group(1)))]
+        for idea, request in zip(ideas, requests):
+            idea["request"] = request          # batch prompts ask for the request back
+        return ideas
+    if "itinerary" in prompt:
+        return ITINERARY
+    if "places in" in prompt:
+        return [dict(PLACE, name=f"{PLACE['name']} {i + 1}") for i in range(6)]
+    return QUICK
+
+
+def render(prompt):
+    text = "```json\n" + json.dumps(answer_for(prompt), ensure_ascii=False) + "\n```"
+    if random.random() < Config.malformed:
+        with Config.lock:
+            Config.counts["malformed"] += 1
+        broken = random.choice(["truncate", "prose", "comma"])
+        if broken == "truncate":
+            text = text[:len(text) * 2 // 3]
+        elif broken == "prose":
+            text = "Sure! Here is a lovely idea [as requested]:\n" + text + "\nEnjoy {your date}!"
+        else:
+            text = text.replace("}", ",}", 1)
+    return text
+
+
+def envelope(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"},
+                            "finishReason": "STOP", "index": 0}]}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            with Config.lock:
+                return self._send(200, Config.counts)
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with Config.lock:
+            Config.counts["requests"] += 1
+        if ":generateContent" not in path and ":streamGenerateContent" not in path:
+            return self._send(404, {"error": {"code": 404, "message": "unknown method"}})
+        model = path.rsplit("/", 1)[-1].split(":")[0]
+        time.sleep(sample_latency(model))
+        if random.random() < Config.rate_429:
+            with Config.lock:
+                Config.counts["429"] += 1
+            return self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                              [("Retry-After", Config.retry_after)])
+        prompt = body["contents"][0]["parts"][0]["text"]
+        text = render(prompt)
+        with Config.lock:
+            Config.counts["ok"] += 1
+        if ":generateContent" in path:
+            return self._send(200, envelope(text))
+        # server-sent events, a few characters per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i in range(0, len(text), Config.chunk):
+            self.wfile.write(b"data: " + json.dumps(envelope(text[i:i + Config.chunk])).encode() + b"\r\n\r\n")
+            self.wfile.flush()
+            time.sleep(Config.chunk_delay)
+        self.close_connection = True
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024      # the default backlog of 5 resets bursts of connections
+
+    def handle_error(self, request, client_address):
+        # a hedged call that lost hangs up before its answer is written
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            with Config.lock:
+                Config.counts["cancelled"] += 1
+            return
+        super().handle_error(request, client_address)
+
+
+def serve(port=8089, host="127.0.0.1"):
+    return Server((host, port), Handler)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Local Gemini stand-in")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", type=parse_latency, default=("lognormal", (0.8, 0.5)),
+                    help="fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA (seconds)")
+    ap.add_argument("--model-latency", action="append", default=[], metavar="MODEL=DIST",
+                    help="latency for one model's path, e.g. gemini-2.5-flash-lite=fixed:0.2 (repeatable)")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="fraction of calls answered with 429")
+    ap.add_argument("--retry-after", default="1", help="Retry-After header sent with 429s")
+    ap.add_argument("--malformed", type=float, default=0.0, help="fraction of answers with broken JSON")
+    ap.add_argument("--chunk", type=int, default=40, help="characters per streamed chunk")
+    ap.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    Config.latency, Config.rate_429, Config.malformed = args.latency, args.rate_429, args.malformed
+    Config.chunk, Config.chunk_delay, Config.retry_after = args.chunk, args.chunk_delay, args.retry_after
+    for spec in args.model_latency:
+        model, _, dist = spec.partition("=")
+        Config.model_latency[model] = parse_latency(dist)
+    srv = serve(args.port, args.host)
+    print(f"🤖 mock Gemini on http://{args.host}:{args.port}/v1beta  (stats at /stats)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
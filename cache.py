@@ -0,0 +1,205 @@
+# ============================================================
+#  DateSpark AI — Gemini response cache
+#
+#  Two tiers:
+#   1. in-memory LRU per worker (fast, size bounded)
+#   2. `ai_cache` table in datespark.db, shared by every
+#      gunicorn worker on the box (optional, AI_CACHE_DISK=0
+#      turns it off)
+#
+#  Keys are endpoint + normalized prompt, so "Paris!" and
+#  "  paris " land on the same entry.
+# ============================================================
+
+import os, re, time, sqlite3, hashlib, threading
+from collections import OrderedDict
+import storage
+
+# seconds each endpoint's answers stay fresh
+TTLS = {
+    "quick":     int(os.environ.get("AI_CACHE_TTL_QUICK", 6 * 3600)),
+    "itinerary": int(os.environ.get("AI_CACHE_TTL_ITINERARY", 12 * 3600)),
+    "places":    int(os.environ.get("AI_CACHE_TTL_PLACES", 7 * 24 * 3600)),
+}
+DEFAULT_TTL = 3600
+
+MEM_MAX_BYTES  = int(os.environ.get("AI_CACHE_MEM_BYTES", 8 * 1024 * 1024))
+DISK_MAX_BYTES = int(os.environ.get("AI_CACHE_DISK_BYTES", 64 * 1024 * 1024))
+DISK_ENABLED   = os.environ.get("AI_CACHE_DISK", "1") != "0"
+PRUNE_EVERY    = 50   # disk writes between size checks
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_cache (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ai_cache_created ON ai_cache(created_at);
+"""
+
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACE = re.compile(r"\s+")
+
+def normalize_prompt(text):
+    text = _PUNCT.sub(" ", text.casefold())
+    return _SPACE.sub(" ", text).strip()
+
+def cache_key(endpoint, prompt):
+    digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{endpoint}:{digest}"
+
+
+class ResponseCache:
+    def __init__(self, mem_max_bytes=MEM_MAX_BYTES, disk_max_bytes=DISK_MAX_BYTES, disk=DISK_ENABLED):
+        self.mem_max_bytes = mem_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.disk = disk
+        self._mem = OrderedDict()       # key -> (expires_at, value)
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counts = {"hits_memory": 0, "hits_disk": 0, "misses": 0,
+                       "sets": 0, "evictions": 0, "disk_errors": 0}
+
+    # ── SQLite tier ─────────────────────────────────────────
+    def _conn(self):
+        storage.ensure_schema("ai_cache", SCHEMA)
+        return storage.get_conn()
+
+    def _disk_get(self, key, now):
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"CACHE DISK ERROR: {e}")
+            self._count("disk_errors")
+            return None
+        if not row or row[1] <= now:
+            return None
+        return row
+
+    def _disk_set(self, key, endpoint, value, expires_at, now):
+        try:
+            self._conn()
+            with storage.write() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ai_cache (key, endpoint, value, size, expires_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, endpoint, value, len(value), expires_at, now))
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % PRUNE_EVERY == 0
+            if prune:
+                self._disk_prune(now)
+        except sqlite3.Error as e:
+            print(f"CACHE DISK ERROR: {e}")
+            self._count("disk_errors")
+
+    def _disk_prune(self, now):
+        self._conn()
+        with storage.write() as conn:
+            conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_cache").fetchone()[0]
+            if total <= self.disk_max_bytes:
+                return
+            # drop the oldest entries until we're back under budget
+            freed, doomed = 0, []
+            for key, size in conn.execute("SELECT key, size FROM ai_cache ORDER BY created_at"):
+                doomed.append((key,))
+                freed += size
+                if total - freed <= self.disk_max_bytes:
+                    break
+            conn.executemany("DELETE FROM ai_cache WHERE key = ?", doomed)
+        self._count("evictions", len(doomed))
+
+    # ── In-memory tier ──────────────────────────────────────
+    def _mem_put(self, key, value, expires_at):
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old:
+                self._mem_bytes -= len(old[1])
+            self._mem[key] = (expires_at, value)
+            self._mem_bytes += len(value)
+            while self._mem_bytes > self.mem_max_bytes and self._mem:
+                _, (_, evicted) = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+                self.counts["evictions"] += 1
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    # ── Public API ──────────────────────────────────────────
+    def get(self, endpoint, prompt):
+        """Cached JSON text for this endpoint + prompt, or None."""
+        key = cache_key(endpoint, prompt)
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry and entry[0] > now:
+                self._mem.move_to_end(key)
+                self.counts["hits_memory"] += 1
+                return entry[1]
+            if entry:
+                del self._mem[key]
+                self._mem_bytes -= len(entry[1])
+        if self.disk:
+            row = self._disk_get(key, now)
+            if row:
+                self._mem_put(key, row[0], row[1])
+                self._count("hits_disk")
+                return row[0]
+        self._count("misses")
+        return None
+
+    def peek(self, endpoint, prompt):
+        """Like get() but reads only the shared tier and leaves the
+        hit/miss counters alone (used while waiting on another worker)."""
+        if not self.disk:
+            return None
+        row = self._disk_get(cache_key(endpoint, prompt), time.time())
+        return row[0] if row else None
+
+    def set(self, endpoint, prompt, value):
+        key = cache_key(endpoint, prompt)
+        now = time.time()
+        expires_at = now + TTLS.get(endpoint, DEFAULT_TTL)
+        self._mem_put(key, value, expires_at)
+        if self.disk:
+            self._disk_set(key, endpoint, value, expires_at, now)
+        self._count("sets")
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+        if self.disk:
+            try:
+                self._conn()
+                with storage.write() as conn:
+                    conn.execute("DELETE FROM ai_cache")
+            except sqlite3.Error as e:
+                print(f"CACHE DISK ERROR: {e}")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            counts["memory_entries"] = len(self._mem)
+            counts["memory_bytes"] = self._mem_bytes
+        hits = counts["hits_memory"] + counts["hits_disk"]
+        lookups = hits + counts["misses"]
+        counts["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        if self.disk:
+            try:
+                n, size = self._conn().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_cache").fetchone()
+                counts["disk_entries"], counts["disk_bytes"] = n, size
+            except sqlite3.Error:
+                pass
+        return counts
+
+
+ai_cache = ResponseCache()
@@ -0,0 +1,222 @@
+# ============================================================
+#  DateSpark AI — the idea catalog (data/catalog.json)
+#
+#  Ideas live in a data file with stable ids, so adding one is
+#  an edit, not a deploy. Each idea is loaded into a slotted
+#  record; categories, costs, durations and emojis repeat across
+#  tens of thousands of ideas, so they are interned and every
+#  record points at one shared copy.
+#
+#  gunicorn.conf.py loads the catalog in the master before it
+#  forks, so workers start out sharing those pages copy-on-write.
+#  The store checks the file's mtime every CHECK_INTERVAL seconds;
+#  on a change a background thread loads the new file, runs the
+#  on_reload callbacks (which rebuild the views built from it)
+#  and swaps it in. A broken file is logged and the old catalog
+#  stays in place.
+# ============================================================
+
+import os, sys, json, time, hashlib, threading
+
+CATALOG_PATH = os.environ.get(
+    "DATESPARK_CATALOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "catalog.json"))
+CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", 5))
+
+FIELDS = ("id", "title", "desc", "emoji", "duration", "cost")
+SEASONS = ("winter", "spring", "summer", "autumn")
+
+
+class CatalogError(ValueError):
+    pass
+
+
+class Idea:
+    __slots__ = ("id", "title", "desc", "emoji", "duration", "cost", "cat")
+
+    def __init__(self, id, title, desc, emoji, duration, cost, cat):
+        self.id, self.title, self.desc = id, title, desc
+        self.emoji, self.duration, self.cost, self.cat = emoji, duration, cost, cat
+
+    def to_dict(self, with_cat=True):
+        d = {"id": self.id, "title": self.title, "desc": self.desc, "emoji": self.emoji,
+             "duration": self.duration, "cost": self.cost}
+        if with_cat:
+            d["cat"] = self.cat
+        return d
+
+
+class Catalog:
+    __slots__ = ("ideas", "seasonal", "by_id", "version", "mtime", "load_seconds", "_nbytes")
+
+    def categories(self):
+        """{cat: [ideas]} in file order."""
+        out = {}
+        for idea in self.ideas:
+            out.setdefault(idea.cat, []).append(idea)
+        return out
+
+    def nbytes(self):
+        """Approximate size of the records and the strings they own (worked out once)."""
+        if self._nbytes is not None:
+            return self._nbytes
+        seen, total = set(), 0
+        for idea in (*self.ideas, *(i for ideas in self.seasonal.values() for i in ideas)):
+            if id(idea) in seen:
+                continue
+            seen.add(id(idea))
+            total += sys.getsizeof(idea)
+            for f in Idea.__slots__:
+                v = getattr(idea, f)
+                if id(v) not in seen:
+                    seen.add(id(v))
+                    total += sys.getsizeof(v)
+        self._nbytes = total + sys.getsizeof(self.ideas) + sys.getsizeof(self.by_id)
+        return self._nbytes
+
+
+def _idea(raw, cat, where):
+    if not isinstance(raw, dict):
+        raise CatalogError(f"{where}: not an object")
+    missing = [f for f in FIELDS if not isinstance(raw.get(f), str) or not raw[f]]
+    if missing:
+        raise CatalogError(f"{where}: missing {', '.join(missing)}")
+    cat = raw.get("cat", cat)
+    intern = sys.intern
+    return Idea(intern(raw["id"]), raw["title"], raw["desc"], intern(raw["emoji"]),
+                intern(raw["duration"]), intern(raw["cost"]), intern(cat))
+
+
+def load(path=CATALOG_PATH):
+    """Parse and validate the catalog file; raises CatalogError or OSError."""
+    started = time.perf_counter()
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise CatalogError(f"{path}: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("ideas"), dict):
+        raise CatalogError(f"{path}: expected {{\"ideas\": {{category: [...]}}, \"seasonal\": {{...}}}}")
+
+    ideas, by_id = [], {}
+    def add(idea, where):
+        if idea.id in by_id:
+            raise CatalogError(f"{where}: duplicate id {idea.id!r}")
+        by_id[idea.id] = idea
+        return idea
+    for cat, items in data["ideas"].items():
+        for i, item in enumerate(items):
+            ideas.append(add(_idea(item, cat, f"ideas.{cat}[{i}]"), f"ideas.{cat}[{i}]"))
+    seasonal = {}
+    for season in SEASONS:
+        items = data.get("seasonal", {}).get(season, [])
+        seasonal[season] = tuple(add(_idea(item, "surprise", f"seasonal.{season}[{i}]"), f"seasonal.{season}[{i}]")
+                                 for i, item in enumerate(items))
+
+    cat = Catalog()
+    cat.ideas, cat.seasonal, cat.by_id = tuple(ideas), seasonal, by_id
+    cat.version = hashlib.sha256(raw).hexdigest()[:12]
+    cat.mtime = mtime
+    cat.load_seconds = time.perf_counter() - started
+    cat._nbytes = None
+    return cat
+
+
+class CatalogStore:
+    def __init__(self, path=CATALOG_PATH, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._catalog = None
+        self._lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._checked = 0.0
+        self._seen_mtime = None        # last mtime we tried, good file or not
+        self._callbacks = []
+        self.last_reload_seconds = 0.0
+        self.counts = {"reloads": 0, "reload_errors": 0}
+
+    def current(self):
+        if self._catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    self._catalog = load(self.path)      # no catalog at all is fatal
+                    self._seen_mtime = self._catalog.mtime
+                    self._checked = time.monotonic()
+        return self._catalog
+
+    def on_reload(self, fn):
+        """fn(catalog) runs after every successful reload, in that worker."""
+        self._callbacks.append(fn)
+        return fn
+
+    def maybe_reload(self):
+        """Cheap enough for every request: a clock read, and a stat() every
+        CHECK_INTERVAL. A change is loaded in the background; requests keep
+        the old catalog until the swap. Returns True if a reload started."""
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return False
+        self.current()
+        if self._reloading.locked() or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                print(f"CATALOG ERROR: {e}")
+                return False
+            if mtime == self._seen_mtime:
+                return False
+            self._seen_mtime = mtime
+        finally:
+            self._lock.release()
+        threading.Thread(target=self.reload, name="catalog-reload", daemon=True).start()
+        return True
+
+    def reload(self):
+        """Load the file and run the callbacks now; False (old catalog kept) on a bad file."""
+        with self._reloading:
+            started = time.perf_counter()
+            try:
+                new = load(self.path)
+            except (OSError, CatalogError) as e:
+                print(f"CATALOG ERROR: {e} (keeping version {self.current().version})")
+                self.counts["reload_errors"] += 1
+                return False
+            for fn in self._callbacks:
+                try:
+                    fn(new)
+                except Exception as e:
+                    print(f"CATALOG RELOAD ERROR: {e}")
+            self._catalog = new
+            self.last_reload_seconds = time.perf_counter() - started
+            self.counts["reloads"] += 1
+            print(f"CATALOG: reloaded version {new.version} ({len(new.ideas)} ideas) "
+                  f"in {self.last_reload_seconds * 1000:.1f} ms")
+            return True
+
+    def stats(self):
+        cat = self.current()
+        return {**self.counts, "pid": os.getpid(), "version": cat.version, "ideas": len(cat.ideas),
+                "seasonal": sum(map(len, cat.seasonal.values())),
+                "load_ms": round(cat.load_seconds * 1000, 1),
+                "last_reload_ms": round(self.last_reload_seconds * 1000, 1),
+                "catalog_bytes": cat.nbytes(), **process_memory()}
+
+
+def process_memory():
+    """This worker's resident memory, split into what it shares with the
+    master/other workers and what is its own (Linux); {} elsewhere."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            kb = {k: int(v.split()[0]) for k, v in (line.split(":", 1) for line in f if ":" in line and "kB" in line)}
+    except (OSError, ValueError):
+        return {}
+    return {"rss_bytes": kb.get("Rss", 0) * 1024,
+            "shared_bytes": (kb.get("Shared_Clean", 0) + kb.get("Shared_Dirty", 0)) * 1024,
+            "private_bytes": (kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)) * 1024}
+
+
+store = CatalogStore()
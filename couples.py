@@ -0,0 +1,187 @@
+# ============================================================
+#  DateSpark AI — couples mode
+#
+#  Two sessions are linked through a share code. Every right
+#  swipe (a catalog idea id) goes into the couple's like set; a
+#  match is a set membership test against the partner's likes
+#  (O(1) in memory, one primary-key lookup in datespark.db when
+#  the partner swiped on another worker). Matches are pushed to
+#  waiting long-poll requests through a per-couple Condition;
+#  other workers see them on their next short DB check.
+# ============================================================
+
+import os, json, time, threading
+from collections import OrderedDict
+import storage
+import catalog
+
+MAX_COUPLES    = int(os.environ.get("COUPLES_CACHE", 10000))   # like-sets kept per worker
+POLL_TIMEOUT   = float(os.environ.get("COUPLES_POLL_TIMEOUT", 20))
+CROSS_CHECK    = 1.0     # seconds between DB checks while long-polling
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS couples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_a TEXT NOT NULL,
+    user_b TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS couple_members (
+    username TEXT PRIMARY KEY,
+    couple_id INTEGER NOT NULL,
+    partner TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS couple_likes (
+    couple_id INTEGER NOT NULL,
+    idea_key TEXT NOT NULL,
+    username TEXT NOT NULL,
+    PRIMARY KEY (couple_id, idea_key, username)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS couple_matches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    couple_id INTEGER NOT NULL,
+    idea_key TEXT NOT NULL,
+    idea TEXT NOT NULL,
+    matched_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (couple_id, idea_key)
+);
+"""
+
+
+class CoupleError(Exception):
+    """Bad share code, self-pairing, not connected, ..."""
+
+
+def _conn():
+    storage.ensure_schema("couples", SCHEMA)
+    return storage.get_conn()
+
+
+class _Couple:
+    __slots__ = ("likes", "cond")
+
+    def __init__(self, likes):
+        self.likes = likes                  # username -> set(idea_key)
+        self.cond = threading.Condition()
+
+
+class CoupleHub:
+    def __init__(self, max_couples=MAX_COUPLES):
+        self.max_couples = max_couples
+        self._lock = threading.Lock()
+        self._couples = OrderedDict()       # couple_id -> _Couple
+
+    def _state(self, couple_id):
+        with self._lock:
+            c = self._couples.get(couple_id)
+            if c is not None:
+                self._couples.move_to_end(couple_id)
+                return c
+        # one query per couple per worker, not one per swipe
+        likes = {}
+        for key, user in _conn().execute(
+                "SELECT idea_key, username FROM couple_likes WHERE couple_id = ?", (couple_id,)):
+            likes.setdefault(user, set()).add(key)
+        with self._lock:
+            c = self._couples.get(couple_id)
+            if c is None:
+                c = self._couples[couple_id] = _Couple(likes)
+                while len(self._couples) > self.max_couples:
+                    self._couples.popitem(last=False)
+            return c
+
+    # ── linking ─────────────────────────────────────────────
+    def membership(self, username):
+        row = _conn().execute(
+            "SELECT couple_id, partner FROM couple_members WHERE username = ?", (username,)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def connect(self, username, code):
+        row = _conn().execute(
+            "SELECT username FROM users WHERE share_code = ?", (code.strip().upper(),)).fetchone()
+        if not row:
+            raise CoupleError("No one has that code")
+        partner = row[0]
+        if partner == username:
+            raise CoupleError("That's your own code")
+        with storage.write() as conn:
+            existing = conn.execute(
+                "SELECT couple_id FROM couple_members WHERE username = ? AND partner = ?",
+                (username, partner)).fetchone()
+            if existing:
+                return existing[0], partner
+            couple_id = conn.execute("INSERT INTO couples (user_a, user_b) VALUES (?, ?)",
+                                     (username, partner)).lastrowid
+            # whoever either of us was paired with before is now unpaired
+            conn.execute("DELETE FROM couple_members WHERE partner IN (?, ?)", (username, partner))
+            conn.executemany(
+                "INSERT OR REPLACE INTO couple_members (username, couple_id, partner) VALUES (?, ?, ?)",
+                [(username, couple_id, partner), (partner, couple_id, username)])
+        state = self._state(couple_id)
+        with state.cond:
+            state.cond.notify_all()
+        return couple_id, partner
+
+    # ── swiping ─────────────────────────────────────────────
+    def like(self, username, idea):
+        """Record a right swipe on a catalog.Idea; returns the match row dict or None."""
+        couple_id, partner = self.membership(username)
+        if couple_id is None:
+            raise CoupleError("Not connected")
+        key = idea.id
+        state = self._state(couple_id)
+        with storage.write() as conn:
+            conn.execute("INSERT OR IGNORE INTO couple_likes (couple_id, idea_key, username) VALUES (?, ?, ?)",
+                         (couple_id, key, username))
+        with state.cond:
+            state.likes.setdefault(username, set()).add(key)
+            matched = key in state.likes.get(partner, ())
+        if not matched:
+            # partner may have swiped on another worker: primary-key probe
+            matched = _conn().execute(
+                "SELECT 1 FROM couple_likes WHERE couple_id = ? AND idea_key = ? AND username = ?",
+                (couple_id, key, partner)).fetchone() is not None
+            if matched:
+                with state.cond:
+                    state.likes.setdefault(partner, set()).add(key)
+        if not matched:
+            return None
+        with storage.write() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO couple_matches (couple_id, idea_key, idea) VALUES (?, ?, ?)",
+                (couple_id, key, json.dumps(idea.to_dict(), ensure_ascii=False)))
+        with state.cond:
+            state.cond.notify_all()
+        return {**idea.to_dict(), "match_id": cur.lastrowid} if cur.rowcount else None
+
+    # ── notifications ───────────────────────────────────────
+    def matches_since(self, couple_id, since=0):
+        """Matches after `since`, rendered from the current catalog. The
+        stored copy is only a record: rows from before likes were keyed
+        by catalog id hold whatever a browser sent, and are skipped."""
+        by_id = catalog.store.current().by_id
+        return [{**by_id[key].to_dict(), "match_id": mid} for mid, key in _conn().execute(
+            "SELECT id, idea_key FROM couple_matches WHERE couple_id = ? AND id > ? ORDER BY id",
+            (couple_id, since)) if key in by_id]
+
+    def wait(self, username, since=0, timeout=POLL_TIMEOUT):
+        """Long-poll: block until there is a match newer than `since`, up to
+        `timeout` seconds. Answers at once for an unpaired user — the page
+        only long-polls once paired."""
+        deadline = time.monotonic() + timeout
+        couple_id, partner = self.membership(username)
+        if couple_id is None:
+            return {"partner": None, "matches": []}
+        while True:
+            found = self.matches_since(couple_id, since)
+            if found:
+                return {"partner": partner, "matches": found}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {"partner": partner, "matches": []}
+            state = self._state(couple_id)
+            with state.cond:
+                state.cond.wait(min(CROSS_CHECK, remaining))
+
+
+hub = CoupleHub()
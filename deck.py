@@ -0,0 +1,121 @@
+# ============================================================
+#  DateSpark AI — server-side swipe deck
+#
+#  The catalog's idea records are indexed once:
+#   • category      -> ids
+#   • cost tier     -> ids     ("Free"=0, "$"=1 … "$$$$"=4)
+#   • duration (min) sorted    ("2-3 hrs"=150, "Half day"=240 …)
+#  /api/deck intersects the indexes for a filter, shuffles the
+#  matching ids with a seeded Fisher–Yates, and returns one page
+#  plus a cursor for the next.
+# ============================================================
+
+import re, base64, random, threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+COST_TIERS = {"free": 0, "$": 1, "$$": 2, "$$$": 3, "$$$$": 4}
+NAMED_DURATIONS = {"evening": 180, "half day": 240, "full day": 480, "weekend": 2880}
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*(min|hr|hour)", re.I)
+
+MAX_PAGE = 50
+PERM_CACHE = 256     # shuffled orders kept per worker
+
+
+def parse_cost(text):
+    """Cost string -> tier 0-4, or None for "Varies"/unknown."""
+    return COST_TIERS.get((text or "").strip().lower())
+
+def parse_duration(text):
+    """Duration string -> minutes (midpoint of a range), or None."""
+    t = (text or "").strip().lower()
+    if t in NAMED_DURATIONS:
+        return NAMED_DURATIONS[t]
+    m = _DURATION.search(t)
+    if not m:
+        return None
+    lo = float(m.group(1))
+    hi = float(m.group(2)) if m.group(2) else lo
+    per = 1 if m.group(3).lower() == "min" else 60
+    return int((lo + hi) / 2 * per)
+
+def encode_cursor(seed, offset):
+    return base64.urlsafe_b64encode(f"{seed}:{offset}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        seed, offset = raw.split(":")
+        return int(seed), int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("bad cursor")
+
+
+class Deck:
+    def __init__(self, ideas):
+        """ideas: catalog.Idea records (anything with .cat/.cost/.duration/.to_dict())."""
+        self.cards = list(ideas)
+        self.by_cat = {}
+        self.by_cost = {}
+        timed = []
+        for cid, idea in enumerate(self.cards):
+            self.by_cat.setdefault(idea.cat, []).append(cid)
+            tier = parse_cost(idea.cost)
+            if tier is not None:
+                self.by_cost.setdefault(tier, []).append(cid)
+            minutes = parse_duration(idea.duration)
+            if minutes is not None:
+                timed.append((minutes, cid))
+        timed.sort()
+        self._minutes = [m for m, _ in timed]
+        self._by_minutes = [cid for _, cid in timed]
+        self._perms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def match(self, cats=None, max_cost=None, min_minutes=None, max_minutes=None):
+        """Sorted tuple of card ids passing every given filter."""
+        result = None
+        def narrow(ids):
+            nonlocal result
+            result = set(ids) if result is None else result & set(ids)
+        if cats:
+            narrow(cid for c in cats for cid in self.by_cat.get(c, ()))
+        if max_cost is not None:
+            narrow(cid for tier, ids in self.by_cost.items() if tier <= max_cost for cid in ids)
+        if min_minutes is not None or max_minutes is not None:
+            lo = 0 if min_minutes is None else bisect_left(self._minutes, min_minutes)
+            hi = len(self._minutes) if max_minutes is None else bisect_right(self._minutes, max_minutes)
+            narrow(self._by_minutes[lo:hi])
+        if result is None:
+            return tuple(range(len(self.cards)))
+        return tuple(sorted(result))
+
+    def _shuffled(self, ids, seed):
+        key = (ids, seed)
+        with self._lock:
+            order = self._perms.get(key)
+            if order is not None:
+                self._perms.move_to_end(key)
+                return order
+        order = list(ids)
+        rng = random.Random(seed)
+        for i in range(len(order) - 1, 0, -1):      # Fisher–Yates
+            j = rng.randint(0, i)
+            order[i], order[j] = order[j], order[i]
+        with self._lock:
+            self._perms[key] = order
+            while len(self._perms) > PERM_CACHE:
+                self._perms.popitem(last=False)
+        return order
+
+    def page(self, ids, seed, offset=0, limit=10):
+        limit = max(1, min(limit, MAX_PAGE))
+        order = self._shuffled(ids, seed)
+        chunk = order[offset:offset + limit]
+        end = offset + len(chunk)
+        return {
+            "cards": [self.cards[cid].to_dict() for cid in chunk],
+            "total": len(order),
+            "seed": seed,
+            "next": encode_cursor(seed, end) if end < len(order) else None,
+        }
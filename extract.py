@@ -0,0 +1,194 @@
+# ============================================================
+#  DateSpark AI — getting JSON out of model answers
+#
+#  Gemini wraps its JSON in code fences, chats before and after
+#  it, leaves trailing commas, and stops mid-array when it hits
+#  maxOutputTokens. find_json() walks the text once, string- and
+#  escape-aware, and returns the first balanced value that parses:
+#  trailing commas are dropped on the way, and a value cut off at
+#  the end is closed after its last complete element. parse()
+#  keeps scanning until a value fits the endpoint's schema, so a
+#  "[1]" in the prose doesn't hide the answer after it and only
+#  an answer with nothing usable in it costs a second generation.
+#  Scanning resumes after a value that parsed, never inside it:
+#  a rejected answer's own members (an itinerary's stop, a step
+#  object) are not answers.
+# ============================================================
+
+import json, threading
+
+_OPEN = {"{": "}", "[": "]"}
+MAX_CANDIDATES = 16      # brackets tried per answer; each try may walk the rest of the text
+
+
+class ExtractError(ValueError):
+    def __init__(self, message, raw=""):
+        super().__init__(message)
+        self.raw = raw
+
+
+_lock = threading.Lock()
+counts = {"clean": 0, "repaired": 0, "failed": 0}
+
+def _count(what):
+    with _lock:
+        counts[what] += 1
+
+
+def _scan(text, start):
+    """Walk one value from text[start] (an opening bracket). Returns
+    (candidate, repaired, end): the value with trailing commas removed,
+    closed off after its last complete element if the text ran out, and
+    the offset just past what it took from `text`."""
+    closers = []
+    drop = []              # indexes of trailing commas
+    last_sig = None        # last non-space char outside strings
+    safe = None            # (end, closing brackets, trailing commas so far) after the last complete element
+    in_str = esc = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+                last_sig = i
+                if closers[-1] == "]":
+                    safe = (i + 1, "".join(reversed(closers)), len(drop))
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in _OPEN:
+            closers.append(_OPEN[ch])
+        elif ch == "}" or ch == "]":
+            if ch != closers[-1]:
+                return None, False, i
+            if last_sig is not None and text[last_sig] == ",":
+                drop.append(last_sig)
+            closers.pop()
+            if not closers:
+                return _without(text, start, i + 1, drop), bool(drop), i + 1
+            safe = (i + 1, "".join(reversed(closers)), len(drop))
+        elif ch == ",":
+            safe = (i, "".join(reversed(closers)), len(drop))
+        elif ch.isspace():
+            continue
+        last_sig = i
+    if safe is None:
+        return None, False, len(text)
+    end, tail, ndrop = safe
+    return _without(text, start, end, drop[:ndrop]).rstrip().rstrip(",") + tail, True, len(text)
+
+
+def _without(text, start, end, drop):
+    if not drop:
+        return text[start:end]
+    parts, prev = [], start
+    for d in drop:
+        parts.append(text[prev:d])
+        prev = d + 1
+    parts.append(text[prev:end])
+    return "".join(parts)
+
+
+def _values(text):
+    """The top-level JSON objects/arrays in `text` that parse, in order, as
+    (value, repaired); at most MAX_CANDIDATES brackets are tried."""
+    i = 0
+    for _ in range(MAX_CANDIDATES):
+        starts = [p for p in (text.find("{", i), text.find("[", i)) if p != -1]
+        if not starts:
+            return
+        i = min(starts)
+        candidate, repaired, end = _scan(text, i)
+        if candidate is not None:
+            try:
+                value = json.loads(candidate, strict=False)
+            except ValueError:
+                pass          # a bracket in the surrounding prose
+            else:
+                yield value, repaired
+                i = end
+                continue
+        i += 1
+
+
+def find_json(text):
+    """First JSON object/array in `text` that parses. Returns (value, repaired)."""
+    for found in _values(text):
+        return found
+    raise ExtractError("No JSON value found", text)
+
+
+# ── per-endpoint shapes ──────────────────────────────────────
+# (required string fields, {list field: element type}) for one item;
+# "places" and "batch" answers are arrays of such items. A "slots"
+# array keeps its positions: an item that doesn't fit becomes None, so
+# the ones after it still line up with what was asked for.
+IDEA      = (("title",), {"steps": str})
+ITINERARY = (("title",), {"timeline": dict})
+PLACE     = (("name",), {})
+STOP      = (("activity",), {})
+
+SCHEMAS = {
+    "quick":     ("object", IDEA),
+    "itinerary": ("object", ITINERARY),
+    "places":    ("array", PLACE),
+    "batch":     ("slots", IDEA),
+}
+
+
+def _fits(item, shape):
+    required, lists = shape
+    if not isinstance(item, dict):
+        return False
+    if not all(isinstance(item.get(k), str) and item[k].strip() for k in required):
+        return False
+    for key, kind in lists.items():
+        if key in item and not (isinstance(item[key], list) and all(isinstance(v, kind) for v in item[key])):
+            return False
+    return True
+
+
+def validate(endpoint, value):
+    """The answer in the shape `endpoint` promises, or ExtractError."""
+    kind, shape = SCHEMAS[endpoint]
+    if kind == "object":
+        if isinstance(value, list) and len(value) >= 1:
+            value = value[0]                       # "[{...}]" for a single idea
+        if not _fits(value, shape):
+            raise ExtractError(f"Answer is not a valid {endpoint} object")
+        if endpoint == "itinerary":
+            value["timeline"] = [t for t in value.get("timeline", []) if _fits(t, STOP)]
+            if not value["timeline"]:
+                raise ExtractError("Itinerary has no timeline")
+        return value
+    if isinstance(value, dict):
+        # {"places": [...]} and friends
+        lists = [v for v in value.values() if isinstance(v, list)]
+        value = lists[0] if len(lists) == 1 else [value]
+    if not isinstance(value, list):
+        value = []
+    items = [v if _fits(v, shape) else None for v in value]
+    if not any(items):
+        raise ExtractError(f"Answer has no valid {endpoint} items")
+    return items if kind == "slots" else [v for v in items if v is not None]
+
+
+def parse(endpoint, text):
+    """Model text -> first value in it that validates for `endpoint`; raises ExtractError."""
+    error = None
+    for value, repaired in _values(text):
+        try:
+            value = validate(endpoint, value)
+        except ExtractError as e:
+            error = error or e        # report why the first candidate was rejected
+            continue
+        _count("repaired" if repaired else "clean")
+        return value
+    _count("failed")
+    error = error or ExtractError("No JSON value found")
+    error.raw = text
+    raise error
@@ -0,0 +1,233 @@
+# ============================================================
+#  DateSpark AI — local answers when Gemini can't give one
+#
+#  Builds a quick idea or an itinerary from the catalog in a few
+#  milliseconds, with no network. Words in the topic pick filters
+#  (cost, duration, category, season); the deck's indexes narrow
+#  the catalog to the ideas that pass (dropping the filters one by
+#  one if nothing does), and word overlap with the topic ranks a
+#  bounded, topic-seeded sample of them, so the same topic gets the
+#  same answer. Answers have the shape of /api/ai/quick and
+#  /api/ai/itinerary plus "local": true.
+#
+#  main.py answers with one when call_gemini gives up (None or
+#  RATE_LIMITED), and the page asks /api/ai/local/... for one to
+#  show while the real answer is still on its way.
+# ============================================================
+
+import re, zlib, random
+from deck import parse_cost, parse_duration
+
+MAX_CANDIDATES = 400      # ideas scored per answer, however big the catalog
+STOPS = 3                 # itinerary length
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("a an the and or but for with of to in on at by from as is are be it its this that "
+                       "we our us me my i you your date idea ideas something some".split())
+
+COST_WORDS = {"free": 0, "broke": 0, "cheap": 1, "budget": 1, "affordable": 1, "inexpensive": 1, "low": 1}
+FANCY_WORDS = frozenset("fancy luxury luxurious splurge expensive upscale classy elegant lavish".split())
+# (min, max) minutes
+DURATION_WORDS = {"quick": (None, 120), "short": (None, 120), "fast": (None, 120), "hour": (None, 90),
+                  "evening": (90, 300), "night": (90, 300), "afternoon": (120, 300), "morning": (60, 300),
+                  "day": (240, 600), "daytrip": (240, 600), "weekend": (1440, None), "getaway": (1440, None)}
+CATEGORY_WORDS = {
+    "home": "home indoor indoors inside cozy couch stay staycation cook cooking",
+    "outdoor": "outdoor outdoors outside nature hike hiking park picnic beach garden camping",
+    "city": "city downtown urban restaurant bar museum cafe concert",
+    "travel": "travel trip roadtrip road abroad vacation",
+    "surprise": "surprise mystery spontaneous random secret",
+    "budget": "free broke cheap budget",
+    "luxury": "fancy luxury luxurious splurge upscale lavish",
+}
+SEASON_WORDS = {
+    "winter": "winter snow snowy christmas holiday holidays cold december january february",
+    "spring": "spring blossom blossoms easter flowers bloom march april may",
+    "summer": "summer beach hot sunny sun pool july june august",
+    "autumn": "autumn fall halloween leaves pumpkin harvest october september november",
+}
+COST_NAMES = ("Free", "$", "$$", "$$$", "$$$$")
+START_TIMES = {"morning": 10 * 60, "brunch": 11 * 60, "afternoon": 14 * 60, "lunch": 12 * 60}
+EVENING_START, DAY_START = 18 * 60, 10 * 60
+EVENING_PLAN, DAY_PLAN = 270, 600      # minutes an itinerary fills
+GAP = 15                               # minutes between stops
+MORNING_ONLY = frozenset("sunrise breakfast morning brunch".split())
+EVENING_ONLY = frozenset("night sunset stargazing evening dinner cinema".split())
+
+TIPS = {
+    "home": "Put your phones in another room — the whole point is each other.",
+    "outdoor": "Check the weather the day before and pack a plan B.",
+    "city": "Book ahead on weekends; walk-ins get the worst tables.",
+    "budget": "Set a tiny budget and make a game of staying under it.",
+    "luxury": "Reserve early and ask about the chef's or house specials.",
+    "travel": "Pack the night before so the trip starts relaxed.",
+    "surprise": "Give them one clue a day in the run-up.",
+}
+DEFAULT_TIP = "Keep the plan loose — the best moments are the unplanned ones."
+STEPS = {
+    "home": ["Pick a time and clear the evening", "Set the scene: lights low, music on", "Do it together, no multitasking"],
+    "outdoor": ["Pick the spot and check the weather", "Pack snacks, water and a blanket", "Go slow and enjoy the view"],
+    "city": ["Choose the place and book if needed", "Plan how you'll get there", "Leave room to wander after"],
+    "budget": ["Set your budget together", "Gather what you need", "Make the most of it"],
+    "luxury": ["Make the reservation", "Dress up for it", "Take your time and savour it"],
+    "travel": ["Pick the destination and dates", "Book travel and a place to stay", "Leave one day unplanned"],
+    "surprise": ["Plan every detail in secret", "Give a dress code and a time", "Reveal it on the day"],
+}
+DEFAULT_STEPS = ["Pick a time that works for both of you", "Get everything ready", "Enjoy it together"]
+
+
+def words(text):
+    return [w[:-1] if len(w) > 3 and w.endswith("s") else w for w in _WORD.findall((text or "").lower())]
+
+
+def clock(minutes):
+    h, m = divmod(minutes % (24 * 60), 60)
+    return f"{(h - 1) % 12 + 1}:{m:02d} {'AM' if h < 12 else 'PM'}"
+
+
+def span(minutes):
+    if minutes < 60:
+        return f"{minutes} min"
+    h, m = divmod(minutes, 60)
+    return f"{h} hr{'s' if h > 1 else ''}" + (f" {m} min" if m else "")
+
+
+class Generator:
+    def __init__(self, cat, deck):
+        """cat: catalog.Catalog; deck: the Deck built from cat.ideas."""
+        self.deck = deck
+        self.seasonal = cat.seasonal
+        self.categories = set(deck.by_cat)
+        self._lookup = {}
+        self._words = {}          # idea id -> (title words, desc words), filled as ideas get scored
+        for c in self.categories:
+            self._lookup[c] = ("cat", c)
+        for c, ws in CATEGORY_WORDS.items():
+            if c in self.categories:
+                for w in ws.split():
+                    self._lookup.setdefault(w, ("cat", c))
+        for season, ws in SEASON_WORDS.items():
+            for w in ws.split():
+                self._lookup.setdefault(w, ("season", season))
+
+    def read(self, topic):
+        """The filters a topic asks for, and the words left to match on."""
+        want = {"cats": set(), "seasons": set(), "max_cost": None, "fancy": False,
+                "minutes": (None, None), "start": None}
+        terms = []
+        for w in words(topic):
+            if w in STOP_WORDS:
+                continue
+            terms.append(w)
+            if w in COST_WORDS:
+                tier = COST_WORDS[w]
+                want["max_cost"] = tier if want["max_cost"] is None else min(tier, want["max_cost"])
+            if w in FANCY_WORDS:
+                want["fancy"] = True
+            if w in DURATION_WORDS:
+                want["minutes"] = DURATION_WORDS[w]
+            if w in START_TIMES and want["start"] is None:
+                want["start"] = START_TIMES[w]
+            kind, value = self._lookup.get(w, (None, None))
+            if kind == "cat":
+                want["cats"].add(value)
+            elif kind == "season":
+                want["seasons"].add(value)
+        return want, set(terms)
+
+    def candidates(self, want, seed):
+        """Ideas passing the topic's filters, loosest last, as a bounded sample."""
+        lo, hi = want["minutes"]
+        tries = [(want["cats"], want["max_cost"], lo, hi), (want["cats"], want["max_cost"], None, None),
+                 (want["cats"], None, None, None), ((), None, None, None)]
+        for cats, max_cost, lo, hi in tries:
+            ids = self.deck.match(sorted(cats), max_cost, lo, hi)
+            if ids:
+                break
+        if len(ids) > MAX_CANDIDATES:
+            ids = random.Random(seed).sample(ids, MAX_CANDIDATES)
+        ideas = [self.deck.cards[i] for i in ids]
+        for season in sorted(want["seasons"]):
+            ideas.extend(self.seasonal.get(season, ()))
+        return ideas
+
+    def idea_words(self, idea):
+        got = self._words.get(idea.id)
+        if got is None:
+            got = self._words[idea.id] = (frozenset(words(idea.title)), frozenset(words(idea.desc)))
+        return got
+
+    def ranked(self, topic):
+        want, terms = self.read(topic)
+        seed = zlib.crc32((topic or "").strip().lower().encode())
+        rng = random.Random(seed)
+        seasonal = {i.id for s in want["seasons"] for i in self.seasonal.get(s, ())}
+
+        def score(idea):
+            title, desc = self.idea_words(idea)
+            s = 2 * len(terms & title) + len(terms & desc)
+            if idea.id in seasonal:
+                s += 3
+            if idea.cat in want["cats"]:
+                s += 1
+            if want["fancy"] and (parse_cost(idea.cost) or 0) >= 3:
+                s += 2
+            return s + rng.random()        # ties broken the same way every time for this topic
+
+        ideas = {i.id: i for i in self.candidates(want, seed)}
+        return want, sorted(ideas.values(), key=score, reverse=True)
+
+    # ── answers ─────────────────────────────────────────────
+    def quick(self, topic):
+        want, ranked = self.ranked(topic)
+        if not ranked:
+            return None
+        idea = ranked[0]
+        return {"title": idea.title, "desc": idea.desc, "emoji": idea.emoji, "duration": idea.duration,
+                "cost": idea.cost, "tip": TIPS.get(idea.cat, DEFAULT_TIP),
+                "steps": list(STEPS.get(idea.cat, DEFAULT_STEPS)), "local": True}
+
+    def itinerary(self, topic):
+        want, ranked = self.ranked(topic)
+        lo, hi = want["minutes"]
+        day_out = (lo or 0) >= 240                   # a day or a weekend: start in the morning
+        plan = min(hi or (DAY_PLAN if day_out else EVENING_PLAN), DAY_PLAN)
+        at = want["start"] if want["start"] is not None else DAY_START if day_out else EVENING_START
+        wrong_time = MORNING_ONLY if at >= 16 * 60 else EVENING_ONLY if at < 12 * 60 else frozenset()
+        stops, cats = [], set()
+        for pick_new_cat in (True, False):    # mix categories if the catalog allows it
+            for idea in ranked:
+                if len(stops) == STOPS:
+                    break
+                minutes = parse_duration(idea.duration)
+                if idea in stops or (pick_new_cat and idea.cat in cats) or wrong_time & self.idea_words(idea)[0]:
+                    continue
+                if not day_out and (minutes is None or minutes > plan):
+                    continue
+                stops.append(idea)
+                cats.add(idea.cat)
+        stops = stops or ranked[:STOPS]
+        if not stops:
+            return None
+        share = (plan - GAP * (len(stops) - 1)) // len(stops) // 5 * 5
+        timeline, total = [], 0
+        for idea in stops:
+            minutes = min(parse_duration(idea.duration) or share, share)
+            timeline.append({"time": clock(at), "activity": f"{idea.emoji} {idea.title}",
+                             "tip": idea.desc, "duration": span(minutes)})
+            at += minutes + GAP
+            total += minutes + GAP
+        costs = [c for c in (parse_cost(i.cost) for i in stops) if c is not None]
+        name = " ".join((topic or "").split())[:40].strip()
+        return {"title": f"{name.title()} Date" if name else "Spontaneous Date", "emoji": stops[0].emoji,
+                "totalDuration": span(total - GAP), "totalCost": COST_NAMES[max(costs)] if costs else "Varies",
+                "overview": "An instant plan from the DateSpark catalog: " + ", then ".join(i.title for i in stops) + ".",
+                "timeline": timeline, "local": True}
+
+    def answer(self, endpoint, topic):
+        """A local answer for `endpoint` ("quick" / "itinerary"), or None."""
+        if endpoint == "quick":
+            return self.quick(topic)
+        if endpoint == "itinerary":
+            return self.itinerary(topic)
+        return None
@@ -0,0 +1,191 @@
+# ============================================================
+#  DateSpark AI — pooled HTTP client for the Gemini API
+#
+#  • one keep-alive requests.Session per client (routing.py keeps
+#    one client per key x model target)
+#  • jittered exponential retry that honours Retry-After
+#  • circuit breaker: after a run of failures we fail fast for
+#    a cool-down window instead of parking a worker for 30 s
+#  • optional budget: every request that actually goes upstream,
+#    retries included, must first be paid for (routing.py wires
+#    it to the global token bucket)
+# ============================================================
+
+import os, json, time, random, threading
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+POOL_SIZE         = int(os.environ.get("GEMINI_POOL_SIZE", 100))
+CONNECT_TIMEOUT   = float(os.environ.get("GEMINI_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT      = float(os.environ.get("GEMINI_READ_TIMEOUT", 30))
+MAX_RETRIES       = int(os.environ.get("GEMINI_MAX_RETRIES", 3))
+BACKOFF_BASE      = float(os.environ.get("GEMINI_BACKOFF_BASE", 0.5))
+BACKOFF_MAX       = float(os.environ.get("GEMINI_BACKOFF_MAX", 8))
+RETRY_BUDGET      = float(os.environ.get("GEMINI_RETRY_BUDGET", 20))   # total seconds spent sleeping
+BREAKER_FAILURES  = int(os.environ.get("GEMINI_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN  = float(os.environ.get("GEMINI_BREAKER_COOLDOWN", 30))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling Gemini while the breaker is open."""
+
+
+class OverBudget(Exception):
+    """Raised instead of calling Gemini when the budget refuses the call."""
+
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._streak = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._open_until == 0.0:
+                return "closed"
+            return "open" if time.monotonic() < self._open_until else "half_open"
+
+    def allow(self):
+        with self._lock:
+            if self._open_until == 0.0:
+                return True
+            if time.monotonic() < self._open_until or self._probing:
+                return False
+            self._probing = True   # let exactly one request test the water
+            return True
+
+    def success(self):
+        with self._lock:
+            self._streak = 0
+            self._open_until = 0.0
+            self._probing = False
+
+    def failure(self, hold=0.0):
+        with self._lock:
+            self._streak += 1
+            if self._probing or self._streak >= self.failures:
+                self._open_until = time.monotonic() + max(self.cooldown, hold)
+            self._probing = False
+
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    # "full jitter": uniform in [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+class GeminiClient:
+    def __init__(self, pool_size=POOL_SIZE, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries=MAX_RETRIES, breaker=None, budget=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget       # () -> True if one more upstream request may be sent
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # gunicorn forks workers after import; never share sockets across processes
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    s = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size,
+                                          pool_block=False, max_retries=0)
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    self._session, self._pid = s, os.getpid()
+        return self._session
+
+    def _spend(self):
+        if self.budget is None or self.budget():
+            return True
+        metrics.GEMINI_CALLS.inc(status="over_budget")
+        return False
+
+    def post(self, url, body, **kwargs):
+        """POST with retries. Returns the final Response; raises CircuitOpen,
+        OverBudget, or the last network error once retries are used up. A
+        retry the budget refuses ends the loop like running out of retries."""
+        slept = 0.0
+        attempt = 0
+        if not self._spend():
+            raise OverBudget("no budget left for a Gemini call")
+        while True:
+            if not self.breaker.allow():
+                metrics.GEMINI_CALLS.inc(status="circuit_open")
+                raise CircuitOpen("Gemini circuit breaker is open")
+            if attempt:
+                metrics.GEMINI_RETRIES.inc()
+            t0 = time.perf_counter()
+            try:
+                r = self.session.post(url, json=body, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.GEMINI_LATENCY.observe(time.perf_counter() - t0, status="error")
+                metrics.GEMINI_CALLS.inc(status=e.__class__.__name__)
+                self.breaker.failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                if slept + delay > RETRY_BUDGET:
+                    raise requests.Timeout("Gemini retry budget exhausted")
+                if not self._spend():
+                    raise
+                print(f"GEMINI RETRY {attempt + 1}: {e.__class__.__name__}, sleeping {delay:.2f}s")
+            else:
+                metrics.GEMINI_LATENCY.observe(time.perf_counter() - t0, status=str(r.status_code))
+                metrics.GEMINI_CALLS.inc(status=str(r.status_code))
+                if r.status_code not in RETRY_STATUSES:
+                    self.breaker.success()
+                    return r
+                hint = retry_after_seconds(r.headers.get("Retry-After"))
+                self.breaker.failure(hold=hint or 0.0)
+                delay = hint if hint is not None else backoff_delay(attempt)
+                if attempt >= self.max_retries or slept + delay > RETRY_BUDGET or not self._spend():
+                    return r
+                r.close()
+                print(f"GEMINI RETRY {attempt + 1}: HTTP {r.status_code}, sleeping {delay:.2f}s")
+            time.sleep(delay)
+            slept += delay
+            attempt += 1
+
+
+def iter_stream_text(r):
+    """Yield text fragments from a streamGenerateContent?alt=sse response."""
+    r.encoding = "utf-8"
+    for line in r.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        try:
+            chunk = json.loads(line[5:])
+        except ValueError:
+            continue
+        for cand in chunk.get("candidates", [])[:1]:
+            for part in cand.get("content", {}).get("parts", []):
+                if part.get("text"):
+                    yield part["text"]
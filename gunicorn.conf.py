@@ -0,0 +1,66 @@
+# ============================================================
+#  DateSpark AI — gunicorn settings
+#
+#  gevent workers: a Gemini call is socket I/O, so while one
+#  request waits 3-30 s on Google the worker keeps serving other
+#  greenlets — hundreds of AI calls in flight per worker, and /
+#  and /api/ideas stay fast. Every blocking call the app makes
+#  (requests, time.sleep, threading locks and conditions, the
+#  batch/refresh thread pools) is cooperative once gunicorn has
+#  monkey-patched the worker.
+#
+#  GUNICORN_WORKER_CLASS=gthread falls back to OS threads.
+# ============================================================
+
+import os, sys, gc, shutil, tempfile, multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.environ.get("WEB_CONCURRENCY", min(4, multiprocessing.cpu_count())))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))   # greenlets per worker
+# gunicorn silently turns "sync" with threads > 1 into gthread
+threads = int(os.environ.get("GUNICORN_THREADS", 16)) if worker_class == "gthread" else 1
+
+# SSE streams and couples long-polls hold a request open for a while
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+# don't preload: the app must be imported after gevent has patched the worker
+preload_app = False
+
+# ...but the idea catalog is plain data (no sockets, threads or gevent-sensitive
+# imports), so the master loads it once and the workers inherit it copy-on-write.
+# gc.freeze() right before each fork keeps the collector from writing to those
+# pages in every worker. CATALOG_PRELOAD=0 loads it per worker instead.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+if os.environ.get("CATALOG_PRELOAD", "1") != "0":
+    import catalog
+    catalog.store.current()
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+# one metrics directory per run, shared by its workers (see metrics.py); a
+# worker's numbers move into dead.json when it exits, and the run's directory
+# goes when the master does
+_own_metrics_dir = "DATESPARK_METRICS_DIR" not in os.environ
+if _own_metrics_dir:
+    os.environ["DATESPARK_METRICS_DIR"] = tempfile.mkdtemp(prefix="datespark-metrics-")
+
+def child_exit(server, worker):
+    import metrics
+    try:
+        metrics.fold_dead()
+    except OSError as e:
+        server.log.warning(f"metrics: could not fold worker {worker.pid}: {e}")
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ["DATESPARK_METRICS_DIR"], ignore_errors=True)
+
+# the Procfile deploy sits behind one router that appends X-Forwarded-For;
+# set TRUSTED_PROXIES=0 when gunicorn faces clients directly (see client_ip)
+os.environ.setdefault("TRUSTED_PROXIES", "1")
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG")   # e.g. "-" for stdout
@@ -0,0 +1,174 @@
+# ============================================================
+#  DateSpark AI — background AI jobs
+#
+#  Slow generations (itineraries) can run detached from the
+#  request: submit() puts the job on a bounded in-process queue
+#  served by a few worker threads and returns an id right away.
+#  Job state lives in the `ai_jobs` table of datespark.db, so
+#  whichever gunicorn worker the client polls can answer. When
+#  the queue is full, submit() refuses at once (QueueFull) rather
+#  than letting requests pile up behind it.
+# ============================================================
+
+import os, json, time, queue, secrets, sqlite3, threading
+import storage
+
+WORKERS   = int(os.environ.get("AI_JOB_WORKERS", 4))
+MAX_QUEUE = int(os.environ.get("AI_JOB_QUEUE", 32))
+JOB_TTL   = int(os.environ.get("AI_JOB_TTL", 3600))          # finished jobs are kept this long
+LOST_AFTER = float(os.environ.get("AI_JOB_LOST_AFTER", 180))  # running this long = its worker died
+POLL_INTERVAL = 0.5
+PRUNE_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_created ON ai_jobs(created_at);
+"""
+
+FINISHED = ("done", "error")
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class JobFailed(Exception):
+    """Raised by a job function; the message is shown to the client."""
+
+
+class JobQueue:
+    def __init__(self, workers=WORKERS, max_queue=MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queue = None
+        self._pid = None
+        self._avg_seconds = 10.0          # EWMA of job run time, for Retry-After
+        self.counts = {"submitted": 0, "rejected": 0, "done": 0, "error": 0}
+
+    def _conn(self):
+        storage.ensure_schema("ai_jobs", SCHEMA)
+        return storage.get_conn()
+
+    def _start(self):
+        """Worker threads are per process; start them on first use after a fork."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._queue
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, args=(self._queue,), name=f"ai-job-{i}", daemon=True).start()
+            return self._queue
+
+    def _set(self, job_id, status, result=None, error=None):
+        try:
+            self._conn()
+            with storage.write() as conn:
+                conn.execute("UPDATE ai_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                             (status, result, error, time.time(), job_id))
+        except sqlite3.Error as e:
+            print(f"JOB DB ERROR: {e}")
+        with self._changed:
+            self._changed.notify_all()
+
+    def _work(self, q):
+        while True:
+            job_id, fn = q.get()
+            self._set(job_id, "running")
+            started = time.monotonic()
+            try:
+                result, error = fn(), None
+            except JobFailed as e:
+                result, error = None, str(e)
+            except Exception as e:
+                print(f"JOB ERROR ({job_id}): {e}")
+                result, error = None, "AI unavailable"
+            with self._lock:
+                self._avg_seconds += 0.2 * (time.monotonic() - started - self._avg_seconds)
+                self.counts["error" if error else "done"] += 1
+            self._set(job_id, "error" if error else "done", result, error)
+            q.task_done()
+
+    # ── public ───────────────────────────────────────────────
+    def submit(self, kind, fn):
+        """Queue fn() (returns JSON text, or raises JobFailed); returns the job id."""
+        q = self._start()
+        job_id = secrets.token_urlsafe(12)
+        now = time.time()
+        self._conn()
+        with storage.write() as conn:
+            conn.execute("INSERT INTO ai_jobs (id, kind, status, created_at, updated_at) "
+                         "VALUES (?, ?, 'queued', ?, ?)", (job_id, kind, now, now))
+            with self._lock:
+                self.counts["submitted"] += 1
+                prune = self.counts["submitted"] % PRUNE_EVERY == 0
+            if prune:
+                conn.execute("DELETE FROM ai_jobs WHERE created_at < ?", (now - JOB_TTL,))
+        try:
+            q.put_nowait((job_id, fn))
+        except queue.Full:
+            with storage.write() as conn:
+                conn.execute("DELETE FROM ai_jobs WHERE id = ?", (job_id,))
+            with self._lock:
+                self.counts["rejected"] += 1
+                wait = self._avg_seconds * max(1, q.qsize()) / self.workers
+            raise QueueFull(wait)
+        return job_id
+
+    def _lost_after(self, status):
+        """A queued job's updated_at only moves when a worker picks it up, so it
+        may wait behind a full queue of jobs that each ran up to LOST_AFTER."""
+        if status == "running":
+            return LOST_AFTER
+        return LOST_AFTER * (self.max_queue // self.workers + 1)
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, kind, status, result, error, created_at, updated_at FROM ai_jobs WHERE id = ?",
+            (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {"id": row[0], "kind": row[1], "status": row[2], "created_at": row[5]}
+        if row[2] not in FINISHED and time.time() - row[6] > self._lost_after(row[2]):
+            job["status"], job["error"] = "error", "Job was lost, please try again"
+        elif row[2] == "done":
+            job["result"] = json.loads(row[3])
+        elif row[2] == "error":
+            job["error"] = row[4]
+        return job
+
+    def wait(self, job_id, timeout, seen=None):
+        """Block until the job's status differs from `seen` (or it finished),
+        up to `timeout` seconds; returns the job dict or None."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED or job["status"] != seen:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            # our own workers notify; jobs run by another process show up on the next look
+            with self._changed:
+                self._changed.wait(min(POLL_INTERVAL, remaining))
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "queued": self._queue.qsize() if self._queue else 0,
+                    "workers": self.workers, "max_queue": self.max_queue,
+                    "avg_seconds": round(self._avg_seconds, 2)}
+
+
+jobs = JobQueue()
@@ -12,84 +12,60 @@
 #  https://aistudio.google.com/app/apikey
 # ============================================================
 
-from flask import Flask, render_template_string, request, jsonify, session
-import requests, json, random, os
+from flask import Flask, Response, g, render_template_string, request, jsonify, session, stream_with_context
+import json, random, os, time, hashlib, secrets
 from datetime import datetime
+from cache import ai_cache, cache_key
+from singleflight import inflight
+from payloads import Payload, serve
+from deck import Deck, parse_cost, decode_cursor
+import catalog
+import fallback
+import search
+import storage
+from couples import hub, CoupleError
+import batch
+import metrics
+from ratelimit import limiter, retry_after_header
+from streaming import ItemScanner
+import gemini
+import routing
+import extract
+from simcache import quick_topics
+from places import PlacesStore, TOP_CITIES, normalize_city
+import click
+from jobs import jobs, QueueFull, JobFailed
 
 app = Flask(__name__)
-app.secret_key = "datespark_secret_2024"
+# the signed session cookie is the only thing identifying an account
+app.secret_key = os.environ.get("DATESPARK_SECRET_KEY")
+if not app.secret_key:
+    app.secret_key = secrets.token_hex(32)
+    print("WARNING: DATESPARK_SECRET_KEY is not set; using a random key, so sessions "
+          "end on restart and are not shared between workers")
 
 import os
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
-GEMINI_URL = (
-    "https://generativelanguage.googleapis.com/v1beta/models/"
-    "gemini-2.5-flash:generateContent?key=" + GEMINI_API_KEY
-)
-
-# ── Date Ideas Data ──────────────────────────────────────────
-IDEAS = {
-    "home": [
-        {"title": "Candlelit Cooking Night",    "desc": "Pick a cuisine you've never tried, cook together with wine & music.", "emoji": "🕯️", "duration": "2-3 hrs", "cost": "$"},
-        {"title": "Blanket Fort Movie Marathon", "desc": "Build the coziest fort, pick a trilogy, make popcorn with crazy toppings.", "emoji": "🎬", "duration": "4-5 hrs", "cost": "$"},
-        {"title": "Paint & Sip Night",          "desc": "Buy canvases, pick a YouTube tutorial, see who paints better.", "emoji": "🎨", "duration": "2 hrs", "cost": "$"},
-        {"title": "Home Spa Night",             "desc": "Face masks, foot soaks, DIY massages. Full spa at home.", "emoji": "🧖", "duration": "3 hrs", "cost": "$"},
-    ],
-    "city": [
-        {"title": "Restaurant Roulette",  "desc": "Spin a map, go wherever it lands. No Yelp, no reviews — pure adventure.", "emoji": "🎲", "duration": "2-3 hrs", "cost": "$$"},
-        {"title": "Night City Walk",      "desc": "Walk your city after midnight, find the most beautiful lit-up spots.", "emoji": "🌃", "duration": "2 hrs", "cost": "Free"},
-        {"title": "Museum After Dark",    "desc": "Many museums have evening events. Wine + art = magic.", "emoji": "🖼️", "duration": "3 hrs", "cost": "$$"},
-        {"title": "Street Food Crawl",    "desc": "Hit 5 different street food spots. Rate each one together.", "emoji": "🌮", "duration": "3 hrs", "cost": "$"},
-    ],
-    "outdoor": [
-        {"title": "Sunrise Hike & Breakfast", "desc": "Wake up at 4am, hike to a viewpoint, watch sunrise with packed breakfast.", "emoji": "🌄", "duration": "Half day", "cost": "$"},
-        {"title": "Stargazing Picnic",        "desc": "Drive out of the city, lie on a blanket, download a star map app.", "emoji": "🌠", "duration": "3 hrs", "cost": "$"},
-        {"title": "Kayaking Adventure",       "desc": "Rent kayaks for the day, pack a lunch, explore hidden waterways.", "emoji": "🚣", "duration": "Full day", "cost": "$$"},
-        {"title": "Wildflower Picnic",        "desc": "Find a scenic meadow, bring a fancy picnic basket, take photos.", "emoji": "🌸", "duration": "3 hrs", "cost": "$"},
-    ],
-    "budget": [
-        {"title": "Free Museum Day",           "desc": "Most cities have free museum days. Pick the weirdest one.", "emoji": "🏛️", "duration": "3 hrs", "cost": "Free"},
-        {"title": "Library Date",              "desc": "Each pick 3 books for the other. Read together at a café after.", "emoji": "📚", "duration": "2 hrs", "cost": "Free"},
-        {"title": "Thrift Store Fashion Show", "desc": "$10 each to build the wildest outfit. Strut it in the store.", "emoji": "👗", "duration": "2 hrs", "cost": "$"},
-        {"title": "Sunset Rooftop Drinks",     "desc": "Grab cheap wine, find the highest rooftop, watch the sunset.", "emoji": "🌅", "duration": "2 hrs", "cost": "$"},
-    ],
-    "luxury": [
-        {"title": "Private Chef Experience", "desc": "Book a private chef to cook a 5-course dinner in your home.", "emoji": "👨‍🍳", "duration": "4 hrs", "cost": "$$$$"},
-        {"title": "Helicopter City Tour",    "desc": "See your city from above at golden hour. Unforgettable.", "emoji": "🚁", "duration": "1 hr", "cost": "$$$$"},
-        {"title": "Winery Weekend Escape",   "desc": "Boutique winery stay — tastings, vineyard walks, fine dining.", "emoji": "🍷", "duration": "Weekend", "cost": "$$$$"},
-        {"title": "Spa Retreat Day",         "desc": "Full day luxury spa — couples massages, pools, treatments.", "emoji": "💆", "duration": "Full day", "cost": "$$$"},
-    ],
-    "travel": [
-        {"title": "Spontaneous Flight",    "desc": "Open Google Flights, filter cheapest, book whatever. Go tomorrow.", "emoji": "✈️", "duration": "Weekend", "cost": "$$$"},
-        {"title": "Road Trip with No Map", "desc": "Pick a direction, drive 4 hours, see where you end up.", "emoji": "🚗", "duration": "Weekend", "cost": "$$"},
-        {"title": "Train Journey Date",    "desc": "Book a scenic train route, pack snacks, watch the world go by.", "emoji": "🚂", "duration": "Full day", "cost": "$$"},
-        {"title": "Foreign Food Tour",     "desc": "Visit a neighborhood with a different culture, eat everything local.", "emoji": "🗺️", "duration": "Half day", "cost": "$$"},
-    ],
-    "surprise": [
-        {"title": "Mystery Date Night",     "desc": "Plan every detail secretly, give them only a dress code.", "emoji": "🎭", "duration": "Evening", "cost": "$$"},
-        {"title": "Memory Lane Date",       "desc": "Recreate your very first date — same place, same order, same feeling.", "emoji": "💌", "duration": "Evening", "cost": "$$"},
-        {"title": "Bucket List Check-Off",  "desc": "Look at each other's bucket lists, pick one item each, do both.", "emoji": "📝", "duration": "Full day", "cost": "Varies"},
-        {"title": "Random Acts of Romance", "desc": "Leave clues around the city leading to a surprise final destination.", "emoji": "💝", "duration": "Half day", "cost": "$$"},
-    ],
-}
-
-SEASONAL = {
-    "winter": [
-        {"title": "Ice Skating Date",   "desc": "Find a local rink, rent skates, warm up with hot cocoa after.", "emoji": "⛸️", "duration": "2 hrs", "cost": "$$", "cat": "city"},
-        {"title": "Cozy Cabin Getaway", "desc": "Book a cabin with a fireplace, bring board games and mulled wine.", "emoji": "🏕️", "duration": "Weekend", "cost": "$$$", "cat": "travel"},
-    ],
-    "spring": [
-        {"title": "Cherry Blossom Picnic",  "desc": "Find the best bloom spot, bring a blanket and charcuterie.", "emoji": "🌸", "duration": "3 hrs", "cost": "$", "cat": "outdoor"},
-        {"title": "Farmers Market Morning", "desc": "Explore a spring market, cook what you find together.", "emoji": "🥕", "duration": "Half day", "cost": "$", "cat": "budget"},
-    ],
-    "summer": [
-        {"title": "Rooftop Cinema Night", "desc": "Find an outdoor movie screening, bring blankets and snacks.", "emoji": "🎥", "duration": "3 hrs", "cost": "$$", "cat": "city"},
-        {"title": "Beach Sunrise Swim",   "desc": "Drive to the beach before dawn, swim at sunrise, breakfast by the sea.", "emoji": "🌊", "duration": "Half day", "cost": "$", "cat": "outdoor"},
-    ],
-    "autumn": [
-        {"title": "Apple Orchard Date",   "desc": "Pick apples, drink fresh cider, get lost in a corn maze.", "emoji": "🍎", "duration": "Half day", "cost": "$$", "cat": "outdoor"},
-        {"title": "Halloween Ghost Tour", "desc": "Book a spooky city ghost tour, dare each other to be brave.", "emoji": "👻", "duration": "2 hrs", "cost": "$$", "cat": "city"},
-    ],
-}
+# Gemini keys, models and hedging are configured in routing.py (GEMINI_API_KEYS,
+# GEMINI_MODEL, GEMINI_LIGHT_MODEL, ...); point GEMINI_BASE_URL at
+# bench/mock_gemini.py to load-test without burning quota
+
+# ── Date ideas (data/catalog.json, see catalog.py) ─────────
+def json_payload(data):
+    return Payload(json.dumps(data, ensure_ascii=False, separators=(",", ":")), "application/json")
+
+def build_catalog_payloads(cat):
+    """Serialize + compress the catalog once; every season is prebuilt so a
+    rollover is just a different dict lookup."""
+    payloads = {"ideas": json_payload({c: [i.to_dict(with_cat=False) for i in ideas]
+                                       for c, ideas in cat.categories().items()})}
+    for season, ideas in cat.seasonal.items():
+        payloads[season] = json_payload({"season": season, "ideas": [i.to_dict() for i in ideas]})
+    return payloads
+
+# rebuilt by rebuild_catalog_views() when the file changes
+CATALOG_PAYLOADS = build_catalog_payloads(catalog.store.current())
+DECK = Deck(catalog.store.current().ideas)
+LOCAL = fallback.Generator(catalog.store.current(), DECK)
 
 def get_season():
     m = datetime.now().month
@@ -98,93 +74,775 @@ def get_season():
     if m in [9,10,11]: return "autumn"
     return "winter"
 
-def call_gemini(prompt):
+def gemini_body(prompt):
+    return {"contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": 0.9, "maxOutputTokens": 3000}}
+
+def call_gemini(prompt, endpoint=None):
+    """Model text for `prompt`; endpoint picks the route (see routing.py)."""
     try:
-        body = {"contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"temperature": 0.9, "maxOutputTokens": 3000}}
-        r = requests.post(GEMINI_URL, json=body, timeout=30)
+        r = routing.router.post(endpoint, gemini_body(prompt))
         print(f"STATUS: {r.status_code}")
         if r.status_code == 429:
             return "RATE_LIMITED"
-        txt = r.json()["candidates"][0]["content"]["parts"][0]["text"]
-        txt = txt.strip().replace("```json","").replace("```JSON","").replace("```","").strip()
-        start = min(txt.find('[') if txt.find('[')!=-1 else len(txt),
-                    txt.find('{') if txt.find('{')!=-1 else len(txt))
-        end = max(txt.rfind(']'), txt.rfind('}')) + 1
-        if start < end: txt = txt[start:end]
-        return txt
+        return r.json()["candidates"][0]["content"]["parts"][0]["text"]
+    except gemini.OverBudget:
+        print("GEMINI OVER BUDGET: global bucket is empty")
+        return "RATE_LIMITED"
+    except gemini.CircuitOpen:
+        print("GEMINI CIRCUIT OPEN: failing fast")
+        return None
     except Exception as e:
         print(f"GEMINI EXCEPTION: {e}")
         return None
 
+# ── Metrics ───────────────────────────────────────────────────
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(resp):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_REQUESTS.inc(route=route, method=request.method, status=str(resp.status_code))
+    metrics.HTTP_LATENCY.observe(time.perf_counter() - g.get("started", time.perf_counter()), route=route)
+    return resp
+
+@metrics.register_collector
+def cache_samples():
+    counts = ai_cache.counts
+    return [(metrics.CACHE_LOOKUPS, {"result": k}, counts[k]) for k in ("hits_memory", "hits_disk", "misses")] + \
+           [("datespark_ai_cache_evictions_total", {}, counts["evictions"]),
+            ("datespark_ai_coalesced_total", {"scope": "worker"}, inflight.counts["coalesced"]),
+            ("datespark_ai_coalesced_total", {"scope": "remote"}, inflight.counts["coalesced_remote"])] + \
+           [("datespark_rate_limit_decisions_total", {"result": k}, v) for k, v in limiter.counts.items()] + \
+           [("datespark_ai_extractions_total", {"result": k}, v) for k, v in extract.counts.items()] + \
+           [("datespark_ai_similar_total", {"event": k}, v) for k, v in quick_topics.counts.items()] + \
+           [("datespark_places_total", {"event": k}, v) for k, v in places.counts.items()] + \
+           [("datespark_ai_jobs_total", {"event": k}, v) for k, v in jobs.counts.items()] + \
+           [("datespark_catalog_reloads_total", {"result": "ok" if k == "reloads" else "error"}, v)
+            for k, v in catalog.store.counts.items()]
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # ── Routes ────────────────────────────────────────────────────
 
 @app.route("/")
 def index():
-    return render_template_string(HTML)
+    return serve(INDEX_PAGE)
 
 @app.route("/debug")
 def debug():
-    return f"Key: '{GEMINI_API_KEY[:8]}...' URL: {GEMINI_URL[:60]}" if GEMINI_API_KEY else "KEY IS EMPTY"
+    if routing.API_KEYS == [""]:
+        return "KEY IS EMPTY"
+    return f"Keys: {len(routing.API_KEYS)} Targets: {', '.join(t.name for t in routing.router.targets)}"
 
 @app.route("/api/ideas")
 def get_ideas():
-    return jsonify(IDEAS)
+    return serve(CATALOG_PAYLOADS["ideas"])
 
 @app.route("/api/seasonal")
 def get_seasonal():
-    season = get_season()
-    return jsonify({"season": season, "ideas": SEASONAL[season]})
+    return serve(CATALOG_PAYLOADS[get_season()])
 
-@app.route("/api/ai/quick", methods=["POST"])
-def ai_quick():
-    topic = request.json.get("topic","")
-    prompt = (f'Generate a creative romantic date idea based on: "{topic}". '
-              'Return ONLY valid JSON, no markdown: '
-              '{"title":"...","desc":"...","emoji":"...","duration":"...","cost":"...","tip":"...","steps":["...","...","..."]}')
-    result = call_gemini(prompt)
+RATE_LIMIT_MSG = "Too many requests, please wait 1 minute and try again! ⏳"
+PARSE_RETRIES = int(os.environ.get("AI_PARSE_RETRIES", 1))   # fresh generations when an answer is unusable
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 0))  # reverse proxies in front of us that set X-Forwarded-For
+
+def quick_prompt(topic):
+    return (f'Generate a creative romantic date idea based on: "{topic}". '
+            'Return ONLY valid JSON, no markdown: '
+            '{"title":"...","desc":"...","emoji":"...","duration":"...","cost":"...","tip":"...","steps":["...","...","..."]}')
+
+def itinerary_prompt(topic):
+    return (f'Create a detailed minute-by-minute date itinerary based on: "{topic}". '
+            'Return ONLY valid JSON, no markdown: '
+            '{"title":"...","emoji":"...","totalDuration":"...","totalCost":"...","overview":"...",'
+            '"timeline":[{"time":"7:00 PM","activity":"...","tip":"...","duration":"30 min"}]}')
+
+def places_prompt(city):
+    return (f'Suggest 6 real date-worthy places in {city} for couples. '
+            'Mix restaurants, parks, experiences, hidden gems. '
+            'Return ONLY a JSON array, no markdown: '
+            '[{"name":"...","type":"...","desc":"one sentence","emoji":"...","priceRange":"$/$$/$$$"}]')
+
+def client_ip():
+    # each trusted proxy appends the address it saw, so the client is the entry the
+    # outermost one wrote; anything before it is client-supplied and may be forged
+    route = request.access_route if "X-Forwarded-For" in request.headers else []
+    if TRUSTED_PROXIES and len(route) >= TRUSTED_PROXIES:
+        return route[-TRUSTED_PROXIES]
+    return request.remote_addr
+
+def over_limit():
+    """Charge this client's buckets for one request; a 429 response if either is
+    empty. The global Gemini bucket is charged per upstream call (routing.py)."""
+    keys = [("ip", client_ip(), 1)]
+    if session.get("username"):
+        keys.append(("session", session["username"], 1))
+    wait = limiter.take(keys)
+    if not wait:
+        return None
+    metrics.RATE_LIMITED.inc(endpoint=request.endpoint or "")
+    secs = retry_after_header(wait)
+    resp = jsonify({"error": f"Too many requests, please wait {secs}s and try again! ⏳", "retry_after": int(secs)})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = secs
+    return resp
+
+def ask(endpoint, prompt):
+    """call_gemini and pull out a value of `endpoint`'s shape. The prompt
+    is only re-sent when nothing usable can be recovered from an answer."""
+    for attempt in range(PARSE_RETRIES + 1):
+        result = call_gemini(prompt, endpoint)
+        if not result or result == "RATE_LIMITED":
+            return result
+        try:
+            return extract.parse(endpoint, result)
+        except extract.ExtractError as e:
+            print(f"PARSE ERROR ({endpoint}, attempt {attempt + 1}): {e}")
+            metrics.PARSE_FAILURES.inc(endpoint=endpoint)
+            error = e
+    raise error
+
+def generate(endpoint, prompt):
+    """ask, and cache the answer as JSON text."""
+    result = ask(endpoint, prompt)
+    if not result or result == "RATE_LIMITED":
+        return result
+    result = json.dumps(result, ensure_ascii=False)
+    ai_cache.set(endpoint, prompt, result)
+    return result
+
+@app.route("/api/deck")
+def get_deck():
+    args = request.args
+    cats = [c for c in args.get("cat", "").split(",") if c and c != "all"]
+    max_cost = args.get("max_cost")
+    try:
+        if max_cost is not None:
+            max_cost = int(max_cost) if max_cost.isdigit() else parse_cost(max_cost)
+        min_minutes = int(args["min_minutes"]) if args.get("min_minutes") else None
+        max_minutes = int(args["max_minutes"]) if args.get("max_minutes") else None
+        limit = int(args.get("limit", 10))
+        if args.get("cursor"):
+            seed, offset = decode_cursor(args["cursor"])
+        else:
+            seed = int(args["seed"]) if args.get("seed") else random.getrandbits(31)
+            offset = 0
+    except ValueError:
+        return jsonify({"error": "Bad deck filter"}), 400
+    deck = DECK          # one snapshot, even if the catalog reloads meanwhile
+    ids = deck.match(cats, max_cost, min_minutes, max_minutes)
+    return jsonify(deck.page(ids, seed, offset, limit))
+
+# ── Saved ideas & memories (datespark.db) ─────────────────────
+
+def current_user():
+    """Username for this browser session; makes a guest account on first use."""
+    username = session.get("username")
+    if username and storage.get_user(username):
+        return username
+    username, _ = storage.create_guest()
+    session["username"] = username
+    session.permanent = True
+    return username
+
+def page_args():
+    limit = max(1, min(int(request.args.get("limit", 200)), 1000))
+    return limit, request.args.get("before")
+
+@app.route("/api/me")
+def me():
+    return jsonify(storage.get_user(current_user()))
+
+@app.route("/api/saved", methods=["GET"])
+def list_saved():
+    try:
+        items, cursor = storage.list_saved(current_user(), *page_args())
+    except ValueError:
+        return jsonify({"error": "Bad cursor"}), 400
+    return jsonify({"items": items, "next": cursor})
+
+@app.route("/api/saved", methods=["POST"])
+def save_ideas():
+    body = request.json or {}
+    ideas = body.get("ideas") or ([body["idea"]] if body.get("idea") else [])
+    if not all(isinstance(i, dict) for i in ideas):
+        return jsonify({"error": "Ideas must be objects"}), 400
+    return jsonify({"ids": storage.save_ideas(current_user(), ideas)})
+
+@app.route("/api/saved", methods=["DELETE"])
+@app.route("/api/saved/<int:idea_id>", methods=["DELETE"])
+def delete_saved(idea_id=None):
+    return jsonify({"deleted": storage.delete_saved(current_user(), idea_id)})
+
+@app.route("/api/history", methods=["GET"])
+def list_history():
+    try:
+        items, cursor = storage.list_history(current_user(), *page_args())
+    except ValueError:
+        return jsonify({"error": "Bad cursor"}), 400
+    return jsonify({"items": items, "next": cursor})
+
+@app.route("/api/history", methods=["POST"])
+def log_memories():
+    body = request.json or {}
+    memories = body.get("memories") or ([body["memory"]] if body.get("memory") else [])
+    if not all(isinstance(m, dict) for m in memories):
+        return jsonify({"error": "Memories must be objects"}), 400
+    return jsonify({"ids": storage.log_memories(current_user(), memories)})
+
+# ── Chat (chat_messages, see storage.py) ──────────────────────
+CHAT_CONTEXT_MESSAGES = int(os.environ.get("CHAT_CONTEXT_MESSAGES", 20))   # recent turns sent to Gemini
+CHAT_CONTEXT_CHARS = int(os.environ.get("CHAT_CONTEXT_CHARS", 4000))
+CHAT_MAX_CHARS = 2000
+
+def chat_prompt(history, message):
+    turns = "\n".join(f"{'DateSpark' if m['role'] == 'model' else 'User'}: {m['text']}" for m in history)
+    return ("You are DateSpark, a warm and practical date-planning assistant. "
+            "Answer in a few sentences of plain text, no markdown.\n\n"
+            + (f"Conversation so far:\n{turns}\n\n" if turns else "")
+            + f"User: {message}\nDateSpark:")
+
+@app.route("/api/chat", methods=["GET"])
+def list_chat():
+    try:
+        items, cursor = storage.list_messages(current_user(), *page_args())
+    except ValueError:
+        return jsonify({"error": "Bad cursor"}), 400
+    return jsonify({"items": items, "next": cursor})
+
+@app.route("/api/chat", methods=["POST"])
+def send_chat():
+    message = ((request.json or {}).get("message") or "").strip()
+    if not message or len(message) > CHAT_MAX_CHARS:
+        return jsonify({"error": f"Message must be 1-{CHAT_MAX_CHARS} characters"}), 400
+    limited = over_limit()
+    if limited:
+        return limited
+    user = current_user()
+    history = storage.recent_messages(user, CHAT_CONTEXT_MESSAGES, CHAT_CONTEXT_CHARS)
+    reply = call_gemini(chat_prompt(history, message), "chat")
+    if reply == "RATE_LIMITED":
+        return jsonify({"error": RATE_LIMIT_MSG}), 429
+    if not reply or not reply.strip():
+        return jsonify({"error": "AI unavailable"}), 500
+    # the turn is stored only once it has an answer, so a failed send can simply be retried
+    ids = storage.append_messages(user, [("user", message), ("model", reply.strip())])
+    return jsonify({"ids": ids, "reply": reply.strip()})
+
+@app.route("/api/chat", methods=["DELETE"])
+def clear_chat():
+    return jsonify({"deleted": storage.clear_messages(current_user())})
+
+# ── Search ────────────────────────────────────────────────────
+
+@app.route("/api/search")
+def search_everything():
+    """?q=words[&in=ideas,saved,history][&limit=20][&cursor=...] — ranked, prefix-matched."""
+    args = request.args
+    scopes = [s for s in args.get("in", ",".join(search.SCOPES)).split(",") if s in search.SCOPES]
+    try:
+        limit = int(args.get("limit", 20))
+        offset = int(args.get("cursor") or 0)
+    except ValueError:
+        return jsonify({"error": "Bad search page"}), 400
+    user = current_user() if any(s != "ideas" for s in scopes) else None
+    hits, after = search.search(args.get("q", ""), user, scopes, limit, offset, catalog.store.current())
+    return jsonify({"results": [{"kind": kind, "item": item} for kind, item in hits],
+                    "next": str(after) if after is not None else None})
+
+# ── Couples mode ──────────────────────────────────────────────
+
+@app.route("/api/couples")
+def couples_status():
+    couple_id, partner = hub.membership(current_user())
+    matches = hub.matches_since(couple_id) if couple_id else []
+    return jsonify({"connected": couple_id is not None, "matches": matches})
+
+@app.route("/api/couples/connect", methods=["POST"])
+def couples_connect():
+    code = (request.json or {}).get("code", "")
+    if len(code.strip()) != 6:
+        return jsonify({"error": "Code must be 6 characters."}), 400
+    try:
+        hub.connect(current_user(), code)
+    except CoupleError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"connected": True})
+
+@app.route("/api/couples/swipe", methods=["POST"])
+def couples_swipe():
+    body = request.json or {}
+    # only the catalog id is taken from the browser; the partner sees the catalog's copy
+    idea = catalog.store.current().by_id.get(body.get("id")) if isinstance(body.get("id"), str) else None
+    if idea is None:
+        return jsonify({"error": "Unknown idea"}), 400
+    if body.get("dir") != "right":
+        return jsonify({"match": None})
+    try:
+        return jsonify({"match": hub.like(current_user(), idea)})
+    except CoupleError as e:
+        return jsonify({"error": str(e)}), 409
+
+@app.route("/api/couples/events")
+def couples_events():
+    """Long-poll for new matches; answers at once when not paired."""
+    try:
+        since = int(request.args.get("since", 0))
+    except ValueError:
+        return jsonify({"error": "Bad cursor"}), 400
+    result = hub.wait(current_user(), since)
+    return jsonify({"connected": result["partner"] is not None, "matches": result["matches"]})
+
+# topics worded differently but asking for the same thing share an answer
+SIMILAR = {"quick": (quick_topics, quick_prompt)}
+
+def near_cached(endpoint, topic):
+    if endpoint not in SIMILAR or not topic:
+        return None
+    index, make_prompt = SIMILAR[endpoint]
+    for match in index.lookup(topic):
+        cached = ai_cache.get(endpoint, make_prompt(match))
+        if cached is not None:
+            index.hit()
+            return cached
+    return None
+
+def remember_topic(endpoint, topic):
+    if endpoint in SIMILAR and topic:
+        SIMILAR[endpoint][0].add(topic)
+
+def local_answer(endpoint, topic):
+    """A catalog-built answer (see fallback.py) for when Gemini gives none; never cached."""
+    if topic is None:
+        return None
+    try:
+        return LOCAL.answer(endpoint, topic)
+    except Exception as e:
+        print(f"LOCAL ANSWER ERROR: {e}")
+        return None
+
+def run_ai(endpoint, prompt, topic=None):
+    cached = ai_cache.get(endpoint, prompt)
+    if cached is None and topic is not None:
+        cached = near_cached(endpoint, topic)
+    if cached is not None:
+        return app.response_class(cached, mimetype="application/json")
+    limited = over_limit()
+    if limited:
+        return limited
+    # identical prompts already in flight share one Gemini call
+    try:
+        result = inflight.do(cache_key(endpoint, prompt),
+                             lambda: generate(endpoint, prompt),
+                             peek=lambda: ai_cache.peek(endpoint, prompt))
+    except extract.ExtractError as e:
+        return jsonify({"error": "Parse error", "raw": e.raw}), 500
+    if not result or result == "RATE_LIMITED":
+        local = local_answer(endpoint, topic)
+        if local is not None:
+            metrics.LOCAL_ANSWERS.inc(endpoint=endpoint)
+            return jsonify(local)
     if not result:
         return jsonify({"error": "AI unavailable"}), 500
     if result == "RATE_LIMITED":
-        return jsonify({"error": "Too many requests, please wait 1 minute and try again! ⏳"}), 429
-    try:
-        return jsonify(json.loads(result))
-    except:
-        return jsonify({"error": "Parse error", "raw": result}), 500
+        return jsonify({"error": RATE_LIMIT_MSG}), 429
+    remember_topic(endpoint, topic)
+    return app.response_class(result, mimetype="application/json")
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_ai(endpoint, prompt, array_key, topic=None):
+    """SSE: `meta` (fields before the array), one `item` per array
+    element as soon as it is complete, then `done` with the full JSON."""
+    cached = ai_cache.get(endpoint, prompt)
+    if cached is None and topic is not None:
+        cached = near_cached(endpoint, topic)
+    if cached is None:
+        limited = over_limit()
+        if limited:
+            return limited
+
+    def replay(data):
+        yield sse("meta", {k: v for k, v in data.items() if k != array_key})
+        for item in data.get(array_key) or []:
+            yield sse("item", item)
+        yield sse("done", data)
+
+    def give_up(error):
+        # nothing streamed yet, so a local answer can stand in for the whole thing
+        local = local_answer(endpoint, topic)
+        if local is not None:
+            metrics.LOCAL_ANSWERS.inc(endpoint=endpoint)
+            yield from replay(local)
+        else:
+            yield sse("error", {"error": error})
+
+    def events():
+        if cached is not None:
+            yield from replay(json.loads(cached))
+            return
+        try:
+            r = routing.router.post(endpoint, gemini_body(prompt), stream=True)
+        except gemini.OverBudget:
+            yield from give_up(RATE_LIMIT_MSG)
+            return
+        except gemini.CircuitOpen:
+            print("GEMINI CIRCUIT OPEN: failing fast")
+            yield from give_up("AI unavailable")
+            return
+        except Exception as e:
+            print(f"GEMINI EXCEPTION: {e}")
+            yield from give_up("AI unavailable")
+            return
+        print(f"STATUS: {r.status_code}")
+        if r.status_code == 429:
+            r.close()
+            yield from give_up(RATE_LIMIT_MSG)
+            return
+        if r.status_code != 200:
+            r.close()
+            yield from give_up("AI unavailable")
+            return
+        scanner = ItemScanner(array_key)
+        try:
+            for text in gemini.iter_stream_text(r):
+                meta, items = scanner.feed(text)
+                if meta is not None:
+                    yield sse("meta", meta)
+                for item in items:
+                    yield sse("item", item)
+        except Exception as e:
+            print(f"GEMINI STREAM EXCEPTION: {e}")
+            yield sse("error", {"error": "AI unavailable"})
+            return
+        finally:
+            r.close()
+        try:
+            data = extract.parse(endpoint, scanner.text)
+        except extract.ExtractError as e:
+            print(f"PARSE ERROR ({endpoint}, stream): {e}")
+            metrics.PARSE_FAILURES.inc(endpoint=endpoint)
+            # nothing to salvage: one non-streamed generation replaces what was shown
+            try:
+                result = generate(endpoint, prompt)
+            except extract.ExtractError as e:
+                yield sse("error", {"error": "Parse error", "raw": e.raw})
+                return
+            if not result or result == "RATE_LIMITED":
+                yield sse("error", {"error": RATE_LIMIT_MSG if result else "AI unavailable"})
+                return
+            remember_topic(endpoint, topic)
+            yield sse("done", json.loads(result))
+            return
+        ai_cache.set(endpoint, prompt, json.dumps(data, ensure_ascii=False))
+        remember_topic(endpoint, topic)
+        yield sse("done", data)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/ai/quick", methods=["POST"])
+def ai_quick():
+    topic = request.json.get("topic","")
+    return run_ai("quick", quick_prompt(topic), topic=topic)
+
+@app.route("/api/ai/quick/stream", methods=["POST"])
+def ai_quick_stream():
+    topic = request.json.get("topic","")
+    return stream_ai("quick", quick_prompt(topic), "steps", topic=topic)
 
 @app.route("/api/ai/itinerary", methods=["POST"])
 def ai_itinerary():
+    body = request.json or {}
+    topic = body.get("topic","")
+    if body.get("async") or request.args.get("async") == "1":
+        return enqueue_ai("itinerary", itinerary_prompt(topic), topic=topic)
+    return run_ai("itinerary", itinerary_prompt(topic), topic=topic)
+
+@app.route("/api/ai/itinerary/stream", methods=["POST"])
+def ai_itinerary_stream():
     topic = request.json.get("topic","")
-    prompt = (f'Create a detailed minute-by-minute date itinerary based on: "{topic}". '
-              'Return ONLY valid JSON, no markdown: '
-              '{"title":"...","emoji":"...","totalDuration":"...","totalCost":"...","overview":"...",'
-              '"timeline":[{"time":"7:00 PM","activity":"...","tip":"...","duration":"30 min"}]}')
-    result = call_gemini(prompt)
-    if not result:
-        return jsonify({"error": "AI unavailable"}), 500
+    return stream_ai("itinerary", itinerary_prompt(topic), "timeline", topic=topic)
+
+@app.route("/api/ai/local/<endpoint>", methods=["POST"])
+def ai_local(endpoint):
+    """The catalog-built answer alone: no Gemini call, so no rate limit.
+    The page shows it while the real answer is on its way."""
+    topic = (request.json or {}).get("topic", "")
+    local = LOCAL.answer(endpoint, topic)
+    if local is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(local)
+
+# ── Background jobs (survive client disconnects) ─────────────
+JOB_STREAM_LIMIT = 300    # seconds an events stream stays open
+
+def ai_job(endpoint, prompt, topic=None):
+    try:
+        result = inflight.do(cache_key(endpoint, prompt), lambda: generate(endpoint, prompt),
+                             peek=lambda: ai_cache.peek(endpoint, prompt))
+    except extract.ExtractError:
+        raise JobFailed("Parse error")
+    if not result or result == "RATE_LIMITED":
+        local = local_answer(endpoint, topic)
+        if local is not None:
+            metrics.LOCAL_ANSWERS.inc(endpoint=endpoint)
+            return json.dumps(local, ensure_ascii=False)
     if result == "RATE_LIMITED":
-        return jsonify({"error": "Too many requests, please wait 1 minute and try again! ⏳"}), 429
+        raise JobFailed(RATE_LIMIT_MSG)
+    if not result:
+        raise JobFailed("AI unavailable")
+    return result
+
+def enqueue_ai(endpoint, prompt, topic=None):
+    """202 + job id; a cached answer is returned straight away instead."""
+    cached = ai_cache.get(endpoint, prompt)
+    if cached is not None:
+        return app.response_class(cached, mimetype="application/json")
+    limited = over_limit()
+    if limited:
+        return limited
     try:
-        return jsonify(json.loads(result))
-    except:
-        return jsonify({"error": "Parse error", "raw": result}), 500
+        job_id = jobs.submit(endpoint, lambda: ai_job(endpoint, prompt, topic))
+    except QueueFull as e:
+        secs = retry_after_header(e.retry_after)
+        resp = jsonify({"error": "We're very busy right now, please try again shortly ⏳", "retry_after": int(secs)})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = secs
+        return resp
+    resp = jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}",
+                    "events_url": f"/api/jobs/{job_id}/events"})
+    resp.status_code = 202
+    resp.headers["Location"] = f"/api/jobs/{job_id}"
+    return resp
+
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    """?wait=N long-polls up to N seconds for the job to change state."""
+    try:
+        wait = min(float(request.args.get("wait", 0)), 30)
+    except ValueError:
+        return jsonify({"error": "Bad wait"}), 400
+    job = jobs.wait(job_id, wait, request.args.get("status") or "queued") if wait > 0 else jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "No such job"}), 404
+    return jsonify(job)
+
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    """SSE: a `status` event per state change, then `done` (the answer) or `error`."""
+    if jobs.get(job_id) is None:
+        return jsonify({"error": "No such job"}), 404
+
+    def events():
+        seen, deadline = None, time.monotonic() + JOB_STREAM_LIMIT
+        while time.monotonic() < deadline:
+            job = jobs.wait(job_id, 15, seen)
+            if job is None:
+                yield sse("error", {"error": "No such job"})
+                return
+            if job["status"] == "done":
+                yield sse("done", job["result"])
+                return
+            if job["status"] == "error":
+                yield sse("error", {"error": job["error"]})
+                return
+            if job["status"] != seen:
+                seen = job["status"]
+                yield sse("status", {"status": seen})
+            else:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ── Places (per-city store, stale-while-revalidate) ──────────
+
+def fetch_places(city):
+    # background refreshes pay for their Gemini calls like requests do (routing.py)
+    return ask("places", places_prompt(city))
+
+places = PlacesStore(fetch_places)
 
 @app.route("/api/ai/places", methods=["POST"])
 def ai_places():
     city = request.json.get("city","")
-    prompt = (f'Suggest 6 real date-worthy places in {city} for couples. '
-              'Mix restaurants, parks, experiences, hidden gems. '
-              'Return ONLY a JSON array, no markdown: '
-              '[{"name":"...","type":"...","desc":"one sentence","emoji":"...","priceRange":"$/$$/$$$"}]')
-    result = call_gemini(prompt)
+    stored = places.get(city)
+    if stored is not None:
+        return app.response_class(stored, mimetype="application/json")
+    limited = over_limit()
+    if limited:
+        return limited
+    try:
+        result = inflight.do(f"places:{normalize_city(city)}", lambda: places.fetch(city),
+                             peek=lambda: places.get(city))
+    except extract.ExtractError:
+        return jsonify({"error": "Parse error"}), 500
     if not result:
         return jsonify({"error": "AI unavailable"}), 500
     if result == "RATE_LIMITED":
-        return jsonify({"error": "Too many requests, please wait 1 minute and try again! ⏳"}), 429
+        return jsonify({"error": RATE_LIMIT_MSG}), 429
+    return app.response_class(result, mimetype="application/json")
+
+@app.cli.command("warm-places")
+@click.argument("cities", nargs=-1)
+def warm_places(cities):
+    """Fetch places for CITIES (default: $DATESPARK_TOP_CITIES) that are missing or stale."""
+    for city, outcome in places.warm(list(cities) or TOP_CITIES).items():
+        print(f"{outcome:>8}  {city}")
+
+if TOP_CITIES:
+    places.warm(TOP_CITIES, wait=False)
+
+# ── Batch generation ──────────────────────────────────────────
+BATCH_MAX = 10
+PACK_SIZE = 3      # small requests share one Gemini prompt, up to this many
+
+class AIError(Exception):
+    pass
+
+def batch_prompt(topics):
+    listed = " ".join(f'{i + 1}. "{t}"' for i, t in enumerate(topics))
+    return (f'Generate {len(topics)} creative romantic date ideas, one for each of these requests: {listed} '
+            'Return ONLY a JSON array with one object per request, in the same order, each repeating '
+            'its request word for word in "request", no markdown: '
+            '[{"request":"...","title":"...","desc":"...","emoji":"...","duration":"...","cost":"...","tip":"...","steps":["...","...","..."]}]')
+
+def variety_prompt(topic, count):
+    return (f'Generate {count} different creative romantic date ideas based on: "{topic}". '
+            'Make every idea clearly distinct. '
+            f'Return ONLY a JSON array of {count} objects, no markdown: '
+            '[{"title":"...","desc":"...","emoji":"...","duration":"...","cost":"...","tip":"...","steps":["...","...","..."]}]')
+
+def ask_many(prompt, n, slots=False):
+    """One Gemini call that should answer with a JSON array of n ideas.
+    slots: every item as answered, in place, with None where one was unusable."""
     try:
-        return jsonify(json.loads(result))
-    except:
-        return jsonify({"error": "Parse error"}), 500
+        items = ask("batch", prompt)
+    except extract.ExtractError:
+        raise AIError("Parse error")
+    if items == "RATE_LIMITED":
+        raise AIError(RATE_LIMIT_MSG)
+    if not items:
+        raise AIError("AI unavailable")
+    return items if slots else [i for i in items if i is not None][:n]
+
+def _request_key(text):
+    return " ".join(str(text).lower().split())
+
+def align(topics, items):
+    """Answers of a batch_prompt call in the order of `topics`, None where
+    it's unclear which request an item answers (those never get cached).
+    An item naming its request goes to that topic; one that doesn't is
+    trusted by position only when the array has exactly one slot per topic."""
+    wanted = {_request_key(t): i for i, t in enumerate(topics)}
+    out = [None] * len(topics)
+    for pos, item in enumerate(items):
+        if item is None:
+            continue
+        echo = item.pop("request", None)
+        i = wanted.get(_request_key(echo)) if echo is not None else pos if len(items) == len(topics) else None
+        if i is not None and out[i] is None:
+            out[i] = item
+    return out
+
+def solve_topics(topics):
+    """Ideas for a chunk of distinct topics, one call; each is cached
+    as that topic's /api/ai/quick answer."""
+    if len(topics) == 1:
+        prompt = quick_prompt(topics[0])
+        try:
+            result = inflight.do(cache_key("quick", prompt), lambda: generate("quick", prompt),
+                                 peek=lambda: ai_cache.peek("quick", prompt))
+        except extract.ExtractError:
+            raise AIError("Parse error")
+        if result == "RATE_LIMITED":
+            raise AIError(RATE_LIMIT_MSG)
+        if not result:
+            raise AIError("AI unavailable")
+        remember_topic("quick", topics[0])
+        return [json.loads(result)]
+    items = align(topics, ask_many(batch_prompt(topics), len(topics), slots=True))
+    for topic, item in zip(topics, items):
+        if item is not None:
+            ai_cache.set("quick", quick_prompt(topic), json.dumps(item, ensure_ascii=False))
+            remember_topic("quick", topic)
+    return items
+
+def chunks(seq, size):
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+@app.route("/api/ai/batch", methods=["POST"])
+def ai_batch():
+    """Several quick ideas at once: {"topics": [...]} or {"topic": "...", "count": n}.
+    Cached topics answer immediately, the rest are packed PACK_SIZE to a
+    prompt and run concurrently; whatever beats the deadline is returned."""
+    body = request.json or {}
+    try:
+        deadline = min(float(body.get("deadline", batch.DEFAULT_DEADLINE)), batch.DEFAULT_DEADLINE)
+        count = int(body.get("count", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Bad batch request"}), 400
+    topics = body.get("topics")
+    if topics is None:
+        topic = body.get("topic", "")
+        if not isinstance(topic, str) or not topic or not 1 <= count <= BATCH_MAX:
+            return jsonify({"error": f"Send a topic and a count between 1 and {BATCH_MAX}"}), 400
+        sizes = [len(c) for c in chunks(range(count), PACK_SIZE)]
+        limited = over_limit()
+        if limited:
+            return limited
+        outcomes = batch.run_all([lambda n=n: ask_many(variety_prompt(topic, n), n) for n in sizes], deadline)
+        results = []
+        for n, (status, value) in zip(sizes, outcomes):
+            if status == "ok":
+                results += [{"topic": topic, "idea": idea} for idea in value]
+                n -= len(value)
+            error = str(value) if status == "error" else "Timed out" if status == "timeout" else "Missing idea"
+            results += [{"topic": topic, "error": error}] * n
+    else:
+        if not isinstance(topics, list) or not topics or len(topics) > BATCH_MAX \
+                or not all(isinstance(t, str) and t for t in topics):
+            return jsonify({"error": f"Send 1 to {BATCH_MAX} topics"}), 400
+        answers = {}
+        for t in topics:
+            cached = ai_cache.get("quick", quick_prompt(t))
+            if cached is None:
+                cached = near_cached("quick", t)
+            if cached is not None:
+                answers[t] = {"idea": json.loads(cached), "cached": True}
+        pending = list(dict.fromkeys(t for t in topics if t not in answers))
+        groups = chunks(pending, PACK_SIZE)
+        limited = over_limit() if groups else None
+        if limited:
+            return limited
+        outcomes = batch.run_all([lambda g=g: solve_topics(g) for g in groups], deadline)
+        for group, (status, value) in zip(groups, outcomes):
+            for i, t in enumerate(group):
+                if status == "ok" and i < len(value) and value[i] is not None:
+                    answers[t] = {"idea": value[i]}
+                else:
+                    answers[t] = {"error": str(value) if status == "error" else
+                                  "Timed out" if status == "timeout" else "Missing idea"}
+        results = [{"topic": t, **answers[t]} for t in topics]
+    done = sum(1 for r in results if "idea" in r)
+    if not done and any(r.get("error") == RATE_LIMIT_MSG for r in results):
+        return jsonify({"error": RATE_LIMIT_MSG, "results": results}), 429
+    return jsonify({"results": results, "complete": done == len(results)})
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify({**ai_cache.stats(), "inflight": inflight.stats(), "rate_limit": limiter.stats(),
+                    "similar": {endpoint: index.stats() for endpoint, (index, _) in SIMILAR.items()},
+                    "places": places.stats(), "jobs": jobs.stats(), "catalog": catalog.store.stats(),
+                    "search": search.stats(), "gemini": routing.router.stats()})
 
 # ── HTML (full single-page app) ───────────────────────────────
 HTML = """
@@ -344,6 +1002,7 @@ HTML = """
 
 <div id="screen-saved" class="screen">
   <div id="saved-list"></div>
+  <button class="btn btn-gray" id="saved-clear" onclick="clearSaved()" style="display:none">🗑 Clear All</button>
 </div>
 
 <nav>
@@ -359,30 +1018,69 @@ HTML = """
 
 <script>
 // ── State ──────────────────────────────────────────────────
-let IDEAS = {}, deck = [], saved = [], history = [], matches = [];
-let activeCat = 'all', couplesMode = false;
-let shareCode = Math.random().toString(36).slice(2,8).toUpperCase();
-let dragStartX = null, currentDrag = 0;
+let deck = [], deckCursor = null, saved = [], history = [], matches = [];
+let activeCat = 'all', couplesMode = false, matchSince = 0;
+let shareCode = '------';
+let dragStartX = null, currentDrag = 0, dragCard = null;
 let selectedRating = 5;
 
 // ── Init ───────────────────────────────────────────────────
 async function init() {
-  const r = await fetch('/api/ideas');
-  IDEAS = await r.json();
-  buildDeck();
+  initDrag();
+  initLists();
+  if (new URLSearchParams(location.search).get('bench') === 'history') return benchHistory();
   renderCatPills();
-  renderSwipeCards();
-  document.getElementById('my-code').textContent = shareCode;
+  loadAccount();
   loadSeasonal();
   renderMatches();
+  await buildDeck();
+  renderSwipeCards();
   updateNavBadges();
 }
 
-function buildDeck(cat='all') {
+async function loadAccount() {
+  // /api/me first: on a first visit it creates the guest and sets the cookie,
+  // which parallel requests would each do for themselves
+  const me = await fetch('/api/me').then(r => r.json());
+  const [sv, hs] = await Promise.all(['/api/saved','/api/history'].map(u => fetch(u).then(r => r.json())));
+  shareCode = me.share_code;
+  document.getElementById('my-code').textContent = shareCode;
+  saved = sv.items.reverse();
+  history = hs.items.reverse();
+  updateNavBadges();
+  const cp = await api('GET', '/api/couples');
+  cp.matches.forEach(addMatch);
+  renderMatches();
+  if (cp.connected) { couplesMode = true; watchMatches(); }
+  else waitForPartner();
+}
+
+function api(method, url, body) {
+  return fetch(url, {method, headers:{'Content-Type':'application/json'}, body: body && JSON.stringify(body)}).then(r => r.json());
+}
+
+// the server filters + shuffles; we only hold the next page of cards
+async function buildDeck(cat='all') {
   activeCat = cat;
-  let all = Object.entries(IDEAS).flatMap(([c,arr]) => arr.map(i => ({...i, cat:c})));
-  deck = cat === 'all' ? all : all.filter(i => i.cat === cat);
-  deck.sort(() => Math.random() - 0.5);
+  const seed = Math.floor(Math.random() * 2147483647);
+  const r = await fetch(`/api/deck?cat=${cat}&seed=${seed}&limit=10`);
+  const page = await r.json();
+  if (activeCat !== cat) return;
+  deck = page.cards; deckCursor = page.next;
+}
+
+async function topUpDeck() {
+  const cursor = deckCursor;
+  if (deck.length > 3 || !cursor || topUpDeck.busy) return;
+  topUpDeck.busy = true;
+  try {
+    const r = await fetch(`/api/deck?cat=${activeCat}&cursor=${cursor}&limit=10`);
+    const page = await r.json();
+    if (deckCursor !== cursor) return;   // filter changed meanwhile
+    const wasShort = deck.length < 3;
+    deck.push(...page.cards); deckCursor = page.next;
+    if (wasShort) renderSwipeCards();
+  } finally { topUpDeck.busy = false; }
 }
 
 // ── Cat Pills ──────────────────────────────────────────────
@@ -398,39 +1096,39 @@ function renderCatPills() {
 function setCat(cat, btn) {
   document.querySelectorAll('.pill').forEach(p => p.classList.remove('active'));
   btn.classList.add('active');
-  buildDeck(cat); renderSwipeCards();
+  buildDeck(cat).then(renderSwipeCards);
 }
 
-function reshuffleDeck() { buildDeck(activeCat); renderSwipeCards(); }
+function reshuffleDeck() { buildDeck(activeCat).then(renderSwipeCards); }
 
 // ── Swipe Cards ────────────────────────────────────────────
 function catClass(cat) { return 'cat-' + (cat||'surprise'); }
 
+// keyed: a swipe only drops the old front card, restyles the two
+// behind it and adds the one new card at the back
+const STACK = ['front', 'back1', 'back2'];
+
 function renderSwipeCards() {
   const area = document.getElementById('swipe-area');
-  area.innerHTML = '';
-  if (!deck.length) {
+  const shown = deck.slice(0, 3), keys = shown.map(keyOf);
+  [...area.children].forEach(n => { if (!keys.includes(n.dataset.key)) n.remove(); });
+  if (!shown.length) {
     area.innerHTML = '<div class="empty"><div>🎉</div><p>No more ideas!<br>Tap 🔀 to reshuffle</p></div>';
     return;
   }
-  // Render back cards first
-  [2,1,0].forEach(i => {
-    if (!deck[i]) return;
-    const card = makeSwipeCard(deck[i], i);
-    area.appendChild(card);
+  shown.forEach((idea, i) => {
+    let card = area.querySelector(`[data-key="${keys[i]}"]`);
+    if (!card) { card = makeSwipeCard(idea); area.appendChild(card); }
+    card.className = `swipe-card ${catClass(idea.cat)} ${STACK[i]}`;
   });
-  // Attach drag to front card
-  const front = area.querySelector('.front');
-  if (front) attachDrag(front);
 }
 
-function makeSwipeCard(idea, idx) {
+function makeSwipeCard(idea) {
   const d = document.createElement('div');
-  d.className = `swipe-card ${catClass(idea.cat)} ${idx===0?'front':idx===1?'back1':'back2'}`;
-  d.dataset.title = idea.title;
+  d.dataset.key = keyOf(idea);
   d.innerHTML = `
-    <div class="overlay like" id="overlay-like">LOVE IT 💚</div>
-    <div class="overlay skip" id="overlay-skip">SKIP ❌</div>
+    <div class="overlay like">LOVE IT 💚</div>
+    <div class="overlay skip">SKIP ❌</div>
     <div>
       <div class="card-top">
         <span style="font-size:40px">${idea.emoji}</span>
@@ -443,54 +1141,52 @@ function makeSwipeCard(idea, idx) {
       <p style="margin-top:6px">${idea.desc}</p>
     </div>
     <div class="card-btns">
-      <button onclick="saveIdea(${JSON.stringify(idea).replace(/"/g,'&quot;')})">❤️ Save</button>
+      <button data-act="save">❤️ Save</button>
     </div>`;
   return d;
 }
 
-function attachDrag(el) {
-  el.addEventListener('mousedown', e => { dragStartX = e.clientX; });
-  el.addEventListener('touchstart', e => { dragStartX = e.touches[0].clientX; }, {passive:true});
-  document.addEventListener('mousemove', onDrag);
-  document.addEventListener('touchmove', onDragTouch, {passive:true});
-  document.addEventListener('mouseup', onDragEnd);
-  document.addEventListener('touchend', onDragEnd);
+// one set of listeners for the page, installed once; only the front card drags
+function initDrag() {
+  const area = document.getElementById('swipe-area');
+  const start = (e, x) => {
+    const card = e.target.closest('.swipe-card.front');
+    if (!card || e.target.closest('button')) return;
+    dragCard = card; dragStartX = x; currentDrag = 0;
+  };
+  area.addEventListener('mousedown', e => start(e, e.clientX));
+  area.addEventListener('touchstart', e => start(e, e.touches[0].clientX), {passive:true});
+  document.addEventListener('mousemove', e => onDrag(e.clientX));
+  document.addEventListener('touchmove', e => onDrag(e.touches[0].clientX), {passive:true});
+  ['mouseup', 'touchend', 'touchcancel'].forEach(t => document.addEventListener(t, onDragEnd));
+  area.addEventListener('click', e => {
+    if (!e.target.closest('[data-act="save"]')) return;
+    const key = e.target.closest('[data-key]').dataset.key;
+    const idea = deck.find(d => keyOf(d) === key);
+    if (idea) saveIdea(idea);
+  });
 }
 
-function onDrag(e) {
+// moves arrive faster than frames; paint once per frame
+function onDrag(x) {
   if (dragStartX === null) return;
-  currentDrag = e.clientX - dragStartX;
-  updateDragVisual();
-}
-function onDragTouch(e) {
-  if (dragStartX === null) return;
-  currentDrag = e.touches[0].clientX - dragStartX;
-  updateDragVisual();
+  currentDrag = x - dragStartX;
+  if (!onDrag.frame) onDrag.frame = requestAnimationFrame(() => { onDrag.frame = 0; updateDragVisual(); });
 }
 function updateDragVisual() {
-  const front = document.querySelector('.swipe-card.front');
-  if (!front) return;
+  if (!dragCard) return;
   const rot = currentDrag / 18;
-  front.style.transform = `translateX(${currentDrag}px) rotate(${rot}deg)`;
-  const likeO = Math.min(currentDrag / 80, 1);
-  const skipO = Math.min(-currentDrag / 80, 1);
-  const ol = front.querySelector('.overlay.like');
-  const os = front.querySelector('.overlay.skip');
-  if (ol) ol.style.opacity = likeO;
-  if (os) os.style.opacity = skipO;
+  dragCard.style.transform = `translateX(${currentDrag}px) rotate(${rot}deg)`;
+  dragCard.querySelector('.overlay.like').style.opacity = Math.min(currentDrag / 80, 1);
+  dragCard.querySelector('.overlay.skip').style.opacity = Math.min(-currentDrag / 80, 1);
 }
 function onDragEnd() {
   if (dragStartX === null) return;
+  const card = dragCard;
+  dragStartX = null; dragCard = null;
   if (Math.abs(currentDrag) > 80) swipe(currentDrag > 0 ? 'right' : 'left');
-  else {
-    const front = document.querySelector('.swipe-card.front');
-    if (front) { front.style.transform = ''; front.querySelectorAll('.overlay').forEach(o => o.style.opacity=0); }
-  }
-  dragStartX = null; currentDrag = 0;
-  document.removeEventListener('mousemove', onDrag);
-  document.removeEventListener('touchmove', onDragTouch);
-  document.removeEventListener('mouseup', onDragEnd);
-  document.removeEventListener('touchend', onDragEnd);
+  else { card.style.transform = ''; card.querySelectorAll('.overlay').forEach(o => o.style.opacity=0); }
+  currentDrag = 0;
 }
 
 function swipe(dir) {
@@ -499,18 +1195,12 @@ function swipe(dir) {
   const front = document.querySelector('.swipe-card.front');
   if (front) {
     front.classList.add(dir==='right'?'flying-out-right':'flying-out-left');
-    setTimeout(() => { deck.shift(); renderSwipeCards(); }, 300);
-  } else { deck.shift(); renderSwipeCards(); }
+    setTimeout(() => { deck.shift(); renderSwipeCards(); topUpDeck(); }, 300);
+  } else { deck.shift(); renderSwipeCards(); topUpDeck(); }
   if (dir === 'right') {
     saveIdea(idea);
     if (couplesMode) {
-      const pSwipe = Math.random() > 0.4 ? 'right' : 'left';
-      if (pSwipe === 'right' && !matches.find(m=>m.title===idea.title)) {
-        matches.push(idea);
-        showConfetti();
-        showMatchPopup(idea);
-        renderMatches();
-      }
+      api('POST', '/api/couples/swipe', {id: idea.id, dir}).then(r => { if (r.match) celebrateMatch(r.match); });
     }
   }
   updateNavBadges();
@@ -537,9 +1227,104 @@ async function loadSeasonal() {
   ).join('');
 }
 
+// ── Keyed lists ────────────────────────────────────────────
+// every item object gets a stable key the first time it is drawn; an
+// edited item is a new object, so only its own row is rebuilt
+const itemKeys = new WeakMap();
+let nextKey = 0;
+function keyOf(item) {
+  let k = itemKeys.get(item);
+  if (k === undefined) itemKeys.set(item, k = String(++nextKey));
+  return k;
+}
+
+function htmlNode(html) {
+  const t = document.createElement('template');
+  t.innerHTML = html.trim();
+  return t.content.firstElementChild;
+}
+
+// only the rows near the viewport are in the DOM; two spacers stand in
+// for the rest, sized from measured row heights (`estimate` until seen)
+class VirtualList {
+  constructor(el, {render, estimate, gap, empty, overscan=800}) {
+    Object.assign(this, {el, render, estimate, gap, overscan});
+    this.items = []; this.rows = new Map(); this.heights = new Map(); this.frame = 0;
+    this.blank = htmlNode(empty);
+    this.head = el.appendChild(document.createElement('div'));
+    this.tail = el.appendChild(document.createElement('div'));
+    document.addEventListener('scroll', () => this.schedule(), {passive:true, capture:true});
+    window.addEventListener('resize', () => { this.heights.clear(); this.schedule(); });
+  }
+
+  setItems(items) { this.items = items; this.schedule(); }
+
+  schedule() {
+    if (!this.frame) this.frame = requestAnimationFrame(() => { this.frame = 0; this.draw(); });
+  }
+
+  draw() {
+    if (!this.el.offsetParent) return;          // tab hidden; showTab draws it
+    if (this.items.length) this.blank.remove(); else this.head.after(this.blank);
+    const top = -this.el.getBoundingClientRect().top - this.overscan;
+    const bottom = top + innerHeight + 2 * this.overscan;
+    let y = 0, above = 0, below = 0;
+    const shown = [];
+    for (const item of this.items) {
+      const key = keyOf(item), h = this.heights.get(key) || this.estimate;
+      if (y + h <= top) above += h;
+      else if (y < bottom) shown.push([key, item]);
+      else below += h;
+      y += h;
+    }
+    const keep = new Set(shown.map(([key]) => key));
+    for (const [key, node] of this.rows) if (!keep.has(key)) { node.remove(); this.rows.delete(key); }
+    const fresh = [];
+    let prev = this.head;
+    for (const [key, item] of shown) {
+      let node = this.rows.get(key);
+      if (!node) {
+        node = this.render(item);
+        node.dataset.key = key;
+        this.rows.set(key, node);
+        fresh.push([key, node]);
+      }
+      if (prev.nextSibling !== node) prev.after(node);
+      prev = node;
+    }
+    this.head.style.height = above + 'px';
+    this.tail.style.height = below + 'px';
+    let changed = false;
+    for (const [key, node] of fresh) {
+      const h = node.offsetHeight + this.gap;
+      if (h !== this.heights.get(key)) { this.heights.set(key, h); changed = true; }
+    }
+    if (changed) this.schedule();               // estimates were off; settle next frame
+  }
+}
+
 // ── Save & History ─────────────────────────────────────────
+// entry -> its POST, until the saved row's id is known
+const pendingSaves = new WeakMap();
+
 function saveIdea(idea) {
-  if (!saved.find(s=>s.title===idea.title)) { saved.push(idea); updateNavBadges(); showToast('Saved! ❤️'); }
+  if (saved.find(s=>s.title===idea.title)) return;
+  const entry = {...idea};
+  delete entry.id;          // a catalog id, not ours: the row id comes back from the POST
+  saved.push(entry); updateNavBadges(); showToast('Saved! ❤️');
+  pendingSaves.set(entry, api('POST', '/api/saved', {idea}).then(r => { entry.id = r.ids[idea.title]; }));
+}
+
+function removeSaved(i) {
+  const [s] = saved.splice(i, 1);
+  // removed before its save came back: delete once the row id is known
+  if (s) Promise.resolve(pendingSaves.get(s)).then(() => { if (s.id) api('DELETE', `/api/saved/${s.id}`); }).catch(() => {});
+  renderSaved(); updateNavBadges();
+}
+
+function clearSaved() {
+  saved = []; api('DELETE', '/api/saved');
+  renderSaved(); updateNavBadges();
 }
 
 function updateNavBadges() {
@@ -549,38 +1334,55 @@ function updateNavBadges() {
 }
 
 function renderSaved() {
-  const el = document.getElementById('saved-list');
-  if (!saved.length) { el.innerHTML='<div class="empty"><div>💔</div><p>No saved ideas yet!<br>Swipe 💚 to save.</p></div>'; return; }
-  el.innerHTML = saved.map((s,i) =>
-    `<div class="card ${catClass(s.cat)}" style="margin-bottom:14px">
-       <div class="card-top"><span class="card-emoji">${s.emoji}</span>
-         <div class="card-meta"><div class="card-cost">${s.cost}</div><div>${s.duration}</div></div>
-       </div>
-       <h2>${s.title}</h2><p>${s.desc}</p>
-       <div class="card-btns">
-         <button onclick="openLogModal(${i})">📖 Log Memory</button>
-         <button onclick="saved.splice(${i},1);renderSaved();updateNavBadges()">🗑 Remove</button>
-       </div>
-     </div>`
-  ).join('') + `<button class="btn btn-gray" onclick="saved=[];renderSaved();updateNavBadges()">🗑 Clear All</button>`;
+  savedList.setItems(saved);
+  document.getElementById('saved-clear').style.display = saved.length ? '' : 'none';
 }
 
 function renderHistory() {
-  const el = document.getElementById('history-list');
-  if (!history.length) { el.innerHTML='<div class="empty"><div>📖</div><p>No memories yet!<br>Log a date from ❤️ Saved.</p></div>'; return; }
-  el.innerHTML = [...history].reverse().map(h =>
-    `<div class="memory-card" style="margin-bottom:12px">
-       <div style="display:flex;gap:12px;align-items:flex-start">
-         <span style="font-size:32px">${h.emoji}</span>
-         <div style="flex:1">
-           <div style="font-weight:900;font-size:15px">${h.title}</div>
-           <div style="font-size:11px;color:#6b7280">${h.date}</div>
-           <div class="stars">${'⭐'.repeat(h.rating)}</div>
-           ${h.note ? `<div style="font-size:13px;color:rgba(255,255,255,0.75);margin-top:4px;font-style:italic">"${h.note}"</div>` : ''}
+  historyList.setItems([...history].reverse());
+}
+
+let savedList, historyList;
+function initLists() {
+  savedList = new VirtualList(document.getElementById('saved-list'), {
+    estimate: 190, gap: 14,
+    empty: '<div class="empty"><div>💔</div><p>No saved ideas yet!<br>Swipe 💚 to save.</p></div>',
+    render: s => htmlNode(
+      `<div class="card ${catClass(s.cat)}" style="margin-bottom:14px">
+         <div class="card-top"><span class="card-emoji">${s.emoji}</span>
+           <div class="card-meta"><div class="card-cost">${s.cost}</div><div>${s.duration}</div></div>
          </div>
-       </div>
-     </div>`
-  ).join('');
+         <h2>${s.title}</h2><p>${s.desc}</p>
+         <div class="card-btns">
+           <button data-act="log">📖 Log Memory</button>
+           <button data-act="remove">🗑 Remove</button>
+         </div>
+       </div>`),
+  });
+  document.getElementById('saved-list').addEventListener('click', e => {
+    const btn = e.target.closest('[data-act]');
+    if (!btn) return;
+    const key = btn.closest('[data-key]').dataset.key;
+    const i = saved.findIndex(s => keyOf(s) === key);
+    if (i < 0) return;
+    if (btn.dataset.act === 'log') openLogModal(i); else removeSaved(i);
+  });
+  historyList = new VirtualList(document.getElementById('history-list'), {
+    estimate: 100, gap: 12,
+    empty: '<div class="empty"><div>📖</div><p>No memories yet!<br>Log a date from ❤️ Saved.</p></div>',
+    render: h => htmlNode(
+      `<div class="memory-card" style="margin-bottom:12px">
+         <div style="display:flex;gap:12px;align-items:flex-start">
+           <span style="font-size:32px">${h.emoji}</span>
+           <div style="flex:1">
+             <div style="font-weight:900;font-size:15px">${h.title}</div>
+             <div style="font-size:11px;color:#6b7280">${h.date}</div>
+             <div class="stars">${'⭐'.repeat(h.rating)}</div>
+             ${h.note ? `<div style="font-size:13px;color:rgba(255,255,255,0.75);margin-top:4px;font-style:italic">"${h.note}"</div>` : ''}
+           </div>
+         </div>
+       </div>`),
+  });
 }
 
 // ── Log Modal ──────────────────────────────────────────────
@@ -616,22 +1418,90 @@ function selectRating(n, btn) {
 
 function saveLog(idx, modal) {
   const note = document.getElementById('log-note').value;
-  history.push({...saved[idx], note, rating: selectedRating, date: new Date().toLocaleDateString('en-US',{month:'short',day:'numeric',year:'numeric'})});
+  const {id, saved_at, ...idea} = saved[idx];
+  const memory = {...idea, note, rating: selectedRating, date: new Date().toLocaleDateString('en-US',{month:'short',day:'numeric',year:'numeric'})};
+  history.push(memory);
+  api('POST', '/api/history', {memory}).then(r => { memory.id = r.ids[0]; });
   modal.remove(); updateNavBadges(); showToast('Memory saved! 📖');
 }
 
 // ── Couples Mode ───────────────────────────────────────────
-function connectPartner() {
+async function connectPartner() {
   const code = document.getElementById('partner-code').value.trim().toUpperCase();
   const status = document.getElementById('connect-status');
-  if (code.length === 6) {
-    couplesMode = true;
-    status.className = 'status-ok';
-    status.textContent = '✅ Connected! Swipe on ⚡ Spark to find matches.';
-  } else {
+  if (code.length !== 6) {
     status.className = 'status-err';
     status.textContent = '❌ Code must be 6 characters.';
+    return;
+  }
+  const r = await api('POST', '/api/couples/connect', {code});
+  if (r.error) {
+    status.className = 'status-err';
+    status.textContent = '❌ ' + r.error;
+    return;
+  }
+  couplesMode = true;
+  watchMatches();
+  status.className = 'status-ok';
+  status.textContent = '✅ Connected! Swipe on ⚡ Spark to find matches.';
+}
+
+function addMatch(m) {
+  matchSince = Math.max(matchSince, m.match_id || 0);
+  if (matches.find(x => x.title === m.title)) return false;
+  matches.push(m);
+  return true;
+}
+
+function celebrateMatch(m) {
+  if (!addMatch(m)) return;
+  showConfetti();
+  showMatchPopup(m);
+  renderMatches();
+}
+
+// long-poll: the server answers as soon as either of us creates a match
+// (only once paired; errors back off from 1 s to a minute)
+const sleep = ms => new Promise(res => setTimeout(res, ms));
+async function watchMatches() {
+  if (watchMatches.running) return;
+  watchMatches.running = true;
+  let backoff = 1000;
+  while (true) {
+    try {
+      const r = await api('GET', `/api/couples/events?since=${matchSince}`);
+      if (r.error) throw new Error(r.error);
+      backoff = 1000;
+      (r.matches || []).forEach(celebrateMatch);
+      if (!r.connected) break;          // unpaired since (partner paired with someone else)
+    } catch (e) {
+      await sleep(backoff);
+      backoff = Math.min(backoff * 2, 60000);
+    }
+  }
+  watchMatches.running = false;
+  couplesMode = false;
+  waitForPartner();
+}
+
+// unpaired: a cheap status check now and then notices a partner entering our code
+const PARTNER_CHECK_MS = 30000;
+async function waitForPartner() {
+  if (waitForPartner.running) return;
+  waitForPartner.running = true;
+  while (!couplesMode) {
+    await sleep(PARTNER_CHECK_MS);
+    if (couplesMode) break;
+    const r = await api('GET', '/api/couples').catch(() => ({}));
+    if (r.connected) {
+      couplesMode = true;
+      showToast('💑 Your partner connected!');
+      (r.matches || []).forEach(addMatch);
+      renderMatches();
+    }
   }
+  waitForPartner.running = false;
+  watchMatches();
 }
 
 function renderMatches() {
@@ -665,58 +1535,139 @@ function showMatchPopup(idea) {
 }
 
 // ── AI Features ────────────────────────────────────────────
-async function aiQuick() {
-  const topic = document.getElementById('ai-topic').value.trim();
-  if (!topic) return;
-  showAILoading('💡 Generating idea...');
-  const r = await fetch('/api/ai/quick', {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({topic})});
-  const data = await r.json();
-  if (data.error) { showAIError(); return; }
+// POST + read the text/event-stream body (EventSource can't POST)
+async function streamAI(url, body, on) {
+  const r = await fetch(url, {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(body)});
+  if (!r.ok || !r.body) throw new Error('stream unavailable');
+  const reader = r.body.getReader(), dec = new TextDecoder();
+  let buf = '';
+  while (true) {
+    const {value, done} = await reader.read();
+    if (done) break;
+    buf += dec.decode(value, {stream:true});
+    let i;
+    while ((i = buf.indexOf('\\n\\n')) !== -1) {
+      const block = buf.slice(0, i); buf = buf.slice(i + 2);
+      let ev = 'message', data = '';
+      block.split('\\n').forEach(l => {
+        if (l.startsWith('event: ')) ev = l.slice(7);
+        else if (l.startsWith('data: ')) data += l.slice(6);
+      });
+      if (data && on[ev]) on[ev](JSON.parse(data));
+    }
+  }
+}
+
+// the catalog's instant answer (no Gemini call) to look at until the real one starts arriving
+function localFirst(endpoint, topic, render, state) {
+  fetch('/api/ai/local/' + endpoint, {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({topic})})
+    .then(r => r.ok ? r.json() : null)
+    .then(d => { if (d && !state.shown) { render(d); state.local = true; } })
+    .catch(() => {});
+}
+function localBadgeHTML(data) {
+  return data.local ? `<div class="label" style="margin-bottom:8px">⚡ Instant pick from our catalog</div>` : '';
+}
+
+function quickStepHTML(s) { return `<p style="margin:4px 0;font-size:13px">• ${s}</p>`; }
+
+function renderQuick(data) {
   const el = document.getElementById('ai-result');
   el.innerHTML = `
     <div class="card cat-ai">
+      ${localBadgeHTML(data)}
       <div class="card-top"><span class="card-emoji">${data.emoji||'✨'}</span>
         <div class="card-meta"><div class="card-cost">${data.cost||''}</div><div>${data.duration||''}</div></div>
       </div>
-      <h2>${data.title}</h2>
-      <p style="margin-top:6px">${data.desc}</p>
-      ${data.steps ? `<div style="margin-top:12px"><div class="label">📋 Steps</div>${data.steps.map(s=>`<p style="margin:4px 0;font-size:13px">• ${s}</p>`).join('')}</div>` : ''}
+      <h2>${data.title||''}</h2>
+      <p style="margin-top:6px">${data.desc||''}</p>
+      <div style="margin-top:12px;${data.steps&&data.steps.length?'':'display:none'}" id="quick-steps-box"><div class="label">📋 Steps</div><div id="quick-steps">${(data.steps||[]).map(quickStepHTML).join('')}</div></div>
       ${data.tip ? `<div style="margin-top:10px;background:rgba(0,0,0,0.2);border-radius:12px;padding:10px"><div class="label">💡 Pro Tip</div><p style="font-size:13px">${data.tip}</p></div>` : ''}
-      <div class="card-btns">
+      ${data.steps && data.title ? `<div class="card-btns">
         <button onclick='saveIdea(${JSON.stringify({...data,cat:"surprise",emoji:data.emoji||"✨"})});updateNavBadges()'>❤️ Save</button>
-      </div>
+      </div>` : ''}
     </div>`;
 }
 
-async function aiItinerary() {
+async function aiQuick() {
   const topic = document.getElementById('ai-topic').value.trim();
   if (!topic) return;
-  showAILoading('🗓️ Building your itinerary...');
-  const r = await fetch('/api/ai/itinerary', {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({topic})});
-  const data = await r.json();
-  if (data.error) { showAIError(); return; }
+  showAILoading('💡 Generating idea...');
+  const state = {shown: false, local: false};
+  localFirst('quick', topic, renderQuick, state);
+  try {
+    await streamAI('/api/ai/quick/stream', {topic}, {
+      meta: m => { renderQuick({...m, steps: []}); state.shown = true; },
+      item: s => {
+        if (!state.shown) { renderQuick({steps: []}); state.shown = true; }
+        document.getElementById('quick-steps-box').style.display = '';
+        document.getElementById('quick-steps').insertAdjacentHTML('beforeend', quickStepHTML(s));
+      },
+      done: d => { renderQuick(d); state.shown = true; },
+      error: () => { if (state.shown || !state.local) showAIError(); state.shown = true; }
+    });
+  } catch (e) {
+    if (state.shown) return;
+    const r = await fetch('/api/ai/quick', {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({topic})});
+    const data = await r.json();
+    if (data.error) { if (!state.local) showAIError(); return; }
+    renderQuick(data);
+  }
+}
+
+function timelineItemHTML(t) {
+  return `
+        <div class="timeline-item">
+          <div class="timeline-time">${t.time||''}</div>
+          <div class="timeline-content">
+            <h4>${t.activity||''}</h4>
+            ${t.tip?`<p>💡 ${t.tip}</p>`:''}
+            <p style="color:#4b5563">${t.duration||''}</p>
+          </div>
+        </div>`;
+}
+
+function renderItinerary(data) {
   const el = document.getElementById('ai-result');
   el.innerHTML = `
     <div class="surface">
+      ${localBadgeHTML(data)}
       <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:10px">
         <span style="font-size:36px">${data.emoji||'🗓️'}</span>
         <div style="text-align:right"><div class="card-cost" style="background:#7c3aed">${data.totalCost||''}</div><div style="font-size:12px;color:#6b7280">${data.totalDuration||''}</div></div>
       </div>
-      <h2 style="font-size:18px;font-weight:900;color:#f43f5e;margin-bottom:6px">${data.title}</h2>
-      <p style="font-size:13px;color:rgba(255,255,255,0.7);margin-bottom:14px">${data.overview}</p>
+      <h2 style="font-size:18px;font-weight:900;color:#f43f5e;margin-bottom:6px">${data.title||''}</h2>
+      <p style="font-size:13px;color:rgba(255,255,255,0.7);margin-bottom:14px">${data.overview||''}</p>
       <div class="label">📋 Timeline</div>
-      ${(data.timeline||[]).map(t=>`
-        <div class="timeline-item">
-          <div class="timeline-time">${t.time}</div>
-          <div class="timeline-content">
-            <h4>${t.activity}</h4>
-            ${t.tip?`<p>💡 ${t.tip}</p>`:''}
-            <p style="color:#4b5563">${t.duration||''}</p>
-          </div>
-        </div>`).join('')}
+      <div id="timeline-list">${(data.timeline||[]).map(timelineItemHTML).join('')}</div>
     </div>`;
 }
 
+async function aiItinerary() {
+  const topic = document.getElementById('ai-topic').value.trim();
+  if (!topic) return;
+  showAILoading('🗓️ Building your itinerary...');
+  const state = {shown: false, local: false};
+  localFirst('itinerary', topic, renderItinerary, state);
+  try {
+    await streamAI('/api/ai/itinerary/stream', {topic}, {
+      meta: m => { renderItinerary({...m, timeline: []}); state.shown = true; },
+      item: t => {
+        if (!state.shown) { renderItinerary({timeline: []}); state.shown = true; }
+        document.getElementById('timeline-list').insertAdjacentHTML('beforeend', timelineItemHTML(t));
+      },
+      done: d => { renderItinerary(d); state.shown = true; },
+      error: () => { if (state.shown || !state.local) showAIError(); state.shown = true; }
+    });
+  } catch (e) {
+    if (state.shown) return;
+    const r = await fetch('/api/ai/itinerary', {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({topic})});
+    const data = await r.json();
+    if (data.error) { if (!state.local) showAIError(); return; }
+    renderItinerary(data);
+  }
+}
+
 async function findPlaces() {
   const city = document.getElementById('city-input').value.trim();
   if (!city) return;
@@ -771,6 +1722,53 @@ function showToast(msg) {
   setTimeout(() => { t.style.opacity='0'; setTimeout(()=>t.remove(),300); }, 1800);
 }
 
+// ── Benchmark (/?bench=history&n=1000) ─────────────────────
+// fills the history with fake memories (nothing reaches the server),
+// scrolls through it a frame at a time and reports the frame times
+async function benchHistory() {
+  const n = +new URLSearchParams(location.search).get('n') || 1000;
+  const nextFrame = () => new Promise(res => requestAnimationFrame(res));
+  const emojis = ['🍷','🎥','🌊','🍎','🏕️','🎨','🍣','🎳'];
+  history = Array.from({length: n}, (_, i) => ({
+    emoji: emojis[i % emojis.length], title: `Memory #${i + 1}`, date: 'Jan 1, 2026',
+    rating: 1 + i % 5, note: i % 3 ? '' : 'We stayed out way too late and loved every minute of it.'}));
+  updateNavBadges();
+  let t0 = performance.now();
+  showTab('history', document.querySelectorAll('nav button')[4]);
+  await nextFrame(); await nextFrame();
+  const firstRender = performance.now() - t0;
+
+  const scroller = document.scrollingElement, frames = [];
+  let last = await nextFrame();
+  while (scroller.scrollTop + innerHeight < scroller.scrollHeight - 1) {
+    const before = scroller.scrollTop;
+    scroller.scrollTop += 60;
+    if (scroller.scrollTop === before) break;
+    const now = await nextFrame();
+    frames.push(now - last); last = now;
+  }
+  t0 = performance.now();
+  history.push({emoji: '💘', title: 'One more', date: 'Jan 2, 2026', rating: 5, note: ''});
+  renderHistory();
+  await nextFrame();
+  const update = performance.now() - t0;
+
+  frames.sort((a, b) => a - b);
+  const pct = p => frames[Math.min(frames.length - 1, Math.floor(p / 100 * frames.length))] || 0;
+  const r = window.benchResult = {
+    items: n, first_render_ms: +firstRender.toFixed(1), append_ms: +update.toFixed(1), frames: frames.length,
+    frame_avg_ms: +(frames.reduce((a, b) => a + b, 0) / (frames.length || 1)).toFixed(2),
+    frame_p95_ms: +pct(95).toFixed(2), frame_max_ms: +pct(100).toFixed(2),
+    slow_frames: frames.filter(f => f > 1000 / 60 + 1).length,
+    rows_in_dom: document.querySelectorAll('#history-list [data-key]').length,
+  };
+  console.log('bench history', JSON.stringify(r));
+  const box = document.createElement('pre');
+  box.style.cssText = 'position:fixed;top:10px;left:10px;right:10px;z-index:600;background:#000c;padding:12px;border-radius:12px;font-size:12px';
+  box.textContent = Object.entries(r).map(([k, v]) => `${k.padEnd(16)} ${v}`).join('\\n');
+  document.body.appendChild(box);
+}
+
 // ── Tab Navigation ─────────────────────────────────────────
 function showTab(name, btn) {
   document.querySelectorAll('.screen').forEach(s=>s.classList.remove('active'));
@@ -783,11 +1781,52 @@ function showTab(name, btn) {
 }
 
 init();
+if ('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js').catch(() => {});
 </script>
 </body>
 </html>
 """
 
+# the page has no template variables, so render + compress it once per process
+with app.app_context():
+    INDEX_PAGE = Payload(render_template_string(HTML), "text/html")
+
+# ── Service worker ───────────────────────────────────────────
+SW_TEMPLATE = os.path.join(app.static_folder, "sw.js")
+
+def build_service_worker():
+    """static/sw.js with its cache VERSION set to a hash of everything it
+    precaches, so a new page or catalog means a new cache (and only then)."""
+    with open(SW_TEMPLATE, encoding="utf-8") as f:
+        source = f.read()
+    digest = hashlib.sha256(source.encode("utf-8"))
+    for payload in [INDEX_PAGE, *CATALOG_PAYLOADS.values()]:
+        digest.update(payload.etag.encode())
+    return Payload(source.replace("__VERSION__", digest.hexdigest()[:12]), "text/javascript")
+
+SW_SCRIPT = build_service_worker()
+
+@app.route("/sw.js")
+def service_worker():
+    # no-cache: the browser revalidates (cheaply, via ETag) on every update check
+    return serve(SW_SCRIPT)
+
+# ── Catalog hot reload ───────────────────────────────────────
+@catalog.store.on_reload
+def rebuild_catalog_views(cat):
+    global CATALOG_PAYLOADS, DECK, LOCAL, SW_SCRIPT
+    CATALOG_PAYLOADS = build_catalog_payloads(cat)
+    DECK = Deck(cat.ideas)
+    LOCAL = fallback.Generator(cat, DECK)
+    SW_SCRIPT = build_service_worker()      # new catalog, new precache
+
+catalog.store.on_reload(search.sync_catalog)
+search.sync_catalog(catalog.store.current())
+
+@app.before_request
+def check_catalog():
+    catalog.store.maybe_reload()
+
 if __name__ == "__main__":
     print("\n💘 DateSpark AI is running!")
     print("👉 Open your browser at: http://localhost:5000\n")
@@ -0,0 +1,309 @@
+# ============================================================
+#  DateSpark AI — Prometheus metrics
+#
+#  Counters and histograms live in plain per-process lists
+#  (histogram buckets are preallocated; recording is a bisect and
+#  two adds under a per-series lock). A background thread in each
+#  worker dumps a snapshot to METRICS_DIR/<pid>-<start>.json once a
+#  second, and /metrics sums every snapshot so the numbers are
+#  per-app, not per-whichever-worker-answered-the-scrape.
+#
+#  When a worker exits, its snapshot is folded into dead.json
+#  (gunicorn's child_exit hook, or the next scrape that notices the
+#  pid is gone), so totals never go backwards and files don't pile
+#  up. The start time in the name keeps a reused pid from
+#  overwriting a dead worker's numbers.
+# ============================================================
+
+import os, json, time, atexit, tempfile, threading
+try:
+    import fcntl
+except ImportError:         # not on Windows; dead.json updates are then unlocked
+    fcntl = None
+from bisect import bisect_left
+
+FLUSH_EVERY = float(os.environ.get("DATESPARK_METRICS_FLUSH", 1.0))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 60)
+
+_registry = {}          # name -> metric
+_collectors = []        # callables returning [(name, labels, value)] counter samples
+_reg_lock = threading.Lock()
+
+
+def metrics_dir():
+    d = os.environ.get("DATESPARK_METRICS_DIR")
+    if not d:
+        # gunicorn.conf.py sets one per run for all its workers; otherwise this process alone
+        d = os.path.join(tempfile.gettempdir(), f"datespark-metrics-{os.getpid()}")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class _Series:
+    __slots__ = ("lock", "value", "buckets", "sum", "count")
+
+    def __init__(self, nbuckets=0):
+        self.lock = threading.Lock()
+        self.value = 0.0
+        self.buckets = [0] * nbuckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, buckets=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        with _reg_lock:
+            _registry[name] = self
+
+    def _get(self, labels):
+        key = _key(labels)
+        s = self._series.get(key)
+        if s is None:
+            with self._lock:
+                s = self._series.setdefault(key, _Series(len(self.buckets) + 1))
+        return s
+
+    def snapshot(self):
+        out = []
+        for key, s in list(self._series.items()):
+            with s.lock:
+                out.append([list(key), s.value, list(s.buckets), s.sum, s.count])
+        return out
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, n=1, **labels):
+        s = self._get(labels)
+        with s.lock:
+            s.value += n
+        _start_flusher()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def observe(self, seconds, **labels):
+        s = self._get(labels)
+        i = bisect_left(self.buckets, seconds)
+        with s.lock:
+            s.buckets[i] += 1
+            s.sum += seconds
+            s.count += 1
+        _start_flusher()
+
+
+def register_collector(fn):
+    """fn() -> [(metric_name, {labels}, value)]; read at flush time."""
+    _collectors.append(fn)
+    return fn
+
+
+# ── per-worker snapshots ─────────────────────────────────────
+_flush_lock = threading.Lock()
+_flusher = {"pid": None, "name": None}
+DEAD = "dead.json"
+
+def snapshot():
+    data = {name: {"kind": m.kind, "help": m.help, "buckets": m.buckets, "series": m.snapshot()}
+            for name, m in list(_registry.items())}
+    for fn in _collectors:
+        try:
+            samples = fn()
+        except Exception as e:
+            print(f"METRICS COLLECTOR ERROR: {e}")
+            continue
+        for name, labels, value in samples:
+            entry = data.setdefault(name, {"kind": "counter", "help": "", "buckets": [], "series": []})
+            entry["series"].append([sorted(labels.items()), value, [], 0.0, 0])
+    return data
+
+def _snapshot_name():
+    """<pid>-<start ms>.json, fixed for the life of this process."""
+    if _flusher["pid"] != os.getpid():
+        _flusher["pid"], _flusher["name"] = os.getpid(), f"{os.getpid()}-{int(time.time() * 1000)}.json"
+    return _flusher["name"]
+
+def flush():
+    with _flush_lock:
+        path = os.path.join(metrics_dir(), _snapshot_name())
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp, path)
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_EVERY)
+        try:
+            flush()
+        except OSError as e:
+            print(f"METRICS FLUSH ERROR: {e}")
+
+_started = {"pid": None}
+
+def _start_flusher():
+    """One flush thread per process (re-started after a fork), off the request path."""
+    if _started["pid"] == os.getpid():
+        return
+    with _reg_lock:
+        if _started["pid"] == os.getpid():
+            return
+        _started["pid"] = os.getpid()
+    threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+
+@atexit.register
+def _final_flush():
+    if _started["pid"] != os.getpid():
+        return               # never recorded anything (e.g. the gunicorn master)
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass                 # exists, just not ours to signal
+    return True
+
+def _locked(d, mode):
+    """dead.lock: folding holds it exclusively, a scrape shared, so a
+    scrape never sees a worker in both its own file and dead.json."""
+    f = open(os.path.join(d, "dead.lock"), "a")
+    if fcntl:
+        fcntl.flock(f, mode)
+    return f
+
+def fold_dead(d=None):
+    """Fold the snapshots of workers that have exited into dead.json."""
+    d = d or metrics_dir()
+    gone = [f for f in os.listdir(d) if f.endswith(".json") and f.split("-", 1)[0].isdigit()
+            and not _alive(int(f.split("-", 1)[0]))]
+    if not gone:
+        return 0
+    with _locked(d, fcntl and fcntl.LOCK_EX):
+        merged, folded = {}, []
+        for fname in [DEAD] + gone:
+            try:
+                with open(os.path.join(d, fname)) as f:
+                    _add(merged, json.load(f))
+            except FileNotFoundError:
+                continue             # folded by someone else meanwhile
+            except ValueError:
+                pass
+            if fname != DEAD:
+                folded.append(fname)
+        tmp = os.path.join(d, DEAD + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(_as_snapshot(merged), f)
+        os.replace(tmp, os.path.join(d, DEAD))
+        for fname in folded:
+            os.remove(os.path.join(d, fname))
+    return len(folded)
+
+
+# ── exposition ───────────────────────────────────────────────
+def _add(merged, worker):
+    for name, m in worker.items():
+        into = merged.setdefault(name, {"kind": m["kind"], "help": m["help"],
+                                        "buckets": m["buckets"], "series": {}})
+        for labels, value, buckets, total, count in m["series"]:
+            key = tuple(tuple(kv) for kv in labels)
+            s = into["series"].setdefault(key, [0.0, [0] * len(buckets), 0.0, 0])
+            s[0] += value
+            s[1] = [a + b for a, b in zip(s[1], buckets)]
+            s[2] += total
+            s[3] += count
+
+def _as_snapshot(merged):
+    return {name: {"kind": m["kind"], "help": m["help"], "buckets": m["buckets"],
+                   "series": [[list(k), *v] for k, v in m["series"].items()]}
+            for name, m in merged.items()}
+
+def _merge():
+    merged = {}
+    d = metrics_dir()
+    with _locked(d, fcntl and fcntl.LOCK_SH):
+        for fname in os.listdir(d):
+            if not fname.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(d, fname)) as f:
+                    _add(merged, json.load(f))
+            except (OSError, ValueError):
+                continue
+    return merged
+
+def _escape(value):
+    # label values per the text exposition format: backslash, double quote, newline
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def render():
+    """Prometheus text exposition, summed over every worker."""
+    flush()
+    try:
+        fold_dead()
+    except OSError as e:
+        print(f"METRICS FOLD ERROR: {e}")
+    merged = _merge()
+    lookups = merged.get(CACHE_LOOKUPS)
+    if lookups:
+        total = sum(v[0] for v in lookups["series"].values())
+        hits = sum(v[0] for k, v in lookups["series"].items() if dict(k).get("result", "").startswith("hit"))
+        merged[CACHE_LOOKUPS.replace("_lookups_total", "_hit_ratio")] = {
+            "kind": "gauge", "help": "Share of AI cache lookups answered from cache", "buckets": [],
+            "series": {(): [hits / total if total else 0.0, [], 0.0, 0]}}
+    lines = []
+    for name, m in sorted(merged.items()):
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['kind']}")
+        for labels, (value, buckets, total, count) in sorted(m["series"].items()):
+            if m["kind"] == "histogram":
+                running = 0
+                for le, n in zip(list(m["buckets"]) + ["+Inf"], buckets):
+                    running += n
+                    lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', le),))} {running}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {total}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+            else:
+                lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+# ── the app's metrics ────────────────────────────────────────
+HTTP_REQUESTS = Counter("datespark_http_requests_total", "HTTP requests by route, method and status")
+HTTP_LATENCY = Histogram("datespark_http_request_duration_seconds", "Time spent in Flask handlers",
+                         LATENCY_BUCKETS)
+GEMINI_CALLS = Counter("datespark_gemini_requests_total", "Gemini HTTP attempts by outcome")
+GEMINI_LATENCY = Histogram("datespark_gemini_request_duration_seconds", "Gemini HTTP attempt latency",
+                           UPSTREAM_BUCKETS)
+GEMINI_RETRIES = Counter("datespark_gemini_retries_total", "Gemini attempts that were retried")
+GEMINI_HEDGES = Counter("datespark_gemini_hedges_total", "Hedged second Gemini requests sent / won")
+CACHE_LOOKUPS = "datespark_ai_cache_lookups_total"    # filled by a collector in main.py
+RATE_LIMITED = Counter("datespark_rate_limited_total", "AI requests refused by the local token buckets")
+PARSE_FAILURES = Counter("datespark_ai_parse_failures_total", "Model answers with no usable JSON in them")
+LOCAL_ANSWERS = Counter("datespark_ai_local_answers_total", "Catalog-built answers served because Gemini gave none")
@@ -0,0 +1,56 @@
+# ============================================================
+#  DateSpark AI — pre-built response bodies
+#
+#  A Payload is serialized and compressed once (identity, gzip
+#  and, when the `brotli` package is installed, br) and carries
+#  a content-hash ETag. serve() picks the encoding from
+#  Accept-Encoding and answers If-None-Match with a 304.
+# ============================================================
+
+import gzip, hashlib
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BIG = 1 << 20      # above this, max compression costs seconds for a few % of size
+
+
+class Payload:
+    __slots__ = ("body", "gzip", "br", "etag", "mimetype")
+
+    def __init__(self, body, mimetype):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.body = body
+        self.mimetype = mimetype
+        big = len(body) > BIG
+        self.gzip = gzip.compress(body, compresslevel=6 if big else 9, mtime=0)
+        self.br = brotli.compress(body, quality=5 if big else 11) if brotli else None
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+    def etags(self):
+        # one strong tag per representation; all describe the same content
+        return (self.etag, self.etag + "-gz", self.etag + "-br")
+
+
+def serve(payload, cache_control="no-cache"):
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    for tag in payload.etags():
+        if tag in request.if_none_match:
+            resp = Response(status=304, headers=headers)
+            resp.set_etag(tag)
+            return resp
+
+    accept = request.accept_encodings
+    if payload.br is not None and accept["br"]:
+        body, etag, headers["Content-Encoding"] = payload.br, payload.etag + "-br", "br"
+    elif accept["gzip"]:
+        body, etag, headers["Content-Encoding"] = payload.gzip, payload.etag + "-gz", "gzip"
+    else:
+        body, etag = payload.body, payload.etag
+    resp = Response(body, mimetype=payload.mimetype, headers=headers)
+    resp.set_etag(etag)
+    return resp
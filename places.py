@@ -0,0 +1,224 @@
+# ============================================================
+#  DateSpark AI — per-city store for /api/ai/places
+#
+#  The places for a city barely change, so every answer is kept
+#  in the `places` table of datespark.db under a normalized city
+#  name ("NYC", "New York, NY" and "new york city" share a row).
+#  Fresh rows are served as-is; stale rows are still served
+#  instantly while one worker (whoever claims the row) refreshes
+#  them in the background. Rows past MAX_STALE count as missing.
+#  warm() fills the store ahead of time for our top cities.
+# ============================================================
+
+import os, re, json, time, sqlite3, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import storage
+
+FRESH_TTL     = int(os.environ.get("PLACES_FRESH_TTL", 7 * 24 * 3600))
+MAX_STALE     = int(os.environ.get("PLACES_MAX_STALE", 90 * 24 * 3600))
+CLAIM_TTL     = 120        # a refresh that takes longer than this may be retried elsewhere
+MEM_CITIES    = 2000
+REFRESHERS    = 2
+TOP_CITIES    = [c.strip() for c in os.environ.get("DATESPARK_TOP_CITIES", "").split(",") if c.strip()]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS places (
+    city TEXT PRIMARY KEY,
+    display TEXT NOT NULL,
+    value TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    refreshing_until REAL NOT NULL DEFAULT 0
+)
+"""
+
+# ── city names ───────────────────────────────────────────────
+ALIASES = {
+    "nyc": "new york city", "new york": "new york city", "ny": "new york city", "manhattan": "new york city",
+    "new york ny": "new york city", "la": "los angeles", "l a": "los angeles", "sf": "san francisco",
+    "san fran": "san francisco", "dc": "washington", "washington dc": "washington", "washington d c": "washington",
+    "philly": "philadelphia", "vegas": "las vegas", "nola": "new orleans", "chi town": "chicago",
+    "atx": "austin", "cdmx": "mexico city", "ciudad de mexico": "mexico city", "rio": "rio de janeiro",
+    "sao paulo": "são paulo", "muenchen": "munich", "münchen": "munich", "roma": "rome", "firenze": "florence",
+    "wien": "vienna", "praha": "prague", "lisboa": "lisbon", "köln": "cologne", "koeln": "cologne",
+}
+_COUNTRY_SUFFIX = re.compile(r",?\s*(usa|us|u s a|united states|uk|united kingdom|england)$")
+_PUNCT = re.compile(r"[^\w\s,]")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_city(city):
+    c = _SPACE.sub(" ", _PUNCT.sub(" ", city.casefold())).strip(" ,")
+    c = _COUNTRY_SUFFIX.sub("", c).strip(" ,")
+    c = re.sub(r"^city of ", "", c)
+    return ALIASES.get(c.replace(",", ""), c)
+
+
+class PlacesStore:
+    def __init__(self, fetch, fresh_ttl=FRESH_TTL, max_stale=MAX_STALE):
+        """fetch(display_city) -> list of places | "RATE_LIMITED" | None"""
+        self.fetch_fn = fetch
+        self.fresh_ttl = fresh_ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()          # city -> (fetched_at, value)
+        self._pool = None
+        self._pool_pid = None
+        self._pending = set()              # refreshes queued in this worker
+        self.counts = {"fresh": 0, "stale": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def _conn(self):
+        storage.ensure_schema("places", SCHEMA)
+        return storage.get_conn()
+
+    def _count(self, what):
+        with self._lock:
+            self.counts[what] += 1
+
+    def _remember(self, city, fetched_at, value):
+        with self._lock:
+            self._mem[city] = (fetched_at, value)
+            self._mem.move_to_end(city)
+            while len(self._mem) > MEM_CITIES:
+                self._mem.popitem(last=False)
+
+    def _row(self, city):
+        try:
+            row = self._conn().execute("SELECT fetched_at, value FROM places WHERE city = ?",
+                                       (city,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"PLACES DB ERROR: {e}")
+            return None
+        if row:
+            self._remember(city, *row)
+        return row
+
+    # ── reads ────────────────────────────────────────────────
+    def get(self, city):
+        """Stored JSON for `city` (fresh or stale) or None. A stale hit
+        schedules a background refresh."""
+        key = normalize_city(city)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+        if entry is None or now - entry[0] > self.fresh_ttl:
+            entry = self._row(key)          # another worker may have refreshed it
+        if entry is None or now - entry[0] > self.max_stale:
+            self._count("misses")
+            return None
+        if now - entry[0] > self.fresh_ttl:
+            self._count("stale")
+            self.refresh_later(city)
+        else:
+            self._count("fresh")
+        return entry[1]
+
+    # ── writes ───────────────────────────────────────────────
+    def fetch(self, city):
+        """Ask for `city` now and store the answer. Returns the JSON text,
+        "RATE_LIMITED" or None; extraction errors propagate."""
+        result = self.fetch_fn(city.strip())
+        if not result or result == "RATE_LIMITED":
+            return result
+        value = json.dumps(result, ensure_ascii=False)
+        self.put(city, value)
+        return value
+
+    def put(self, city, value):
+        key, now = normalize_city(city), time.time()
+        try:
+            self._conn()
+            with storage.write() as conn:
+                conn.execute(
+                    "INSERT INTO places (city, display, value, fetched_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(city) DO UPDATE SET display = excluded.display, value = excluded.value, "
+                    "fetched_at = excluded.fetched_at, refreshing_until = 0",
+                    (key, city.strip(), value, now))
+        except sqlite3.Error as e:
+            print(f"PLACES DB ERROR: {e}")
+        self._remember(key, now, value)
+
+    def _claim(self, key, display):
+        """True if this worker gets to refresh `key`. A missing city is claimed
+        with a placeholder row (fetched_at 0, so it reads as missing) that
+        every other worker then sees as taken."""
+        now = time.time()
+        try:
+            self._conn()
+            with storage.write() as conn:
+                claimed = conn.execute(
+                    "INSERT OR IGNORE INTO places (city, display, value, fetched_at, refreshing_until) "
+                    "VALUES (?, ?, '', 0, ?)", (key, display, now + CLAIM_TTL)).rowcount
+                if claimed:
+                    return True
+                row = conn.execute("SELECT fetched_at, refreshing_until FROM places WHERE city = ?",
+                                   (key,)).fetchone()
+                if now - row[0] <= self.fresh_ttl or row[1] > now:
+                    return False        # already fresh, or someone is on it
+                conn.execute("UPDATE places SET refreshing_until = ? WHERE city = ?", (now + CLAIM_TTL, key))
+                return True
+        except sqlite3.Error as e:
+            print(f"PLACES DB ERROR: {e}")
+            return False
+
+    def refresh(self, city):
+        key = normalize_city(city)
+        if not key or not self._claim(key, city.strip()):
+            return False
+        self._count("refreshes")
+        try:
+            ok = self.fetch(city) not in (None, "RATE_LIMITED")
+        except Exception as e:
+            print(f"PLACES REFRESH ERROR ({city}): {e}")
+            ok = False
+        if not ok:
+            self._count("refresh_errors")
+            try:
+                with storage.write() as conn:       # let the next stale hit try again
+                    conn.execute("UPDATE places SET refreshing_until = 0 WHERE city = ?", (key,))
+            except sqlite3.Error as e:
+                print(f"PLACES DB ERROR: {e}")
+        return ok
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=REFRESHERS, thread_name_prefix="places-refresh")
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def refresh_later(self, city):
+        key = normalize_city(city)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+
+        def run():
+            try:
+                self.refresh(city)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+        self._executor().submit(run)
+
+    def warm(self, cities, wait=True):
+        """Fetch every city that is missing or stale. Returns {city: "fresh"|"fetched"|"failed"}
+        when waiting; otherwise queues the work and returns None."""
+        if not wait:
+            for c in cities:
+                self._executor().submit(self._warm_one, c)
+            return None
+        return {c: self._warm_one(c) for c in cities}
+
+    def _warm_one(self, city):
+        row = self._row(normalize_city(city))
+        if row and time.time() - row[0] <= self.fresh_ttl:
+            return "fresh"
+        return "fetched" if self.refresh(city) else "failed"
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "cities_in_memory": len(self._mem)}
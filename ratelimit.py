@@ -0,0 +1,111 @@
+# ============================================================
+#  DateSpark AI — token buckets in front of Gemini
+#
+#  Every AI request that misses the cache takes one token from
+#  the caller's per-IP and per-session buckets, and every call
+#  that actually goes to Gemini (retries, hedges and background
+#  refreshes included) takes one from the global bucket, sized
+#  to our Gemini quota — see routing.py. Buckets live in the
+#  `rate_buckets` table of datespark.db and are refilled lazily
+#  inside one BEGIN IMMEDIATE, so all gunicorn workers draw from
+#  the same budget. A refusal is remembered in-process until the
+#  bucket could next hold a token: repeat offenders are turned
+#  away without touching the database.
+# ============================================================
+
+import os, time, math, threading
+import storage
+
+
+def _spec(name, per_minute, burst):
+    rate = float(os.environ.get(f"RATE_{name}_PER_MIN", per_minute)) / 60
+    return rate, float(os.environ.get(f"RATE_{name}_BURST", burst))
+
+# (tokens per second, bucket size)
+BUCKETS = {
+    "global":  _spec("GLOBAL", 15, 15),       # Gemini free tier: 15 requests/minute
+    "ip":      _spec("IP", 6, 4),
+    "session": _spec("SESSION", 4, 3),
+}
+ENABLED = os.environ.get("RATE_LIMIT", "1") != "0"
+PRUNE_EVERY = 500        # allowed requests between sweeps of idle buckets
+IDLE_AFTER  = 3600       # a bucket untouched this long is full again anyway
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+class Limiter:
+    def __init__(self, buckets=BUCKETS, enabled=ENABLED):
+        self.buckets = buckets
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._denied = {}                    # bucket key -> time.time() it may have a token again
+        self.counts = {"allowed": 0, "denied": 0, "denied_local": 0}
+
+    def _conn(self):
+        storage.ensure_schema("rate_buckets", SCHEMA)
+        return storage.get_conn()
+
+    def take(self, keys):
+        """keys: [(kind, id, cost)] with kind in BUCKETS. Takes the tokens
+        from every bucket or from none; returns 0 if allowed, else the
+        seconds until all of them could pay."""
+        if not self.enabled:
+            return 0
+        names = [f"{kind}:{ident}" for kind, ident, _ in keys]
+        now = time.time()
+        with self._lock:
+            wait = max((self._denied.get(n, 0) - now for n in names), default=0)
+            if wait > 0:
+                self.counts["denied_local"] += 1
+                return wait
+        try:
+            self._conn()
+            with storage.write() as conn:
+                now = time.time()
+                state = {}
+                for (kind, _, cost), name in zip(keys, names):
+                    rate, burst = self.buckets[kind]
+                    row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?",
+                                       (name,)).fetchone()
+                    tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                    state[name] = (tokens, rate, min(cost, burst))    # a bucket can never hold more than burst
+                short = {n: (c - t) / r for n, (t, r, c) in state.items() if t < c}
+                if not short:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                        [(n, t - c, now) for n, (t, r, c) in state.items()])
+                    if (self.counts["allowed"] + 1) % PRUNE_EVERY == 0:
+                        conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - IDLE_AFTER,))
+        except Exception as e:
+            # never let the limiter take the app down; Gemini still has its own 429s
+            print(f"RATE LIMIT ERROR: {e}")
+            return 0
+        with self._lock:
+            if short:
+                self.counts["denied"] += 1
+                for n, secs in short.items():
+                    self._denied[n] = now + secs
+                if len(self._denied) > 10000:
+                    self._denied = {n: t for n, t in self._denied.items() if t > now}
+                return max(short.values())
+            self.counts["allowed"] += 1
+        return 0
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "enabled": self.enabled,
+                    "buckets": {k: {"per_minute": round(r * 60, 2), "burst": b} for k, (r, b) in self.buckets.items()}}
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+limiter = Limiter()
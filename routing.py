@@ -0,0 +1,264 @@
+# ============================================================
+#  DateSpark AI — Gemini routing and hedged requests
+#
+#  Every (API key, model) pair is a target with its own pooled
+#  client and circuit breaker, and a moving latency estimate: an
+#  EWMA plus the p95 of its last WINDOW answers. A call goes to
+#  the target its route allows that looks fastest right now (EWMA
+#  scaled by the calls it already has in flight, so equal keys
+#  share the load). quick and places may use GEMINI_LIGHT_MODEL;
+#  everything else stays on GEMINI_MODEL.
+#
+#  If that attempt has not answered by the target's p95, a hedge
+#  goes to the next best target and the first usable answer wins.
+#  The loser is cancelled — its greenlet killed under gevent, or
+#  under plain threads left to finish and its answer closed
+#  unread — and the time it had run counts against its target.
+#  An attempt that fails outright (network error, 429, 5xx after
+#  the client's own retries) fails over at once instead. Hedges
+#  are capped at HEDGE_RATIO of calls so a slow upstream is not
+#  hit with double the traffic.
+#
+#  Every attempt — first try, hedge, failover and each of the
+#  client's retries — takes a token from the global bucket in
+#  ratelimit.py before it goes out. An attempt the bucket refuses
+#  is not the target's fault: it neither counts as an error nor
+#  fails over.
+# ============================================================
+
+import os, time, queue, threading
+from collections import deque
+import metrics
+from gemini import GeminiClient, CircuitOpen, OverBudget, RETRY_STATUSES
+from ratelimit import limiter
+
+try:
+    import gevent
+    from gevent import monkey as _monkey
+except ImportError:
+    gevent = None
+
+BASE_URL    = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+API_KEYS    = [k.strip() for k in os.environ.get("GEMINI_API_KEYS", os.environ.get("GEMINI_API_KEY", "")).split(",")
+               if k.strip()] or [""]
+MODEL       = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+LIGHT_MODEL = os.environ.get("GEMINI_LIGHT_MODEL", "gemini-2.5-flash-lite")   # "" = main model only
+HEDGE       = os.environ.get("GEMINI_HEDGE", "1") != "0"
+HEDGE_MIN   = float(os.environ.get("GEMINI_HEDGE_MIN", 0.25))    # never hedge sooner than this
+HEDGE_COLD  = float(os.environ.get("GEMINI_HEDGE_COLD", 5))      # ...or this, before a target has a p95
+HEDGE_RATIO = float(os.environ.get("GEMINI_HEDGE_RATIO", 0.1))   # hedges per call, at most
+WINDOW      = 200
+MIN_SAMPLES = 20
+ALPHA       = 0.2
+MAX_ATTEMPTS = 2         # first attempt + one hedge or failover
+FAILOVER_STATUSES = RETRY_STATUSES | {401, 403, 404}    # a bad key or model is that target's problem
+
+# may use LIGHT_MODEL (main model as the fallback); the rest use the main model only
+LIGHT_ENDPOINTS = ("quick", "places")
+
+
+def _cooperative():
+    return gevent is not None and _monkey.is_module_patched("socket")
+
+
+class Target:
+    def __init__(self, model, key, base_url=BASE_URL, client=None, budget=None):
+        self.model, self.key = model, key
+        self.name = f"{model}/…{key[-4:]}" if key else model
+        self.base = f"{base_url}/models/{model}"
+        self.client = client or GeminiClient(budget=budget)
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=WINDOW)
+        self.ewma = None
+        self.inflight = 0
+        self.counts = {"calls": 0, "wins": 0, "errors": 0, "cancelled": 0}
+
+    def url(self, stream=False):
+        if stream:
+            return f"{self.base}:streamGenerateContent?alt=sse&key={self.key}"
+        return f"{self.base}:generateContent?key={self.key}"
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.ewma = seconds if self.ewma is None else self.ewma + ALPHA * (seconds - self.ewma)
+
+    def p95(self):
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_after(self):
+        p95 = self.p95()
+        return HEDGE_COLD if p95 is None else max(HEDGE_MIN, p95)
+
+    def load(self):
+        """Expected wait if sent here now; 0 until there is a first sample."""
+        return (self.ewma or 0.0) * (1 + self.inflight)
+
+    def available(self):
+        return self.client.breaker.state != "open"
+
+    def stats(self):
+        p95 = self.p95()
+        with self._lock:
+            return {**self.counts, "model": self.model, "inflight": self.inflight,
+                    "ewma_ms": round(self.ewma * 1000) if self.ewma is not None else None,
+                    "p95_ms": round(p95 * 1000) if p95 is not None else None,
+                    "breaker": self.client.breaker.state}
+
+
+class Attempt:
+    __slots__ = ("target", "hedge", "started", "handle", "done")
+
+    def __init__(self, target, hedge=False):
+        self.target, self.hedge = target, hedge
+        self.started, self.handle, self.done = time.perf_counter(), None, False
+
+
+class Router:
+    def __init__(self, targets, light_models=(), hedge=HEDGE):
+        self.targets = targets
+        self.light_models = tuple(light_models)
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+
+    def models_for(self, endpoint):
+        main = tuple(dict.fromkeys(t.model for t in self.targets if t.model not in self.light_models))
+        return self.light_models + main if endpoint in LIGHT_ENDPOINTS else main or self.light_models
+
+    def candidates(self, endpoint):
+        """Targets `endpoint` may use, best first; raises CircuitOpen if every one is open."""
+        models = self.models_for(endpoint)
+        ready = [t for t in self.targets if t.model in models and t.available()]
+        if not ready:
+            raise CircuitOpen("every Gemini target's circuit breaker is open")
+        return sorted(ready, key=lambda t: (t.load(), t.inflight, models.index(t.model)))
+
+    def _may_hedge(self):
+        with self._lock:
+            if not self.hedge or self.counts["hedges"] >= HEDGE_RATIO * self.counts["calls"] + 1:
+                return False
+            self.counts["hedges"] += 1
+            return True
+
+    def _launch(self, target, body, results, hedge=False):
+        attempt = Attempt(target, hedge)
+        with target._lock:
+            target.inflight += 1
+            target.counts["calls"] += 1
+
+        def run():
+            try:
+                r = target.client.post(target.url(), body)
+            except Exception as e:
+                r, error = None, e
+            else:
+                error = None
+            finally:
+                with target._lock:
+                    target.inflight -= 1
+            if attempt.done and r is not None:     # lost the race; nobody will read it
+                r.close()
+                return
+            results.put((attempt, r, error))
+
+        if _cooperative():
+            attempt.handle = gevent.spawn(run)
+        else:
+            threading.Thread(target=run, name="gemini-attempt", daemon=True).start()
+        return attempt
+
+    def _cancel(self, attempt):
+        attempt.done = True
+        attempt.target.record(time.perf_counter() - attempt.started)   # at least this slow
+        with attempt.target._lock:
+            attempt.target.counts["cancelled"] += 1
+        if attempt.handle is not None:
+            attempt.handle.kill(block=False)
+
+    def post(self, endpoint, body, stream=False):
+        """POST to the best target for `endpoint`, hedging a slow answer.
+        Same contract as GeminiClient.post: the final Response, or raises
+        CircuitOpen / OverBudget / the last network error."""
+        ranked = self.candidates(endpoint)
+        with self._lock:
+            self.counts["calls"] += 1
+        if stream:
+            # the first bytes of a stream arrive early; hedging it would just pay twice
+            return ranked[0].client.post(ranked[0].url(stream=True), body, stream=True)
+
+        results = queue.Queue()
+        pending = [self._launch(ranked[0], body, results)]
+        tried, hedge_at = 1, time.monotonic() + ranked[0].hedge_after()
+        last = None
+        while pending:
+            if tried >= MAX_ATTEMPTS:
+                hedge_at = None
+            try:
+                attempt, r, error = results.get(
+                    timeout=max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None)
+            except queue.Empty:
+                hedge_at = None
+                if self._may_hedge():
+                    # a single target hedges against itself: a fresh attempt still dodges the tail
+                    pending.append(self._launch(ranked[min(tried, len(ranked) - 1)], body, results, hedge=True))
+                    tried += 1
+                    metrics.GEMINI_HEDGES.inc(event="sent")
+                continue
+            pending.remove(attempt)
+            attempt.done = True
+            if isinstance(error, OverBudget):
+                last = last or (None, error)
+                continue
+            target = attempt.target
+            if r is not None and r.status_code not in FAILOVER_STATUSES:
+                target.record(time.perf_counter() - attempt.started)
+                with target._lock:
+                    target.counts["wins"] += 1
+                for other in pending:
+                    self._cancel(other)
+                while not results.empty():             # finished just as it lost
+                    _, late, _ = results.get_nowait()
+                    if late is not None:
+                        late.close()
+                if attempt.hedge:
+                    with self._lock:
+                        self.counts["hedge_wins"] += 1
+                    metrics.GEMINI_HEDGES.inc(event="won")
+                return r
+            with target._lock:
+                target.counts["errors"] += 1
+            if last is not None and last[0] is not None:
+                last[0].close()
+            last = (r, error)
+            if tried < MAX_ATTEMPTS and tried < len(ranked):
+                pending.append(self._launch(ranked[tried], body, results))
+                tried += 1
+                with self._lock:
+                    self.counts["failovers"] += 1
+        r, error = last
+        if r is not None:
+            return r
+        raise error
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {**counts, "targets": {t.name: t.stats() for t in self.targets}}
+
+
+def build_targets(keys=API_KEYS, models=None, base_url=BASE_URL, budget=None):
+    models = models or [m for m in (MODEL, LIGHT_MODEL) if m]
+    return [Target(model, key, base_url, budget=budget) for model in dict.fromkeys(models) for key in keys]
+
+
+def global_budget():
+    return not limiter.take([("global", "gemini", 1)])
+
+
+router = Router(build_targets(budget=global_budget),
+                light_models=[LIGHT_MODEL] if LIGHT_MODEL and LIGHT_MODEL != MODEL else [])
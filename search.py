@@ -0,0 +1,265 @@
+# ============================================================
+#  DateSpark AI — full-text search (/api/search)
+#
+#  Three FTS5 indexes in datespark.db:
+#   • catalog_fts  external-content index over `catalog_ideas`, a
+#                  copy of the catalog's ids/titles/descriptions
+#                  that sync_catalog() diffs against each new
+#                  catalog version (one worker does it per version)
+#   • saved_fts    contentless indexes over saved_ideas and
+#   • history_fts  date_history, fed by triggers on those tables
+#
+#  A user row's FTS rowid is owner_num << 32 | row id, so one
+#  user's rows form a contiguous rowid range: FTS5 seeks straight
+#  to it and never walks other users' postings, however many
+#  millions there are. bm25() would still count a term across the
+#  whole table, so user hits (the newest USER_CANDIDATES) are
+#  scored here instead — every hit holds every term, so the score
+#  is term frequency, title over text, shorter fields first. The
+#  catalog's best CATALOG_CANDIDATES by bm25 get the same scoring;
+#  like the user candidates, that set doesn't depend on the page
+#  asked for, so pages never overlap or skip.
+#
+#  Terms match as prefixes. prefix='2 3 4 5 6' makes those index
+#  lookups; a longer term is a prefix only when it is the last
+#  (still being typed) and a whole word otherwise.
+# ============================================================
+
+import re, json, sqlite3, threading, unicodedata
+import storage
+
+MAX_PAGE = 50
+MAX_OFFSET = 500
+MAX_TERMS = 8
+USER_CANDIDATES = 200     # newest matches per user table that get ranked
+CATALOG_CANDIDATES = MAX_OFFSET + MAX_PAGE + 1     # enough to fill the deepest page
+TITLE_WEIGHT, TEXT_WEIGHT = 10.0, 3.0
+K1, B = 1.2, 0.75
+SCOPES = ("ideas", "saved", "history")
+STOP_WORDS = frozenset("a an the and or but for with of to in on at by from as is are be it its this that".split())
+
+_FTS = "prefix='2 3 4 5 6', tokenize='unicode61 remove_diacritics 2'"
+_OWNER = "((SELECT num FROM search_owners WHERE username = {row}.username) << 32 | {row}.id)"
+_NEW_OWNER = "INSERT OR IGNORE INTO search_owners (username) VALUES (new.username);"
+
+
+def _user_index(fts, table, col, body):
+    """Triggers keeping `fts` in step with `table` (JSON in `col`; title + `body` indexed)."""
+    values = lambda row: (f"{_OWNER.format(row=row)}, json_extract({row}.{col}, '$.title'), "
+                          f"json_extract({row}.{col}, '$.{body}')")
+    add = f"INSERT INTO {fts} (rowid, title, body) VALUES ({values('new')});"
+    drop = f"INSERT INTO {fts} ({fts}, rowid, title, body) VALUES ('delete', {values('old')});"
+    return f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(title, body, content='', {_FTS});
+CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+    {_NEW_OWNER}
+    {add}
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+    {drop}
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE ON {table} BEGIN
+    {drop}
+    {_NEW_OWNER}
+    {add}
+END;
+"""
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS search_owners (
+    num INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS search_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_ideas (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+    title, body, content='catalog_ideas', content_rowid='rowid', {_FTS});
+CREATE TRIGGER IF NOT EXISTS catalog_ideas_ai AFTER INSERT ON catalog_ideas BEGIN
+    INSERT INTO catalog_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_ideas_ad AFTER DELETE ON catalog_ideas BEGIN
+    INSERT INTO catalog_fts (catalog_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_ideas_au AFTER UPDATE ON catalog_ideas BEGIN
+    INSERT INTO catalog_fts (catalog_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body);
+    INSERT INTO catalog_fts (rowid, title, body) VALUES (new.rowid, new.title, new.body);
+END;
+{_user_index("saved_fts", "saved_ideas", "idea", "desc")}
+{_user_index("history_fts", "date_history", "memory", "note")}
+"""
+
+# (fts table, source table, JSON column, indexed text field)
+USER_TABLES = {"saved": ("saved_fts", "saved_ideas", "idea", "desc"),
+               "history": ("history_fts", "date_history", "memory", "note")}
+
+_WORD = re.compile(r"\w+")
+_lock = threading.Lock()
+counts = {"queries": 0, "catalog_syncs": 0}
+
+
+def _conn():
+    storage.ensure_schema("search", SCHEMA, then=_backfill)    # the connection brings the core tables first
+    return storage.get_conn()
+
+
+def _backfill(conn):
+    """Index rows written before the triggers existed (once per database). Runs
+    in the transaction that creates the triggers, so no row is indexed twice."""
+    done = {k for (k,) in conn.execute("SELECT key FROM search_meta WHERE key LIKE 'backfill:%'")}
+    for scope, (fts, table, col, body) in USER_TABLES.items():
+        if f"backfill:{scope}" in done:
+            continue
+        conn.execute(f"INSERT OR IGNORE INTO search_owners (username) SELECT DISTINCT username FROM {table}")
+        conn.execute(f"INSERT INTO {fts} (rowid, title, body) SELECT {_OWNER.format(row=table)}, "
+                     f"json_extract({col}, '$.title'), json_extract({col}, '$.{body}') FROM {table}")
+        conn.execute("INSERT INTO search_meta (key, value) VALUES (?, 'done')", (f"backfill:{scope}",))
+
+
+# ── text ─────────────────────────────────────────────────────
+def fold(text):
+    """Lowercase without diacritics, as the unicode61 tokenizer sees it."""
+    text = (text or "").casefold()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return text
+
+
+def query_terms(text):
+    terms = _WORD.findall(fold(text))
+    kept = [t for t in terms if t not in STOP_WORDS and len(t) > 1] or [t for t in terms if len(t) > 1]
+    return kept[:MAX_TERMS]
+
+
+def _is_prefix(terms, i):
+    return len(terms[i]) <= 6 or i == len(terms) - 1
+
+
+def fts_query(terms):
+    """FTS5 query requiring every term (see the header for which are prefixes)."""
+    return " AND ".join(f'"{t}"' + "*" * _is_prefix(terms, i) for i, t in enumerate(terms))
+
+
+def matchers(terms):
+    """One regex per term that finds what fts_query() matches, for score()."""
+    return [re.compile(r"\b" + re.escape(t) + ("" if _is_prefix(terms, i) else r"\b"))
+            for i, t in enumerate(terms)]
+
+
+def _field_score(patterns, text, weight, avg_len):
+    text = fold(text)
+    norm = K1 * (1 - B + B * (text.count(" ") + 1) / avg_len)
+    total = 0.0
+    for p in patterns:
+        tf = len(p.findall(text))
+        if tf:
+            total += weight * tf * (K1 + 1) / (tf + norm)
+    return total
+
+
+def score(patterns, title, body):
+    """BM25-shaped: saturating term frequency, title over text, shorter fields first."""
+    return _field_score(patterns, title, TITLE_WEIGHT, 4) + _field_score(patterns, body, TEXT_WEIGHT, 14)
+
+
+# ── the catalog ──────────────────────────────────────────────
+def sync_catalog(cat):
+    """Bring catalog_ideas (and through its triggers, catalog_fts) in line
+    with `cat`, touching only ideas that were added, changed or removed."""
+    try:
+        conn = _conn()
+        if conn.execute("SELECT value FROM search_meta WHERE key = 'catalog_version'").fetchone() == (cat.version,):
+            return 0
+        with storage.write() as conn:
+            if conn.execute("SELECT value FROM search_meta WHERE key = 'catalog_version'").fetchone() == (cat.version,):
+                return 0          # another worker got here first
+            have = {i: (t, b) for i, t, b in conn.execute("SELECT id, title, body FROM catalog_ideas")}
+            want = {i.id: (i.title, i.desc) for i in cat.by_id.values()}
+            gone = [(i,) for i in have.keys() - want.keys()]
+            changed = [(i, *v) for i, v in want.items() if have.get(i) != v]
+            conn.executemany("DELETE FROM catalog_ideas WHERE id = ?", gone)
+            conn.executemany("INSERT INTO catalog_ideas (id, title, body) VALUES (?, ?, ?) "
+                             "ON CONFLICT(id) DO UPDATE SET title = excluded.title, body = excluded.body",
+                             changed)
+            conn.execute("INSERT INTO search_meta (key, value) VALUES ('catalog_version', ?) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (cat.version,))
+        with _lock:
+            counts["catalog_syncs"] += 1
+        return len(gone) + len(changed)
+    except sqlite3.Error as e:
+        print(f"SEARCH DB ERROR: {e}")
+        return 0
+
+
+# ── queries ──────────────────────────────────────────────────
+def _catalog_hits(conn, q, patterns, catalog):
+    rows = conn.execute(
+        "SELECT c.id FROM catalog_fts JOIN catalog_ideas c ON c.rowid = catalog_fts.rowid "
+        f"WHERE catalog_fts MATCH ? ORDER BY bm25(catalog_fts, {TITLE_WEIGHT}, {TEXT_WEIGHT}) LIMIT ?",
+        (q, CATALOG_CANDIDATES)).fetchall()
+    hits = []
+    for (idea_id,) in rows:
+        idea = catalog.by_id.get(idea_id) if catalog else None
+        if idea:
+            hits.append((score(patterns, idea.title, idea.desc), "ideas", idea_id, idea))
+    return hits
+
+
+def _user_hits(conn, scope, q, patterns, username):
+    fts, table, col, body = USER_TABLES[scope]
+    row = conn.execute("SELECT num FROM search_owners WHERE username = ?", (username,)).fetchone()
+    if row is None:
+        return []
+    lo = row[0] << 32
+    ids = [r[0] & 0xFFFFFFFF for r in conn.execute(
+        f"SELECT rowid FROM {fts} WHERE {fts} MATCH ? AND rowid >= ? AND rowid <= ? ORDER BY rowid DESC LIMIT ?",
+        (q, lo, lo | 0xFFFFFFFF, USER_CANDIDATES))]
+    if not ids:
+        return []
+    rows = conn.execute(
+        f"SELECT id, json_extract({col}, '$.title'), json_extract({col}, '$.{body}'), {col} FROM {table} "
+        f"WHERE username = ? AND id IN ({','.join('?' * len(ids))})", [username, *ids])
+    return [(score(patterns, title, text), scope, rid, raw) for rid, title, text, raw in rows]
+
+
+def _item(kind, key, found):
+    return found.to_dict() if kind == "ideas" else {**json.loads(found), "id": key}
+
+
+def search(text, username=None, scopes=SCOPES, limit=20, offset=0, catalog=None):
+    """One page of hits, best first: ([(kind, item)], next offset or None).
+    `catalog` resolves idea ids to records; user scopes need `username`."""
+    terms = query_terms(text)
+    scopes = [s for s in scopes if s in SCOPES and (s == "ideas" or username)]
+    if not terms or not scopes:
+        return [], None
+    limit = max(1, min(limit, MAX_PAGE))
+    offset = max(0, min(offset, MAX_OFFSET))
+    q, patterns = fts_query(terms), matchers(terms)
+    conn = _conn()
+    with _lock:
+        counts["queries"] += 1
+    hits = []
+    for scope in scopes:
+        if scope == "ideas":
+            hits += _catalog_hits(conn, q, patterns, catalog)
+        else:
+            hits += _user_hits(conn, scope, q, patterns, username)
+    hits.sort(key=lambda h: (-h[0], SCOPES.index(h[1]), str(h[2])))
+    page = hits[offset:offset + limit + 1]
+    more = len(page) > limit and offset + limit <= MAX_OFFSET
+    return [(kind, _item(kind, key, found)) for _, kind, key, found in page[:limit]], \
+        offset + limit if more else None
+
+
+def stats():
+    with _lock:
+        return dict(counts)
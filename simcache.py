@@ -0,0 +1,233 @@
+# ============================================================
+#  DateSpark AI — near-duplicate topic matching
+#
+#  "1 year anniversary, love sushi" and "sushi lover anniversary
+#  1yr" should share one /api/ai/quick answer. Topics are turned
+#  into sparse unit vectors (words stemmed, stop words dropped,
+#  hashed into 2^20 features, every term weighted equally) and
+#  kept in an inverted index: per feature, a packed array of row
+#  ids. A lookup only touches the postings of the query's handful
+#  of features; one numpy bincount gives the shared-term count per
+#  row, and the cosine is shared / sqrt(n_query * n_row) for just
+#  the rows that can still reach the threshold.
+#
+#  Topics are persisted in the `ai_topics` table of datespark.db;
+#  each worker loads them on first use and picks up rows other
+#  workers added every SYNC_INTERVAL seconds. The answers
+#  themselves stay in ai_cache — this only maps a topic to the
+#  earlier topic whose answer can be reused.
+# ============================================================
+
+import os, re, math, time, zlib, sqlite3, threading
+from array import array
+import storage
+from cache import DISK_ENABLED, TTLS
+
+try:
+    import numpy as np
+except ImportError:      # pure-Python scoring; fine for small caches
+    np = None
+
+THRESHOLD     = float(os.environ.get("AI_SIMCACHE_THRESHOLD", 0.85))   # cosine similarity
+MAX_ENTRIES   = int(os.environ.get("AI_SIMCACHE_MAX", 100000))
+ENABLED       = os.environ.get("AI_SIMCACHE", "1") != "0"
+SYNC_INTERVAL = 1.0
+TOP_K         = 3
+DIM_BITS      = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_topics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    endpoint TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (endpoint, norm)
+)
+"""
+
+# ── text → sparse vector ─────────────────────────────────────
+_WORD = re.compile(r"[a-z]+|\d+")
+STOP_WORDS = frozenset("""
+a an the and or but for with of to in on at by from as is are be was it its this that these those
+i me my we us our you your he she they them their his her
+some something any want wants would like looking please plan ideas idea date dates romantic
+""".split())
+SYNONYMS = {"yr": "year", "yrs": "year", "anniv": "anniversary", "bday": "birthday",
+            "gf": "girlfriend", "bf": "boyfriend", "one": "1", "two": "2", "three": "3",
+            "first": "1", "cheap": "budget", "inexpensive": "budget", "affordable": "budget",
+            "st": "", "nd": "", "rd": "", "th": ""}       # "1st" is read as "1", "st"
+_SUFFIXES = ("ers", "ing", "er", "ed", "es", "s")
+
+
+def stem(word):
+    for suf in _SUFFIXES:
+        if word.endswith(suf) and len(word) - len(suf) >= 3:
+            word = word[:-len(suf)]
+            break
+    return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+
+def terms(text):
+    out = set()
+    for w in _WORD.findall(text.casefold()):
+        w = SYNONYMS.get(w, w)
+        if w and w not in STOP_WORDS:
+            out.add(stem(w))
+    return out
+
+
+def features(text):
+    """Hashed feature ids of the topic's terms (each with weight 1/sqrt(n))."""
+    mask = (1 << DIM_BITS) - 1
+    return frozenset(zlib.crc32(t.encode()) & mask for t in terms(text))
+
+
+def norm_key(text):
+    return " ".join(sorted(terms(text)))
+
+
+# ── the index ────────────────────────────────────────────────
+class SimilarityIndex:
+    def __init__(self, endpoint, threshold=THRESHOLD, max_entries=MAX_ENTRIES,
+                 shared=DISK_ENABLED, enabled=ENABLED):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.shared = shared
+        self.enabled = enabled
+        self.max_age = TTLS.get(endpoint, 3600)      # older topics' answers are gone anyway
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+        self.counts = {"lookups": 0, "hits": 0, "adds": 0}
+
+    def _reset(self):
+        self._topics = []          # row -> topic as first asked
+        self._vectors = []         # row -> feature ids
+        self._sizes = array("H")   # row -> number of features
+        self._rows = {}            # norm_key -> row
+        self._postings = {}        # feature -> array('i') of rows, ascending
+        self._last_id = 0
+        self._synced = 0.0
+
+    def _conn(self):
+        storage.ensure_schema("ai_topics", SCHEMA)
+        return storage.get_conn()
+
+    def _insert(self, topic, key, vec):
+        if key in self._rows or not vec:
+            return
+        row = len(self._topics)
+        self._topics.append(topic)
+        self._vectors.append(vec)
+        self._sizes.append(min(len(vec), 65535))
+        self._rows[key] = row
+        for f in vec:
+            p = self._postings.get(f)
+            if p is None:
+                p = self._postings[f] = array("i")
+            p.append(row)
+
+    def _compact(self):
+        """Keep the newest 90% once over max_entries (rebuilds the postings)."""
+        keep = self.max_entries * 9 // 10
+        topics, vectors = self._topics[-keep:], self._vectors[-keep:]
+        last_id = self._last_id
+        self._reset()
+        self._last_id, self._synced = last_id, time.monotonic()
+        for t, v in zip(topics, vectors):
+            self._insert(t, norm_key(t), v)
+
+    def _sync(self):
+        """Load rows added since the last look (by us before a restart, or by other workers)."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._reset()
+        if not self.shared or time.monotonic() - self._synced < SYNC_INTERVAL:
+            return
+        self._synced = time.monotonic()
+        try:
+            rows = self._conn().execute(
+                "SELECT id, topic, norm FROM ai_topics WHERE endpoint = ? AND id > ? AND created_at > ? "
+                "ORDER BY id", (self.endpoint, self._last_id, time.time() - self.max_age)).fetchall()
+        except sqlite3.Error as e:
+            print(f"SIMCACHE DB ERROR: {e}")
+            return
+        for row_id, topic, key in rows:
+            self._insert(topic, key, features(topic))
+            self._last_id = row_id
+        if len(self._topics) > self.max_entries:
+            self._compact()
+
+    def _matches(self, vec):
+        """[(cosine, row)] for rows at or above the threshold."""
+        lists = [self._postings[f] for f in vec if f in self._postings]
+        # cos = shared / sqrt(nq * nr) and shared <= nr, so shared >= t^2 * nq
+        need = max(1, math.ceil(self.threshold ** 2 * len(vec) - 1e-9))
+        if len(lists) < need:
+            return []
+        if np is not None:
+            shared = np.bincount(np.concatenate([np.frombuffer(p, dtype=np.int32) for p in lists]))
+            rows = np.flatnonzero(shared >= need)
+            if not len(rows):
+                return []
+            sizes = np.frombuffer(self._sizes, dtype=np.uint16)[rows]
+            scores = shared[rows] / np.sqrt(len(vec) * sizes)
+            return list(zip(scores.tolist(), rows.tolist()))
+        shared = {}
+        for p in lists:
+            for r in p:
+                shared[r] = shared.get(r, 0) + 1
+        return [(n / math.sqrt(len(vec) * self._sizes[r]), r) for r, n in shared.items() if n >= need]
+
+    def lookup(self, topic):
+        """Stored topics at least `threshold`-similar to `topic`, best first."""
+        if not self.enabled:
+            return []
+        vec = features(topic)
+        with self._lock:
+            self.counts["lookups"] += 1
+            self._sync()
+            found = [(s, r) for s, r in self._matches(vec) if s >= self.threshold - 1e-9]
+            return [self._topics[r] for s, r in sorted(found, reverse=True)[:TOP_K]]
+
+    def add(self, topic):
+        """Remember a topic whose answer has just been cached."""
+        if not self.enabled:
+            return
+        key = norm_key(topic)
+        if not key:
+            return
+        with self._lock:
+            self._sync()
+            if key in self._rows:
+                return
+            self.counts["adds"] += 1
+            self._insert(topic, key, features(topic))
+            if len(self._topics) > self.max_entries:
+                self._compact()
+        if not self.shared:
+            return
+        try:
+            self._conn()
+            with storage.write() as conn:
+                conn.execute("INSERT OR IGNORE INTO ai_topics (endpoint, topic, norm, created_at) "
+                             "VALUES (?, ?, ?, ?)", (self.endpoint, topic, key, time.time()))
+                if self.counts["adds"] % 500 == 0:
+                    conn.execute("DELETE FROM ai_topics WHERE endpoint = ? AND created_at <= ?",
+                                 (self.endpoint, time.time() - self.max_age))
+        except sqlite3.Error as e:
+            print(f"SIMCACHE DB ERROR: {e}")
+
+    def hit(self):
+        with self._lock:
+            self.counts["hits"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "topics": len(self._topics), "threshold": self.threshold,
+                    "numpy": np is not None}
+
+
+quick_topics = SimilarityIndex("quick")
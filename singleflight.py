@@ -0,0 +1,141 @@
+# ============================================================
+#  DateSpark AI — single-flight coalescing of identical prompts
+#
+#  Inside a worker, concurrent callers with the same key share
+#  one upstream call (threading.Event hand-off). Across gunicorn
+#  workers, a row in the `ai_inflight` table of datespark.db
+#  marks who is already asking Gemini; the other workers wait
+#  for the answer to show up in the shared cache tier instead
+#  of sending their own request.
+# ============================================================
+
+import os, time, sqlite3, threading
+import storage
+from cache import DISK_ENABLED
+
+LOCK_TTL      = float(os.environ.get("AI_INFLIGHT_TTL", 60))     # a crashed leader frees the key after this
+POLL_INTERVAL = float(os.environ.get("AI_INFLIGHT_POLL", 0.1))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_inflight (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, shared=DISK_ENABLED):
+        self.shared = shared
+        self.owner = f"{os.getpid()}"
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.counts = {"leaders": 0, "coalesced": 0, "coalesced_remote": 0}
+
+    def _conn(self):
+        storage.ensure_schema("ai_inflight", SCHEMA)
+        return storage.get_conn()
+
+    def do(self, key, fn, peek=None):
+        """Run fn() once per key at a time and share its result.
+
+        peek() should return a result another worker has already published
+        (e.g. a cache lookup) or None; it enables cross-worker coalescing."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counts["leaders"] += 1
+            else:
+                self.counts["coalesced"] += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._run(key, fn, peek)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    # ── cross-worker part ───────────────────────────────────
+    def _run(self, key, fn, peek):
+        if not self.shared or peek is None:
+            return fn()
+        while True:
+            if self._acquire(key):
+                try:
+                    return fn()
+                finally:
+                    self._release(key)
+            # someone else is asking Gemini: wait for their answer
+            while self._held_elsewhere(key):
+                time.sleep(POLL_INTERVAL)
+                found = peek()
+                if found is not None:
+                    with self._lock:
+                        self.counts["coalesced_remote"] += 1
+                    return found
+            found = peek()
+            if found is not None:
+                with self._lock:
+                    self.counts["coalesced_remote"] += 1
+                return found
+            # the other worker gave up without an answer; try ourselves
+
+    def _acquire(self, key):
+        now = time.time()
+        try:
+            self._conn()
+            with storage.write() as conn:
+                conn.execute("DELETE FROM ai_inflight WHERE key = ? AND expires_at <= ?", (key, now))
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO ai_inflight (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, self.owner, now + LOCK_TTL))
+            return cur.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"INFLIGHT LOCK ERROR: {e}")
+            return True   # never block a request on the lock table
+
+    def _release(self, key):
+        try:
+            self._conn()
+            with storage.write() as conn:
+                conn.execute("DELETE FROM ai_inflight WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error as e:
+            print(f"INFLIGHT LOCK ERROR: {e}")
+
+    def _held_elsewhere(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT expires_at FROM ai_inflight WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return False
+        return bool(row) and row[0] > time.time()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            counts["in_flight"] = len(self._calls)
+        return counts
+
+
+inflight = SingleFlight()
@@ -1,13 +1,74 @@
-const CACHE = 'datespark-v2';  // ← bump version number each deploy
+// DateSpark AI service worker — template, served at /sw.js with
+// VERSION filled in from the content hash of the page and catalog.
+const VERSION = '__VERSION__';
+const SHELL = 'datespark-shell-' + VERSION;
+const AI = 'datespark-ai';            // survives deploys; bounded below
+const AI_MAX = 30;
+const PRECACHE = ['/', '/api/ideas', '/api/seasonal'];
+const AI_ROUTE = /^\/api\/ai\/(quick|itinerary|places)(\/stream)?$/;
+
 self.addEventListener('install', e => {
-  e.waitUntil(caches.open(CACHE).then(c => c.addAll(['/'])));
-  self.skipWaiting();  // ← forces immediate update
+  e.waitUntil(caches.open(SHELL).then(c => c.addAll(PRECACHE)));
+  self.skipWaiting();
 });
+
 self.addEventListener('activate', e => {
-  e.waitUntil(caches.keys().then(keys =>
-    Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k)))
-  ));
+  e.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k !== SHELL && k !== AI).map(k => caches.delete(k))))
+    .then(() => self.clients.claim()));
 });
+
+// page + catalog: answer from cache at once, refresh it in the background
+function staleWhileRevalidate(e) {
+  const refresh = caches.open(SHELL).then(c => fetch(e.request).then(res => {
+    if (res.ok) c.put(e.request, res.clone());
+    return res;
+  }));
+  e.waitUntil(refresh.catch(() => {}));
+  return caches.match(e.request, {ignoreSearch: true}).then(hit => hit || refresh);
+}
+
+// AI answers are POSTs; key them by endpoint + request body
+async function aiKey(req, endpoint) {
+  return new Request('/__ai/' + endpoint + '?' + encodeURIComponent(await req.clone().text()));
+}
+
+async function rememberAI(key, res, streamed) {
+  let body = await res.text();
+  if (streamed) {
+    // keep only the final `done` event of the SSE stream
+    const done = body.split('\n\n').filter(b => b.startsWith('event: done\n')).pop();
+    if (!done) return;
+    body = done.slice(done.indexOf('data: ') + 6);
+  }
+  const cache = await caches.open(AI);
+  await cache.put(key, new Response(body, {headers: {'Content-Type': 'application/json'}}));
+  const keys = await cache.keys();
+  await Promise.all(keys.slice(0, Math.max(0, keys.length - AI_MAX)).map(k => cache.delete(k)));
+}
+
+function aiRequest(e, endpoint, streamed) {
+  return (async () => {
+    const key = await aiKey(e.request, endpoint);
+    try {
+      const res = await fetch(e.request);
+      if (res.status === 200) e.waitUntil(rememberAI(key, res.clone(), streamed).catch(() => {}));
+      return res;
+    } catch (err) {
+      // offline: the page falls back from /stream to the plain endpoint, which lands here
+      const hit = !streamed && await caches.match(key);
+      if (hit) return hit;
+      throw err;
+    }
+  })();
+}
+
 self.addEventListener('fetch', e => {
+  const url = new URL(e.request.url);
+  if (url.origin !== location.origin) return;
+  const ai = e.request.method === 'POST' && url.pathname.match(AI_ROUTE);
+  if (ai) return e.respondWith(aiRequest(e, ai[1], !!ai[2]));
+  if (e.request.method !== 'GET') return;
+  if (PRECACHE.includes(url.pathname)) return e.respondWith(staleWhileRevalidate(e));
   e.respondWith(fetch(e.request).catch(() => caches.match(e.request)));
-});
\ No newline at end of file
+});
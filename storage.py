@@ -0,0 +1,325 @@
+# ============================================================
+#  DateSpark AI — SQLite persistence (datespark.db)
+#
+#  • one connection per thread (re-opened after a fork), with
+#    statement caching so repeated queries stay prepared
+#  • WAL + busy_timeout so several gunicorn workers can read
+#    while one writes, and writers queue instead of failing
+#    (under gevent the queueing is a cooperative sleep, see below)
+#  • every write runs in BEGIN IMMEDIATE, which takes the write
+#    lock up front — no "database is locked" on lock upgrade
+# ============================================================
+
+import os, json, time, sqlite3, secrets, string, threading
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get(
+    "DATESPARK_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "datespark.db"))
+BUSY_TIMEOUT_MS = int(os.environ.get("DATESPARK_DB_BUSY_MS", 5000))      # how long a writer waits for the lock
+BUSY_SLICE_MS   = int(os.environ.get("DATESPARK_DB_BUSY_SLICE_MS", 20))  # ...inside sqlite, under gevent
+
+try:
+    # Under gevent, threading.local is per greenlet, which would mean a new
+    # connection per request, so all greenlets of a worker share its OS
+    # thread's connection instead. Two things follow:
+    #  • nothing inside write() may yield (no I/O, no sleep): another
+    #    greenlet's write() would find the connection in a transaction and
+    #    ride it, committing or rolling back with someone else's work.
+    #  • sqlite's busy wait blocks the OS thread, i.e. every greenlet in the
+    #    worker. A cooperative worker lets sqlite wait only BUSY_SLICE_MS and
+    #    waits out the rest of BUSY_TIMEOUT_MS between tries of BEGIN
+    #    IMMEDIATE in time.sleep, which gevent has patched to yield.
+    from gevent import monkey as _monkey
+    _local = _monkey.get_original("threading", "local")()
+except ImportError:
+    _monkey = None
+    _local = threading.local()
+_schema_lock = threading.RLock()   # get_conn() may run the core schema while we hold it
+_schemas_done = set()              # DDL committed; safe to query without the lock
+_schemas_running = set()           # DDL under way in the thread holding _schema_lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    share_code TEXT NOT NULL,
+    chat_history TEXT DEFAULT '[]',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS saved_ideas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    idea TEXT NOT NULL,
+    saved_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+CREATE TABLE IF NOT EXISTS date_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    memory TEXT NOT NULL,
+    logged_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+CREATE INDEX IF NOT EXISTS idx_saved_ideas_user ON saved_ideas(username, saved_at);
+CREATE INDEX IF NOT EXISTS idx_date_history_user ON date_history(username, logged_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_share_code ON users(share_code);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user ON chat_messages(username, id);
+-- users.chat_history is legacy: only rows still holding a blob to migrate are indexed
+CREATE INDEX IF NOT EXISTS idx_users_chat_blob ON users(username) WHERE chat_history <> '[]';
+"""
+
+
+def _cooperative():
+    return _monkey is not None and _monkey.is_module_patched("time")
+
+
+def get_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")      # once per worker, so it may block
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_SLICE_MS if _cooperative() else BUSY_TIMEOUT_MS}")
+        _local.conn, _local.pid = conn, os.getpid()
+        ensure_schema("core", SCHEMA)
+    return conn
+
+
+def ensure_schema(name, sql, then=None):
+    """Run a block of CREATE ... IF NOT EXISTS once per process. then(conn), if
+    given, runs in the same transaction: nothing another worker writes can land
+    between the DDL (triggers, say) and what `then` does about existing rows."""
+    if name in _schemas_done:
+        return
+    with _schema_lock:
+        if name in _schemas_done or name in _schemas_running:
+            return
+        _schemas_running.add(name)
+        try:
+            with write() as conn:
+                stmt = ""
+                for part in sql.split(";"):
+                    stmt += part + ";"
+                    if sqlite3.complete_statement(stmt):    # not inside a trigger body
+                        if stmt.strip(" \n;"):
+                            conn.execute(stmt)
+                        stmt = ""
+                if then is not None:
+                    then(conn)
+        finally:
+            _schemas_running.discard(name)
+        _schemas_done.add(name)        # only now may other threads skip the lock
+
+
+def _begin(conn):
+    """BEGIN IMMEDIATE, retrying while another connection holds the write lock
+    until BUSY_TIMEOUT_MS have passed (only a cooperative worker gets here with
+    time to spare: elsewhere sqlite has already waited that long itself)."""
+    deadline = time.monotonic() + BUSY_TIMEOUT_MS / 1000
+    delay = 0.002
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() + delay > deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+
+@contextmanager
+def write():
+    """BEGIN IMMEDIATE ... COMMIT on this thread's connection."""
+    conn = get_conn()
+    if conn.in_transaction:          # nested: ride the outer transaction
+        yield conn
+        return
+    _begin(conn)
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+# ── Users ────────────────────────────────────────────────────
+_CODE_CHARS = string.ascii_uppercase + string.digits
+
+def create_guest():
+    """New anonymous user with a fresh share code; returns (username, code)."""
+    for _ in range(10):
+        username = "guest_" + secrets.token_hex(6)
+        code = "".join(secrets.choice(_CODE_CHARS) for _ in range(6))
+        try:
+            with write() as conn:
+                conn.execute("INSERT INTO users (username, password, share_code) VALUES (?, '', ?)",
+                             (username, code))
+            return username, code
+        except sqlite3.IntegrityError:
+            continue     # share code collision, roll again
+    raise RuntimeError("could not allocate a share code")
+
+def get_user(username):
+    row = get_conn().execute(
+        "SELECT username, share_code FROM users WHERE username = ?", (username,)).fetchone()
+    return {"username": row[0], "share_code": row[1]} if row else None
+
+
+# ── Saved ideas / date history ───────────────────────────────
+# keyset pagination: newest first, cursor is "<timestamp>|<id>"
+
+def _page(table, col, ts, username, limit, before):
+    sql = f"SELECT id, {col}, {ts} FROM {table} WHERE username = ?"
+    params = [username]
+    if before:
+        at, _, rid = before.rpartition("|")
+        sql += f" AND ({ts}, id) < (?, ?)"
+        params += [at, int(rid)]
+    sql += f" ORDER BY {ts} DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    rows = get_conn().execute(sql, params).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{**json.loads(body), "id": rid, ts: at} for rid, body, at in rows]
+    cursor = f"{rows[-1][2]}|{rows[-1][0]}" if more else None
+    return items, cursor
+
+def list_saved(username, limit=200, before=None):
+    return _page("saved_ideas", "idea", "saved_at", username, limit, before)
+
+def list_history(username, limit=200, before=None):
+    return _page("date_history", "memory", "logged_at", username, limit, before)
+
+def save_ideas(username, ideas):
+    """Batch insert; ideas whose title is already saved are skipped.
+    Returns {title: id} for every idea passed in."""
+    if not ideas:
+        return {}
+    with write() as conn:
+        conn.executemany(
+            "INSERT INTO saved_ideas (username, idea) SELECT ?, ? WHERE NOT EXISTS ("
+            " SELECT 1 FROM saved_ideas WHERE username = ? AND json_extract(idea, '$.title') = ?)",
+            [(username, json.dumps(i, ensure_ascii=False), username, i.get("title")) for i in ideas])
+        titles = [i.get("title") for i in ideas]
+        rows = conn.execute(
+            "SELECT json_extract(idea, '$.title'), id FROM saved_ideas WHERE username = ? "
+            f"AND json_extract(idea, '$.title') IN ({','.join('?' * len(titles))})",
+            [username, *titles]).fetchall()
+    return dict(rows)
+
+def delete_saved(username, idea_id=None):
+    with write() as conn:
+        if idea_id is None:
+            cur = conn.execute("DELETE FROM saved_ideas WHERE username = ?", (username,))
+        else:
+            cur = conn.execute("DELETE FROM saved_ideas WHERE username = ? AND id = ?", (username, idea_id))
+    return cur.rowcount
+
+def log_memories(username, memories):
+    if not memories:
+        return []
+    with write() as conn:
+        first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM date_history").fetchone()[0]
+        conn.executemany("INSERT INTO date_history (username, memory) VALUES (?, ?)",
+                         [(username, json.dumps(m, ensure_ascii=False)) for m in memories])
+        return [r[0] for r in conn.execute(
+            "SELECT id FROM date_history WHERE username = ? AND id > ? ORDER BY id", (username, first))]
+
+
+# ── Chat ─────────────────────────────────────────────────────
+# one row per message, so an append is one INSERT however long the
+# conversation; reads walk idx_chat_messages_user from the newest end
+
+CHAT_ROLES = ("user", "model")
+_chat_migrated = False
+
+def _blob_messages(blob):
+    """(role, text) pairs from a legacy users.chat_history blob; junk is skipped."""
+    try:
+        items = json.loads(blob or "[]")
+    except ValueError:
+        return []
+    out = []
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, str):
+            role, text = "user", item
+        elif isinstance(item, dict):
+            role = "user" if item.get("role", "user") == "user" else "model"
+            text = item.get("text") or item.get("content") or item.get("message")
+        else:
+            continue
+        if isinstance(text, str) and text.strip():
+            out.append((role, text))
+    return out
+
+def migrate_chat_history():
+    """Move users.chat_history blobs into chat_messages (once per process;
+    migrated users are reset to '[]', so running it again is a no-op)."""
+    global _chat_migrated
+    if _chat_migrated:
+        return
+    with _schema_lock:
+        if _chat_migrated:
+            return
+        with write() as conn:
+            rows = conn.execute("SELECT username, chat_history FROM users WHERE chat_history <> '[]'").fetchall()
+            for username, blob in rows:
+                conn.executemany("INSERT INTO chat_messages (username, role, text) VALUES (?, ?, ?)",
+                                 [(username, role, text) for role, text in _blob_messages(blob)])
+                conn.execute("UPDATE users SET chat_history = '[]' WHERE username = ?", (username,))
+        if rows:
+            print(f"CHAT: migrated chat_history of {len(rows)} users")
+        _chat_migrated = True
+
+def list_messages(username, limit=50, before=None):
+    """Newest first; the cursor is the id of the oldest message returned."""
+    migrate_chat_history()
+    sql = "SELECT id, role, text, created_at FROM chat_messages WHERE username = ?"
+    params = [username]
+    if before:
+        sql += " AND id < ?"
+        params.append(int(before))
+    rows = get_conn().execute(sql + " ORDER BY id DESC LIMIT ?", [*params, limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{"id": rid, "role": role, "text": text, "created_at": at} for rid, role, text, at in rows]
+    return items, str(rows[-1][0]) if more else None
+
+def recent_messages(username, limit=20, max_chars=4000):
+    """The tail of the conversation, oldest first: at most `limit` messages
+    and about `max_chars` of text (the newest message is always kept)."""
+    migrate_chat_history()
+    rows = get_conn().execute(
+        "SELECT role, text FROM chat_messages WHERE username = ? ORDER BY id DESC LIMIT ?",
+        (username, limit)).fetchall()
+    out, used = [], 0
+    for role, text in rows:
+        used += len(text)
+        if out and used > max_chars:
+            break
+        out.append({"role": role, "text": text})
+    return out[::-1]
+
+def append_messages(username, messages):
+    """[(role, text)] in order; returns their ids."""
+    migrate_chat_history()
+    with write() as conn:
+        return [conn.execute("INSERT INTO chat_messages (username, role, text) VALUES (?, ?, ?)",
+                             (username, role, text)).lastrowid for role, text in messages]
+
+def clear_messages(username):
+    migrate_chat_history()
+    with write() as conn:
+        return conn.execute("DELETE FROM chat_messages WHERE username = ?", (username,)).rowcount
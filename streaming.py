@@ -0,0 +1,98 @@
+# ============================================================
+#  DateSpark AI — incremental JSON scanning for streamed output
+#
+#  Gemini streams an answer like
+#     {"title":"...","overview":"...","timeline":[{...},{...}]}
+#  a few tokens at a time. ItemScanner watches the text as it
+#  grows and hands back each element of one top-level array
+#  (e.g. "timeline" or "steps") the moment it is complete,
+#  plus the fields that came before that array.
+# ============================================================
+
+import json
+
+
+class ItemScanner:
+    def __init__(self, array_key):
+        self.array_key = array_key
+        self.text = ""
+        self.meta = None
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_start = None
+        self._last_str = None      # last complete string seen at depth 1
+        self._obj_start = None     # index of the top-level "{"
+        self._in_array = False
+        self._item_start = None
+
+    def feed(self, chunk):
+        """Add streamed text; returns (meta or None, [newly completed items])."""
+        self.text += chunk
+        t = self.text
+        meta, items = None, []
+        for i in range(self._pos, len(t)):
+            c = t[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        self._last_str = t[self._str_start + 1:i]
+                    elif self._in_array and self._depth == 2:
+                        # string element, e.g. one of the "steps"
+                        self._emit(t[self._str_start:i + 1], items)
+                continue
+            if self._obj_start is None:
+                # skip code fences / prose before the JSON starts
+                if c == "{":
+                    self._obj_start = i
+                    self._depth = 1
+                continue
+            if c == '"':
+                self._in_str = True
+                self._str_start = i
+            elif c in "{[":
+                if self._depth == 1 and c == "[" and self._last_str == self.array_key:
+                    self._in_array = True
+                    meta = self._parse_meta(i)
+                elif self._in_array and self._depth == 2:
+                    self._item_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._in_array and self._depth == 2 and self._item_start is not None:
+                    self._emit(t[self._item_start:i + 1], items)
+                    self._item_start = None
+                elif self._in_array and self._depth == 1:
+                    self._in_array = False
+        self._pos = len(t)
+        if meta is not None:
+            self.meta = meta
+        return meta, items
+
+    def _emit(self, fragment, items):
+        item = self._parse(fragment)
+        if item is not None:
+            items.append(item)
+
+    def _parse_meta(self, array_pos):
+        # everything before `"timeline": [` is a complete object prefix
+        head = self.text[self._obj_start:array_pos].rstrip()
+        if head.endswith(":"):
+            head = head[:-1].rstrip()
+        key = '"' + self.array_key + '"'
+        if head.endswith(key):
+            head = head[:-len(key)].rstrip()
+        return self._parse(head.rstrip(",") + "}") or {}
+
+    @staticmethod
+    def _parse(fragment):
+        try:
+            return json.loads(fragment)
+        except ValueError:
+            return None
@@ -0,0 +1,46 @@
+import os, sys, json, time
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extract
+
+IDEA = {"title": "Sunset Sushi Picnic", "desc": "Takeout sushi on a hilltop.",
+        "steps": ["Order sushi", "Drive up", "Watch the sunset"]}
+ITINERARY = {"title": "Anniversary Evening", "overview": "Slow and romantic.",
+             "timeline": [{"time": "7:00 PM", "activity": "Dinner", "duration": "1 hr"}]}
+
+
+def test_prose_bracket_does_not_hide_the_answer():
+    text = "Sure [as requested]:\n```json\n" + json.dumps(IDEA) + "\n```\nEnjoy {your date}!"
+    assert extract.parse("quick", text)["title"] == IDEA["title"]
+
+
+def test_truncated_answer_is_closed():
+    text = json.dumps(ITINERARY)[:-3]
+    assert extract.parse("itinerary", text)["timeline"][0]["activity"] == "Dinner"
+
+
+def test_nested_idea_in_a_rejected_answer_is_not_the_answer():
+    # steps as objects: the answer fails the schema, each step looks like an idea
+    answer = dict(IDEA, steps=[{"title": "Order sushi", "desc": "From the corner place."},
+                               {"title": "Drive up", "desc": "Leave by six."}])
+    with pytest.raises(extract.ExtractError):
+        extract.parse("quick", json.dumps(answer))
+
+
+def test_nested_itinerary_in_a_rejected_answer_is_not_the_answer():
+    answer = {"title": "", "timeline": [], "alternative": ITINERARY}
+    with pytest.raises(extract.ExtractError):
+        extract.parse("itinerary", json.dumps(answer))
+
+
+def test_answer_after_a_rejected_value_is_found():
+    text = json.dumps({"note": {"title": "not an idea", "steps": [1, 2]}}) + " then " + json.dumps(IDEA)
+    assert extract.parse("quick", text)["title"] == IDEA["title"]
+
+
+def test_bracket_heavy_text_is_cheap():
+    t0 = time.perf_counter()
+    with pytest.raises(extract.ExtractError):
+        extract.parse("places", '[{"a": [' * 3000)
+    assert time.perf_counter() - t0 < 2